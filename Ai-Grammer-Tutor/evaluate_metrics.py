@@ -6,6 +6,9 @@ Generates metrics for resume/portfolio documentation
 import time
 import json
 from datetime import datetime
+from llm_gateway import BATCH, lane, trace
+from llm_gateway.telemetry import exporter
+from src.incremental import IncrementalChecker
 from src.utils import GrammarChecker
 
 # Test dataset with grammar errors and correct sentences
@@ -126,12 +129,32 @@ def evaluate_correction_detection(response, has_error):
 def measure_response_time(text):
     """Measure API response time"""
     start_time = time.time()
-    checker = GrammarChecker(text)
-    result = checker.check_grammar()
+    with trace("grammar_check"):
+        checker = GrammarChecker(text)
+        result = checker.check_grammar()
     end_time = time.time()
     return end_time - start_time, result
 
 
+def measure_incremental_resubmit():
+    """Submit a paragraph, fix one sentence and resubmit it in the same session"""
+    paragraph = " ".join(t["input"] for t in test_cases)
+    edited = paragraph.replace("She don't like pizza.", "She doesn't like pizza.")
+    runs = {}
+    for name, text in (("first_submit", paragraph), ("resubmit", edited)):
+        start_time = time.time()
+        with trace("grammar_incremental"):
+            result = IncrementalChecker("evaluation", text).check()
+        check = exporter.last("grammar_incremental") or {}
+        runs[name] = {
+            "response_time": time.time() - start_time,
+            "rechecked_sentences": result["rechecked"],
+            "input_tokens": check.get("input_tokens"),
+            "output_tokens": check.get("output_tokens"),
+        }
+    return runs
+
+
 def evaluate_response_quality(response):
     """Score response quality based on structure and completeness"""
     score = 0
@@ -206,6 +229,8 @@ def run_evaluation():
             results["category_accuracy"][category]["correct"] += 1
 
         # Store details
+        # None with LLM_TELEMETRY=0
+        check = exporter.last("grammar_check") or {}
         results["test_details"].append(
             {
                 "input": test["input"],
@@ -214,6 +239,9 @@ def run_evaluation():
                 "detected_correctly": is_correct,
                 "response_time": response_time,
                 "quality_score": quality_score,
+                "spans": check.get("spans"),
+                "input_tokens": check.get("input_tokens"),
+                "output_tokens": check.get("output_tokens"),
                 "response_preview": response[:200] + "...",
             }
         )
@@ -242,6 +270,10 @@ def run_evaluation():
     print(f"\nCategory-wise Accuracy:")
     for cat, acc in category_stats.items():
         print(f"  - {cat}: {acc:.1f}%")
+    telemetry = exporter.summary("grammar_check").get("grammar_check", {})
+    if telemetry:
+        print(f"\nTokens per check: {telemetry['mean_input_tokens']:.0f} in / "
+              f"{telemetry['mean_output_tokens']:.0f} out (~${telemetry['mean_cost_usd']:.6f})")
 
     # Save results
     results["summary"] = {
@@ -250,6 +282,15 @@ def run_evaluation():
         "avg_quality_score": avg_quality,
         "category_accuracy": category_stats,
     }
+    results["telemetry"] = telemetry
+
+    incremental = measure_incremental_resubmit()
+    results["incremental"] = incremental
+    print(f"\nIncremental re-check (one sentence edited in a {len(test_cases)}-sentence paragraph):")
+    for name, run in incremental.items():
+        tokens = (f", {run['input_tokens']} in / {run['output_tokens']} out tokens"
+                  if run["input_tokens"] is not None else "")
+        print(f"  - {name}: {run['rechecked_sentences']} sentences, {run['response_time']:.2f}s{tokens}")
 
     with open("evaluation_results.json", "w") as f:
         json.dump(results, f, indent=2)
@@ -261,7 +302,9 @@ def run_evaluation():
 
 if __name__ == "__main__":
     try:
-        results = run_evaluation()
+        # Batch lane: the gateway serves interactive requests first
+        with lane(BATCH):
+            results = run_evaluation()
         print("\n✓ Evaluation completed successfully!")
     except Exception as e:
         print(f"\n✗ Error during evaluation: {str(e)}")
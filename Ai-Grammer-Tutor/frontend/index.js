@@ -4,6 +4,8 @@ class GrammarTutor {
         this.currentView = 'landing';
         this.messages = [];
         this.apiUrl = "http://localhost:8000/api/grammar";
+        // Lets the server re-check only the sentences a resubmission changed
+        this.sessionId = crypto.randomUUID();
         this.init();
     }
 
@@ -84,7 +86,7 @@ class GrammarTutor {
         const response = await fetch(this.apiUrl, {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ text })
+            body: JSON.stringify({ text, session_id: this.sessionId })
         });
         if (!response.ok) throw new Error("API error");
         const data = await response.json();
@@ -1,6 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from typing import Optional
 from pydantic import BaseModel
+from llm_gateway import prometheus_text, trace
+from llm_gateway.telemetry import CONTENT_TYPE
+from src.incremental import IncrementalChecker, sessions
 from src.utils import GrammarChecker
 
 
@@ -16,9 +21,24 @@ app.add_middleware(
 
 class GrammarRequest(BaseModel):
     text: str
+    # With a session id, a resubmission only re-checks the sentences that changed
+    session_id: Optional[str] = None
 
 @app.post("/api/grammar")
 async def grammar_api(request: GrammarRequest):
-    grammar_checker = GrammarChecker(request.text)
-    result = grammar_checker.check_grammar()
+    with trace("grammar_api"):
+        if request.session_id:
+            return await IncrementalChecker(request.session_id, request.text).acheck()
+        grammar_checker = GrammarChecker(request.text)
+        result = await grammar_checker.acheck_grammar()
     return {"result": result}
+
+@app.delete("/api/grammar/session/{session_id}")
+def end_session(session_id: str):
+    sessions.drop(session_id)
+    return {"ok": True}
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus scrape target: stage latencies, tokens, cost and gateway counters
+    return PlainTextResponse(prometheus_text(), media_type=CONTENT_TYPE)
@@ -0,0 +1,211 @@
+"""Incremental re-check of edited text.
+
+Learners fix one sentence and resubmit the whole paragraph. A session's
+first submission (or a text sharing no sentence with earlier ones) gets the
+usual whole-text check, and its sentences are remembered by hash. A
+resubmission is split into sentences and diffed against what the session
+has seen; only new or edited sentences are sent to the model, in one call,
+each with its neighbouring sentences as context (so agreement and tense
+across sentences are still visible). The feedback is then reassembled in
+paragraph order, so the tokens and latency of a resubmit follow the size of
+the edit.
+"""
+import difflib
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.messages import HumanMessage
+from llm_gateway import route_hints, span
+from llm_gateway.telemetry import current_trace
+from src.prompts import sentence_prompt
+from src.utils import RULE_QUESTION, GrammarChecker, get_llm, precheck_confidence
+
+SENTENCE = re.compile(r"[^.!?\n]+(?:[.!?]+[\"')\]]*|$)")
+ANSWER = re.compile(r"^\s*\[(\d+)\]\s*", re.MULTILINE)
+# sessions idle longer than this are dropped
+SESSION_TTL_S = 3600
+MAX_SESSIONS = 1000
+# sentences remembered per session, including ones edited away (a learner
+# may revert an edit)
+MAX_SENTENCES = 500
+# sentences checked in the whole-text answer have no feedback of their own
+COVERED = "Unchanged since it was checked; see the earlier feedback."
+
+
+def split_sentences(text):
+    return [s.strip() for s in SENTENCE.findall(text) if s.strip()]
+
+
+def sentence_key(sentence):
+    return hashlib.sha1(" ".join(sentence.split()).encode()).hexdigest()[:16]
+
+
+class Session:
+    def __init__(self):
+        self.feedback = OrderedDict()
+        self.previous = []
+        self.seen = time.monotonic()
+
+    def remember(self, key, feedback):
+        """`feedback` None: covered by a whole-text check, kept only if the
+        sentence has no feedback of its own yet."""
+        if feedback is None and self.feedback.get(key) is not None:
+            feedback = self.feedback[key]
+        self.feedback[key] = feedback
+        self.feedback.move_to_end(key)
+        while len(self.feedback) > MAX_SENTENCES:
+            self.feedback.popitem(last=False)
+
+
+class SessionStore:
+    def __init__(self, ttl_s=SESSION_TTL_S, max_sessions=MAX_SESSIONS):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is None or now - session.seen > self.ttl_s:
+                session = Session()
+            session.seen = now
+            self.sessions[session_id] = session
+            while self.sessions:
+                oldest = next(iter(self.sessions.values()))
+                if len(self.sessions) <= self.max_sessions and now - oldest.seen <= self.ttl_s:
+                    break
+                self.sessions.popitem(last=False)
+            return session
+
+    def drop(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+
+sessions = SessionStore()
+
+
+class IncrementalChecker:
+    """`check`/`acheck` return the reassembled feedback and what was re-checked."""
+
+    def __init__(self, session_id, para, store=sessions):
+        self.para = para
+        self.session = store.get(session_id)
+        self.sentences = split_sentences(para)
+        self.keys = [sentence_key(s) for s in self.sentences]
+        self.pending = {}
+        for sentence, key in zip(self.sentences, self.keys):
+            if key not in self.session.feedback:
+                self.pending.setdefault(key, sentence)
+
+    def question(self):
+        return bool(RULE_QUESTION.search(self.para))
+
+    def full_check(self):
+        # A rule question, text without sentences, or a text the session has
+        # not seen any of gets the usual whole-text answer
+        return (not self.sentences or self.question()
+                or not any(key in self.session.feedback for key in self.keys))
+
+    def build_prompt(self):
+        """The pending sentences, numbered, with the sentence before and
+        after each as unnumbered context."""
+        numbers = {key: i for i, key in enumerate(self.pending, 1)}
+        shown = sorted({j for i, key in enumerate(self.keys) if key in numbers
+                        for j in (i - 1, i, i + 1) if 0 <= j < len(self.keys)})
+        lines, last = [], None
+        for i in shown:
+            if last is not None and i > last + 1:
+                lines.append("...")
+            # a repeated sentence is numbered once
+            number = numbers.pop(self.keys[i], None)
+            lines.append(f"[{number}] {self.sentences[i]}" if number else self.sentences[i])
+            last = i
+        excerpt = "\n".join(lines)
+        return f"""{sentence_prompt}
+Excerpt (unnumbered sentences are context only):
+\"\"\"
+{excerpt}
+\"\"\"
+"""
+
+    def diff(self):
+        """Sentence edits since the previous submission: {op: count}."""
+        edits = {"equal": 0, "replace": 0, "insert": 0, "delete": 0}
+        matcher = difflib.SequenceMatcher(a=self.session.previous, b=self.keys, autojunk=False)
+        for op, a0, a1, b0, b1 in matcher.get_opcodes():
+            edits[op] += max(a1 - a0, b1 - b0)
+        return edits
+
+    def _hints(self):
+        return route_hints(confidence=precheck_confidence(" ".join(self.pending.values())))
+
+    def check(self):
+        if self.full_check():
+            return self._full(GrammarChecker(self.para).check_grammar())
+        response = None
+        if self.pending:
+            with span("prompt_build"):
+                prompt = self.build_prompt()
+            with self._hints():
+                response = get_llm().invoke([HumanMessage(content=prompt)]).content
+        return self._assemble(response)
+
+    async def acheck(self):
+        if self.full_check():
+            return self._full(await GrammarChecker(self.para).acheck_grammar())
+        response = None
+        if self.pending:
+            with span("prompt_build"):
+                prompt = self.build_prompt()
+            with self._hints():
+                response = (await get_llm().ainvoke([HumanMessage(content=prompt)])).content
+        return self._assemble(response)
+
+    def _full(self, result):
+        edits = self.diff()
+        if not self.question():
+            for key in self.keys:
+                self.session.remember(key, None)
+            self.session.previous = self.keys
+        return {"result": result, "sentences": [], "rechecked": len(self.sentences), "edits": edits}
+
+    def _parse(self, response):
+        """{key: feedback} for the pending sentences the model answered."""
+        parts = ANSWER.split(response)
+        keys = list(self.pending)
+        answers = {}
+        for number, text in zip(parts[1::2], parts[2::2]):
+            i = int(number) - 1
+            if 0 <= i < len(keys) and text.strip():
+                answers[keys[i]] = text.strip()
+        if not answers and len(keys) == 1 and response.strip():
+            answers[keys[0]] = response.strip()
+        return answers
+
+    def _assemble(self, response):
+        answers = self._parse(response) if response is not None else {}
+        edits = self.diff()
+        for key, feedback in answers.items():
+            self.session.remember(key, feedback)
+        self.session.previous = self.keys
+        sentences, parts = [], []
+        for i, (sentence, key) in enumerate(zip(self.sentences, self.keys), 1):
+            # unanswered sentences are not remembered, so the next submission retries them
+            if key in answers:
+                feedback = answers[key]
+            elif key in self.session.feedback:
+                feedback = self.session.feedback[key] or COVERED
+            else:
+                feedback = "(no feedback this time; resubmit to retry)"
+            sentences.append({"sentence": sentence, "feedback": feedback, "rechecked": key in self.pending})
+            parts.append(f"{i}. \"{sentence}\"\n{feedback}")
+        trace = current_trace()
+        if trace is not None:
+            trace.attrs.update(sentences=len(self.sentences), rechecked=len(self.pending))
+        return {"result": "\n\n".join(parts), "sentences": sentences,
+                "rechecked": len(self.pending), "edits": edits}
@@ -1,17 +1,51 @@
 from src.prompts import grammer_prompt
-from langchain_google_genai import ChatGoogleGenerativeAI
+from llm_gateway import route_hints, routed_chat, span
 from langchain_core.messages import HumanMessage
+from functools import lru_cache
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
 gemini_api = os.getenv("GEMINI_API")
 
 
+# Asking about a rule (rather than submitting text) needs a real explanation
+RULE_QUESTION = re.compile(
+    r"\b(why|when (do|should|to)|what is the difference|difference between|which is correct|rule)\b",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    # One client for all requests; calls share the gateway's rate limit,
+    # retries and circuit breaker. The model tier is picked per request
+    # from precheck_confidence.
+    return routed_chat(api_key=gemini_api, temperature=0.2)
+
+
+def precheck_confidence(text):
+    """0..1 confidence that the text is a short, simple check a light model
+    handles well: long passages, long sentences and questions about rules
+    lower it."""
+    words = re.findall(r"[A-Za-z']+", text)
+    if not words:
+        return 1.0
+    sentences = max(1, len(re.findall(r"[.!?]+", text)))
+    confidence = 1.0
+    confidence -= min(0.5, len(words) / 300)
+    confidence -= min(0.3, max(0, len(words) / sentences - 20) / 40)
+    if RULE_QUESTION.search(text):
+        confidence -= 0.4
+    return round(max(0.0, confidence), 2)
+
+
 class GrammarChecker:
     def __init__(self, para):
         self.para = para
-        self.prompt = self.build_prompt()
+        with span("prompt_build"):
+            self.prompt = self.build_prompt()
 
     def build_prompt(self):
         prompt = f"""{grammer_prompt}
@@ -24,8 +58,12 @@ Respond as a helpful tutor.
         return prompt
 
     def check_grammar(self):
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash", google_api_key=gemini_api, temperature=0.2
-        )
-        response = llm.invoke([HumanMessage(content=self.prompt)])
+        with route_hints(confidence=precheck_confidence(self.para)):
+            response = get_llm().invoke([HumanMessage(content=self.prompt)])
+        return response.content
+
+    async def acheck_grammar(self):
+        # Identical texts submitted at the same time share one model call
+        with route_hints(confidence=precheck_confidence(self.para)):
+            response = await get_llm().ainvoke([HumanMessage(content=self.prompt)])
         return response.content
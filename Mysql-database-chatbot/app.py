@@ -1,4 +1,5 @@
 import streamlit as st 
+from llm_gateway.telemetry import exporter, telemetry
 from src.utils import MYSQLChain
 
 st.set_page_config(page_title="Chat with Database", page_icon=":robot_face:")
@@ -32,3 +33,12 @@ if prompt := st.chat_input("Ask a question about the database"):
     st.session_state.messages.append({"role": "assistant", "content": response})
     with st.chat_message("assistant"):
         st.markdown(response)
+
+with st.sidebar.expander("Telemetry"):
+    totals = telemetry.totals()
+    st.caption(
+        f"{totals['llm_calls']} model calls · {totals['input_tokens']} input / "
+        f"{totals['output_tokens']} output tokens · ~${totals['cost_usd']:.4f}"
+    )
+    # mean seconds per stage (prompt_build, db_execute, llm_call, parse), tokens per request
+    st.json(exporter.summary())
@@ -1,4 +1,4 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+from llm_gateway import route_hints, routed_chat, span, trace
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain.prompts import SemanticSimilarityExampleSelector
@@ -17,6 +17,39 @@ import re
 
 load_dotenv()
 
+# Question features that usually mean joins, grouping, subqueries or HAVING
+_DIFFICULTY_MARKERS = [re.compile(marker, re.IGNORECASE) for marker in (
+    r"\b(compare|comparison|vs\.?|versus|against)\b",
+    r"\b(by|per|each|every)\s+(?!the\b)\w+",
+    r"\b(average|avg|mean|median|ratio|percent(age)?|share|growth|rate)\b",
+    r"\b(top|bottom)\s+\d+|\b(highest|lowest|most|least|best|worst)\b",
+    r"\b(last|past|previous|next)\s+\w+|\b(q[1-4]|quarter|monthly|yearly|daily|weekly|trend)\b|\b\d+\s+days?\b",
+    r"\b(haven'?t|hasn'?t|never|without|not)\b",
+    r"\b(duplicate|more than once|at least|more than|repeat)\b",
+    r"\b(and|also|along with|together with|as well as)\b",
+)]
+
+
+def question_difficulty(question):
+    """0..1 estimate of how hard the SQL for `question` is, from keywords
+    and length; routes easy questions to a cheaper model tier."""
+    hits = sum(1 for marker in _DIFFICULTY_MARKERS if marker.search(question))
+    extra_words = max(0, len(question.split()) - 12)
+    return round(min(1.0, 0.1 + 0.25 * hits + 0.02 * extra_words), 2)
+
+
+class TimedSQLDatabase(SQLDatabase):
+    """SQLDatabase whose queries (the agent's tool calls included) are
+    recorded as db_execute spans."""
+
+    def run(self, *args, **kwargs):
+        with span("db_execute"):
+            return super().run(*args, **kwargs)
+
+    def get_table_info(self, *args, **kwargs):
+        with span("db_execute"):
+            return super().get_table_info(*args, **kwargs)
+
 
 class MYSQLChain:
     def __init__(self):
@@ -29,9 +62,10 @@ class MYSQLChain:
         self.qa_chain = self._build_qa_chain()
 
     def _create_llm(self):
-        return ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            google_api_key=os.getenv("GOOGLE_API_KEY"),
+        # Model tier picked per question (see question_difficulty), with
+        # fallback to other tiers/keys on quota or latency SLO breaches
+        return routed_chat(
+            api_key=os.getenv("GOOGLE_API_KEY"),
             temperature=0.2,
         )
 
@@ -40,7 +74,7 @@ class MYSQLChain:
         db_password = os.getenv("MYSQL_PASSWORD")
         db_host = "localhost"
         db_name = "atliq_tshirts"
-        return SQLDatabase.from_uri(
+        return TimedSQLDatabase.from_uri(
             f"mysql+pymysql://{db_user}:{db_password}@{db_host}/{db_name}",
             sample_rows_in_table_info=3,
         )
@@ -84,14 +118,20 @@ class MYSQLChain:
 
     def _build_qa_chain(self):
         # Use invoke instead of run
-        return self.few_shot_prompt | self.llm | StrOutputParser()
+        self.parser = StrOutputParser()
+        return self.few_shot_prompt | self.llm | self.parser
 
     def run_agent(self, query: str):
-        result = self.agent.invoke({"input": query})
+        with trace("sql_agent"), route_hints(difficulty=question_difficulty(query)):
+            result = self.agent.invoke({"input": query})
         return result
 
     def run_qa_chain(self, query: str):
-        # Use invoke instead of run
-        return self.qa_chain.invoke(
-            {"input": query, "table_info": self.db.get_table_info(), "top_k": "3"}
-        )
+        # The qa_chain's steps, run one by one so each is timed
+        with trace("sql_qa"), route_hints(difficulty=question_difficulty(query)):
+            inputs = {"input": query, "table_info": self.db.get_table_info(), "top_k": "3"}
+            with span("prompt_build"):
+                prompt_value = self.few_shot_prompt.invoke(inputs)
+            message = self.llm.invoke(prompt_value)
+            with span("parse"):
+                return self.parser.invoke(message)
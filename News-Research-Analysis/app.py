@@ -1,6 +1,11 @@
 import streamlit as st
+import functools
+import uuid
+import os
 from dotenv import load_dotenv
-from src.rag import load_rag_chain
+from llm_gateway.telemetry import exporter, telemetry
+from src.rag import load_rag_chain, refresh_rag_chain
+from src.registry import KnowledgebaseRegistry
 
 load_dotenv()
 
@@ -8,18 +13,49 @@ load_dotenv()
 st.set_page_config(page_title="News Research Chatbot", page_icon="📰")
 st.title("📰 News Research Chatbot")
 
+
+@st.cache_resource
+def get_registry():
+    # One registry per server process: sessions loading the same URLs share
+    # one read-only knowledge base, and memory is bounded by LRU eviction.
+    interval = int(os.getenv("NEWS_RAG_REFRESH_INTERVAL", "900"))
+    # A store reopened from disk whose articles were fetched more than one
+    # refresh interval ago is brought up to date before it is served.
+    registry = KnowledgebaseRegistry(
+        loader=functools.partial(load_rag_chain, max_age=interval), refresher=refresh_rag_chain
+    )
+    # Sources are re-polled in the background; changed articles are
+    # re-embedded and the index swapped without blocking queries.
+    registry.start_refresh(interval)
+    return registry
+
+
+registry = get_registry()
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # Get URLs from user input
 urls = st.text_area(
     "Enter one or more news URLs (comma separated):",
     placeholder="https://www.bbc.com/news, https://www.cnn.com"
 )
 
+rebuild = st.checkbox(
+    "Re-fetch all articles",
+    help="Download and re-embed every article instead of reusing the saved knowledge base.",
+)
+
 # Button to load knowledge base
 if st.button("Load Knowledge Base"):
     if urls.strip():
         with st.spinner("Loading knowledge base..."):
             try:
-                st.session_state.rag_chain = load_rag_chain(urls)
+                if "kb_key" in st.session_state:
+                    registry.release(st.session_state.kb_key, st.session_state.session_id)
+                st.session_state.kb_key = registry.acquire(
+                    urls, st.session_state.session_id, rebuild=rebuild
+                )
                 st.session_state.chat_history = []
                 st.success("Knowledge base loaded! You can now chat.")
             except Exception as e:
@@ -27,29 +63,74 @@ if st.button("Load Knowledge Base"):
     else:
         st.warning("Please enter at least one URL.")
 
-# Only proceed if RAG chain is loaded
-if "rag_chain" in st.session_state:
-    rag_chain = st.session_state.rag_chain
+# Only proceed if a knowledge base is loaded
+if "kb_key" in st.session_state:
+    rag_chain = registry.get(st.session_state.kb_key, st.session_state.session_id)
 
-    def get_response(user_input):
-        response = rag_chain.invoke({"input": user_input})
-        if isinstance(response, dict) and "answer" in response:
-            return response["answer"]
-        return str(response)
+    def show_sources(docs):
+        sources = list(dict.fromkeys(doc.metadata.get("source", "unknown") for doc in docs))
+        if sources:
+            st.caption("Sources: " + " · ".join(sources))
+
+    def stream_response(user_input, result):
+        # Sources are rendered as soon as retrieval finishes; the answer
+        # tokens follow while Gemini is still generating.
+        for chunk in rag_chain.stream({"input": user_input}):
+            if "docs" in chunk:
+                result["docs"] = chunk["docs"]
+                show_sources(chunk["docs"])
+            if "answer" in chunk:
+                yield chunk["answer"]
 
     st.markdown("Ask me anything about the latest news from the provided URLs!")
 
     user_input = st.text_input("You:", key="input")
-    if st.button("Send") and user_input:
-        with st.spinner("Thinking..."):
-            answer = get_response(user_input)
-            st.session_state.chat_history.append(("You", user_input))
-            st.session_state.chat_history.append(("Bot", answer))
 
-    for sender, message in st.session_state.chat_history:
+    for sender, message, docs in st.session_state.chat_history:
         if sender == "You":
             st.markdown(f"**You:** {message}")
         else:
             st.markdown(f"**Bot:** {message}")
+            show_sources(docs)
+
+    if st.button("Send") and user_input:
+        st.markdown(f"**You:** {user_input}")
+        st.markdown("**Bot:**")
+        result = {"docs": []}
+        answer = st.write_stream(stream_response(user_input, result))
+        st.session_state.chat_history.append(("You", user_input, []))
+        st.session_state.chat_history.append(("Bot", answer, result["docs"]))
+
+    if rag_chain.cache is not None:
+        stats = rag_chain.cache.stats()
+        st.caption(
+            f"Answer cache: {stats['hits']} hits / {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate)"
+        )
+    refreshed = rag_chain.knowledgebase.last_refresh
+    if refreshed:
+        st.caption(
+            "Last source refresh: "
+            + ", ".join(f"{status} ×{list(refreshed.values()).count(status)}"
+                        for status in dict.fromkeys(refreshed.values()))
+        )
+    last = rag_chain.timings.last()
+    if last:
+        st.caption(
+            "Last answer: "
+            + ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in last.items()
+                        if isinstance(seconds, float))
+        )
+        if last["stats"]:
+            st.caption(", ".join(f"{name}: {value}" for name, value in last["stats"].items()))
 else:
-    st.info("Please enter URLs and load the knowledge base to start chatting.")
\ No newline at end of file
+    st.info("Please enter URLs and load the knowledge base to start chatting.")
+
+with st.sidebar.expander("Telemetry"):
+    totals = telemetry.totals()
+    st.caption(
+        f"{totals['llm_calls']} model calls · {totals['input_tokens']} input / "
+        f"{totals['output_tokens']} output tokens · ~${totals['cost_usd']:.4f}"
+    )
+    # mean seconds per stage (retrieval, context_pack, prompt_build, llm_call, ttft), tokens per answer
+    st.json(exporter.summary())
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Recall vs latency benchmark for the ANN index options in src/index.py.
+
+Uses synthetic clustered 384-d vectors (the all-MiniLM-L6-v2 dimension) so it
+runs offline and is reproducible. Ground truth comes from an exact flat index.
+
+    python benchmark_ann.py                      # 100k and 1M vectors
+    python benchmark_ann.py --sizes 20000 100000 --queries 500
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+import faiss
+from src.index import factory_string, build_index, set_search_params
+
+DIM = 384
+K = 10
+
+CONFIGS = [
+    ("flat", "float32", [{}]),
+    ("flat", "float16", [{}]),
+    ("ivf", "float32", [{"nprobe": p} for p in (4, 16, 64)]),
+    ("ivf", "float16", [{"nprobe": p} for p in (4, 16, 64)]),
+    ("ivf", "pq", [{"nprobe": p} for p in (4, 16, 64)]),
+    ("hnsw", "float32", [{"ef_search": e} for e in (16, 64, 256)]),
+    ("hnsw", "float16", [{"ef_search": e} for e in (16, 64, 256)]),
+]
+
+
+def synthetic_vectors(n, n_queries, seed=0):
+    """Gaussian clusters around random unit centres, roughly like sentence
+    embeddings of topical news text."""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(10, n // 1000)
+    centres = rng.normal(size=(n_clusters, DIM)).astype("float32")
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+
+    def sample(m):
+        labels = rng.integers(n_clusters, size=m)
+        x = centres[labels] + 0.35 * rng.normal(size=(m, DIM)).astype("float32") / np.sqrt(DIM) * 4
+        return np.ascontiguousarray(x / np.linalg.norm(x, axis=1, keepdims=True), dtype="float32")
+
+    return sample(n), sample(n_queries)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run(sizes, n_queries):
+    results = []
+    for n in sizes:
+        print("=" * 70)
+        print(f"N = {n:,} vectors, {n_queries} queries, k = {K}")
+        print("=" * 70)
+        xb, xq = synthetic_vectors(n, n_queries)
+        exact = faiss.IndexFlatL2(DIM)
+        exact.add(xb)
+        _, truth = exact.search(xq, K)
+
+        for index_type, storage, sweeps in CONFIGS:
+            description = factory_string(index_type, n, DIM, storage)
+            start = time.perf_counter()
+            index = build_index(xb, description)
+            index.add(xb)
+            build_s = time.perf_counter() - start
+            size_mb = faiss.serialize_index(index).nbytes / 2**20
+
+            for params in sweeps:
+                set_search_params(index, **params)
+                latencies = []
+                found = []
+                for q in xq:
+                    t0 = time.perf_counter()
+                    _, ids = index.search(q[None, :], K)
+                    latencies.append(time.perf_counter() - t0)
+                    found.append(ids[0])
+                latencies = np.array(latencies) * 1000
+                row = {
+                    "n": n,
+                    "index": description,
+                    "params": params,
+                    "build_s": round(build_s, 2),
+                    "size_mb": round(size_mb, 1),
+                    "recall_at_10": round(recall_at_k(found, truth), 4),
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                    "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                }
+                results.append(row)
+                print(
+                    f"{description:<18} {str(params):<20} recall@10={row['recall_at_10']:.3f} "
+                    f"p50={row['p50_ms']:.3f}ms p95={row['p95_ms']:.3f}ms "
+                    f"size={row['size_mb']:.0f}MB build={row['build_s']:.1f}s"
+                )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--output", default="ann_benchmark_results.json")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.queries)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✓ Results saved to {args.output}")
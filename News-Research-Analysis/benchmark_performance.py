@@ -1,109 +1,297 @@
+"""
+Offline retrieval benchmark for the News RAG pipeline.
 
-import time
+Builds a deterministic synthetic news corpus at several sizes and, for each
+size, times every ingestion stage separately (fetch, split, embed, index
+build, BM25 build), then measures query-embedding and search latency
+percentiles, sequential vs batched query throughput, recall@k of the
+configured index against exact search, and peak RSS. Each size runs in a
+fresh process so peak RSS is per size.
+
+    python benchmark_performance.py                         # 1k/10k/100k chunks
+    python benchmark_performance.py --sizes 1000 --embeddings hashing
+    python benchmark_performance.py --output bench.json --compare previous.json
+
+`--embeddings hf` (default) uses all-MiniLM-L6-v2 like the app, `onnx` and
+`onnx-int8` the ONNX Runtime backends from src/embeddings.py (compare their
+embed docs/s); `hashing` is a dependency-free stand-in for machines without
+the model, useful to benchmark the rest of the pipeline.
+"""
+
+import argparse
+import json
 import os
-from src.rag import load_rag_chain
-from langchain_core.messages import BaseMessage
-
-# Use Wikipedia articles as stable targets for benchmarking
-URLS = [
-    "https://en.wikipedia.org/wiki/Artificial_intelligence",
-    "https://en.wikipedia.org/wiki/Machine_learning",
-    "https://en.wikipedia.org/wiki/Deep_learning"
-]
-
-QUERIES = [
-    "What is the difference between AI and ML?",
-    "Explain the history of deep learning briefly.",
-    "What are neural networks?"
-]
-
-def run_benchmark():
-    print("="*50)
-    print("🚀 Starting Performance Benchmark")
-    print("="*50)
-    print(f"Target URLs ({len(URLS)}):")
-    for u in URLS:
-        print(f" - {u}")
-    print("-" * 50)
-
-    # 1. Measure Knowledge Base Loading Time
-    print("\n[1/2] Benchmarking Knowledge Base Creation...")
-    start_time = time.time()
-    try:
-        rag_chain = load_rag_chain(",".join(URLS))
-    except Exception as e:
-        print(f"❌ Failed to load chain: {e}")
-        return
-    end_time = time.time()
-    
-    load_time = end_time - start_time
-    print(f"✅ Knowledge Base Loaded in {load_time:.2f} seconds")
-    
-    # 2. Measure Query Performance (Retrieval Only due to Quota)
-    print("\n[2/2] Benchmarking Retrieval (skipping LLM gen due to quota)...")
-    
-    total_latency = 0
-    
-    # Access retriever from chain logic if possible, or recreate
-    # Since chain is LCEL, we can't easily extract retriever unless we expose it.
-    # But we can use the vectorstore from the previous step if load_rag_chain returned it?
-    # load_rag_chain returns the chain.
-    
-    # Let's just create a new retriever for benchmarking since we know the URLS
+import platform
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+import zlib
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+NUM_QUERIES = 200
+K = 10
+# RecursiveCharacterTextSplitter(1000, 200) yields roughly one chunk per
+# 680 characters of article text.
+CHARS_PER_CHUNK = 680
+
+TOPICS = {
+    "markets": "stocks shares index investors trading earnings quarter rally selloff bonds yields",
+    "tech": "software chips startup cloud platform users launch model data privacy devices",
+    "politics": "minister parliament election vote policy campaign coalition senate bill reform",
+    "energy": "oil gas prices opec supply pipeline renewable solar grid emissions output",
+    "health": "hospital vaccine patients trial doctors virus treatment drug approval study",
+    "sports": "match season league coach players goal championship transfer final injury",
+}
+COMMON = "the a of to in and said on for with that was is by as at from has have will new year"
+NAMES = ["Acme Corp", "Globex", "Initech", "Jane Doe", "John Smith", "Umbrella", "Hooli", "Vandelay"]
+
+# --embeddings value -> Knowledgebase embedding_backend
+BACKEND_FOR = {"hf": "torch", "onnx": "onnx", "onnx-int8": "onnx-int8"}
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashed bag of words, L2-normalised. Deterministic and offline."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            h = zlib.crc32(token.encode())
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return (vector / (np.linalg.norm(vector) or 1.0)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def make_corpus(n_chunks, directory, seed=0):
+    """Writes synthetic articles totalling ~n_chunks chunks; returns paths."""
+    rng = random.Random(seed)
+    common = COMMON.split()
+    paths = []
+    remaining = n_chunks * CHARS_PER_CHUNK
+    i = 0
+    while remaining > 0:
+        topic = rng.choice(list(TOPICS))
+        vocab = TOPICS[topic].split()
+        sentences = []
+        length = 0
+        target = rng.randint(3_000, 8_000)
+        while length < target:
+            words = [rng.choice(vocab if rng.random() < 0.4 else common) for _ in range(rng.randint(8, 20))]
+            if rng.random() < 0.2:
+                words.insert(rng.randrange(len(words)), rng.choice(NAMES))
+            sentence = " ".join(words).capitalize() + "."
+            sentences.append(sentence)
+            length += len(sentence) + 1
+        text = f"{topic.title()} report {i}\n\n" + " ".join(sentences)
+        path = os.path.join(directory, f"article_{i:06d}.txt")
+        with open(path, "w") as f:
+            f.write(text)
+        paths.append(path)
+        remaining -= len(text)
+        i += 1
+    return paths
+
+
+def make_queries(chunks, n, seed=1):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        words = rng.choice(chunks).page_content.split()
+        start = rng.randrange(max(1, len(words) - 12))
+        queries.append(" ".join(words[start:start + 12]))
+    return queries
+
+
+def percentiles(samples_s):
+    ms = np.array(samples_s) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2**20 if platform.system() == "Darwin" else 2**10), 1)
+
+
+def run_size(n_chunks, embeddings, index_type, split_mode="recursive"):
     from src.utils import Knowledgebase
-    kb = Knowledgebase(URL=URLS)
-    # We already loaded, so vectorstore.pkl exists. 
-    # But for clean benchmark, let's just assume we reload
-    
-    # Actually, let's use the 'rag_chain' but inspect it? No, LCEL is opaque.
-    # We'll just run the chain and catch the error, OR we can hack it.
-    
-    # Better: Measure the KB construction (already done).
-    # Then measure retrieval speed by calling the retriever directly.
-    # We need to expose retriever from load_rag_chain or recreate it.
-    
-    # Re-instantiate retriever to test speed
-    print("   -> Creating test retriever...")
-    import pickle
-    from langchain_huggingface import HuggingFaceEmbeddings
-    from langchain_community.vectorstores import FAISS
-    
-    embd = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    # vectorstore should be saved by load_rag_chain in vectorstore.pkl
-    if os.path.exists("vectorstore.pkl"):
-        print("   -> Loading pickled vectorstore...")
-        with open("vectorstore.pkl", "rb") as f:
-            vectorstore = pickle.load(f)
-        retriever = vectorstore.as_retriever(search_kwargs={"k":2})
-        
-        for i, query in enumerate(QUERIES, 1):
-            print(f"\nRunning Retrieval {i}: '{query}'")
-            q_start = time.time()
-            docs = retriever.invoke(query)
-            q_end = time.time()
-            latency = q_end - q_start
-            print(f"   -> Retrieval Latency: {latency:.4f}s")
-            print(f"   -> Retrieved {len(docs)} docs")
-            total_latency += latency
-            
-        avg_latency = total_latency / len(QUERIES)
-
-        print("\n" + "="*50)
-        print("📊 BENCHMARK RESULTS (REAL - RETRIEVAL ONLY)")
-        print("="*50)
-        print(f"KB Construction Time (3 Wiki Pages): {load_time:.2f}s")
-        print(f"Average Retrieval Time:              {avg_latency:.4f}s")
-        print("="*50)
-        
-        # Generate Markdown snippet for README
-        print("\nPlaintext for README:")
-        print("```text")
-        print(f"- **Document Loading**: {load_time:.2f}s (3 Wiki pages)")
-        print(f"- **Retrieval Latency**: {avg_latency*1000:.0f}ms (local vector search)")
-        print("```")
-    else:
-        print("Vectorstore not found, cannot benchmark retrieval.")
+    from src.index import factory_string, build_index, set_search_params, DEFAULT_SEARCH_PARAMS
+    from src.bm25 import BM25Index
+    from src.embeddings import CachedQueryEmbeddings, embed_queries
+
+    kb = Knowledgebase(
+        URL=[], index_type=index_type, split_mode=split_mode,
+        embedding_backend=BACKEND_FOR.get(embeddings, "torch"),
+    )
+    embd = HashingEmbeddings() if embeddings == "hashing" else kb.model()
+    if isinstance(embd, CachedQueryEmbeddings):
+        # Time the model, not the query cache: the batch below repeats the
+        # sequential queries, and the memoized cache outlives each size
+        embd = embd.embd
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_corpus(n_chunks, tmp)
+
+        start = time.perf_counter()
+        docs = []
+        for path in paths:
+            with open(path) as f:
+                docs.append(Document(page_content=f.read(), metadata={"source": path}))
+        timings["fetch_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = kb.split(docs)
+    timings["split_s"] = time.perf_counter() - start
+    contents = [c.page_content for c in chunks]
+
+    start = time.perf_counter()
+    vectors = np.asarray(embd.embed_documents(contents), dtype=np.float32)
+    timings["embed_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    description = factory_string(index_type, len(vectors), vectors.shape[1])
+    index = build_index(vectors, description)
+    index.add(vectors)
+    set_search_params(index, DEFAULT_SEARCH_PARAMS["nprobe"], DEFAULT_SEARCH_PARAMS["efSearch"])
+    timings["index_build_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bm25 = BM25Index()
+    bm25.add(contents)
+    timings["bm25_build_s"] = time.perf_counter() - start
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+
+    queries = make_queries(chunks, NUM_QUERIES)
+    embed_lat, search_lat, bm25_lat = [], [], []
+    hits = 0
+    for q in queries:
+        t0 = time.perf_counter()
+        qv = np.asarray([embd.embed_query(q)], dtype=np.float32)
+        t1 = time.perf_counter()
+        _, found = index.search(qv, K)
+        t2 = time.perf_counter()
+        bm25.search(q, K)
+        t3 = time.perf_counter()
+        embed_lat.append(t1 - t0)
+        search_lat.append(t2 - t1)
+        bm25_lat.append(t3 - t2)
+        _, truth = exact.search(qv, K)
+        hits += len(set(found[0]) & set(truth[0]))
+
+    # The same queries as one batch: one embedding call, one FAISS search
+    start = time.perf_counter()
+    qvs = np.asarray(embed_queries(embd, queries), dtype=np.float32)
+    index.search(qvs, K)
+    batch_s = time.perf_counter() - start
+
+    return {
+        "target_chunks": n_chunks,
+        "documents": len(docs),
+        "chunks": len(chunks),
+        "index": description,
+        "split_mode": split_mode,
+        "embeddings": embeddings,
+        "ingest": {k: round(v, 3) for k, v in timings.items()},
+        "ingest_chunks_per_s": round(len(chunks) / max(sum(timings.values()), 1e-9), 1),
+        "embed_docs_per_s": round(len(chunks) / max(timings["embed_s"], 1e-9), 1),
+        "query_embedding": percentiles(embed_lat),
+        "vector_search": percentiles(search_lat),
+        "bm25_search": percentiles(bm25_lat),
+        "sequential_queries_per_s": round(len(queries) / max(sum(embed_lat) + sum(search_lat), 1e-9), 1),
+        "batch_queries_per_s": round(len(queries) / max(batch_s, 1e-9), 1),
+        f"recall_at_{K}": round(hits / (len(queries) * K), 4),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def print_result(r):
+    print(f"\n📦 {r['chunks']:,} chunks from {r['documents']:,} articles  ({r['index']}, {r['embeddings']} embeddings)")
+    for stage, seconds in r["ingest"].items():
+        print(f"   {stage:<16} {seconds:>9.3f}s")
+    print(f"   {'throughput':<16} {r['ingest_chunks_per_s']:>9.1f} chunks/s")
+    print(f"   {'embedding':<16} {r['embed_docs_per_s']:>9.1f} docs/s")
+    for name in ("query_embedding", "vector_search", "bm25_search"):
+        p = r[name]
+        print(f"   {name:<16} p50={p['p50_ms']:.3f}ms p95={p['p95_ms']:.3f}ms p99={p['p99_ms']:.3f}ms")
+    print(f"   {'queries':<16} {r['sequential_queries_per_s']:>9.1f}/s sequential, "
+          f"{r['batch_queries_per_s']:.1f}/s batched")
+    print(f"   recall@{K:<9} {r[f'recall_at_{K}']:.3f}")
+    print(f"   peak RSS        {r['peak_rss_mb']:.0f} MB")
+
+
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = {r["target_chunks"]: r for r in json.load(f)["results"]}
+    print("\n" + "=" * 70)
+    print(f"Δ vs {previous_path}")
+    print("=" * 70)
+    for r in results:
+        old = previous.get(r["target_chunks"])
+        if not old:
+            continue
+        for key in ("embed_s", "index_build_s"):
+            print(f"{r['target_chunks']:>8} {key:<16} {old['ingest'][key]:.3f}s -> {r['ingest'][key]:.3f}s")
+        print(f"{r['target_chunks']:>8} {'search p95':<16} {old['vector_search']['p95_ms']:.3f}ms -> {r['vector_search']['p95_ms']:.3f}ms")
+        print(f"{r['target_chunks']:>8} {'recall':<16} {old[f'recall_at_{K}']:.3f} -> {r[f'recall_at_{K}']:.3f}")
+
+
+def run_benchmark(sizes, embeddings, index_type, split_mode="recursive"):
+    print("=" * 70)
+    print("🚀 News RAG Offline Retrieval Benchmark")
+    print("=" * 70)
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for n in sizes:
+        # fresh process per size so peak RSS is not inherited from the previous run
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            result = pool.submit(run_size, n, embeddings, index_type, split_mode).result()
+        print_result(result)
+        results.append(result)
+    return results
 
 
 if __name__ == "__main__":
-    run_benchmark()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--embeddings", choices=["hf", "onnx", "onnx-int8", "hashing"], default="hf")
+    parser.add_argument("--index-type", default="auto")
+    parser.add_argument("--split-mode", choices=["recursive", "parallel"], default="recursive")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, args.embeddings, args.index_type, args.split_mode)
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "machine": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "k": K,
+        "num_queries": NUM_QUERIES,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Results saved to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
@@ -1,223 +1,301 @@
 """
-Evaluation script for News Research Chatbot (RAG)
-Generates RAG pipeline performance metrics
+Evaluation harness for News Research Chatbot (RAG)
+
+Runs the labelled test queries in eval/queries.json through the app's
+retriever over the fixed corpus in eval/corpus/ and measures retrieval
+against labelled passages:
+
+  - NDCG@k: graded relevance of the top-k chunks (a chunk takes the highest
+    grade of the labelled passages it covers), normalised by the best
+    possible ranking of the corpus' chunks
+  - recall@k: share of the query's labelled passages covered by the top-k
+  - MRR: reciprocal rank of the first relevant chunk
+
+Passages are labelled as text spans rather than chunk ids, so the labels
+survive splitter and chunk-size changes.
+
+Answers go through the app's prompt and Gemini chain behind a record/replay
+cassette (eval/llm_cassette.jsonl.gz, see llm-gateway) and are scored by the
+share of expected facts they mention:
+
+  --llm auto    replay recorded answers; on a miss call Gemini and record
+                (replay only when GEMINI_API_KEY is unset)
+  --llm replay  replay only; a missing recording is reported, not fetched
+  --llm record  always call Gemini and overwrite the recordings
+  --llm off     retrieval metrics only
+
+Recordings are keyed by model, parameters and a hash of the full prompt, so
+with them in place reruns make no API calls and give identical results, and a
+retrieval change can be evaluated offline in seconds. `--latency 1` replays
+with the recorded generation times, for end-to-end timings offline:
+
+    python evaluate_metrics.py --llm off --embeddings hashing
+    python evaluate_metrics.py --llm off --retrieval fixed   # fixed-k baseline
+    python evaluate_metrics.py --output new.json --compare evaluation_results.json
+    python evaluate_metrics.py --llm replay --latency 1
 """
 
+import argparse
+import glob
 import json
+import math
+import os
 import time
 from datetime import datetime
+from langchain_core.documents import Document
+from llm_gateway import BATCH, Cassette, CassetteMiss, get_gateway, lane, set_cassette
+from llm_gateway.telemetry import exporter
+
+EVAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval")
+CORPUS_DIR = os.path.join(EVAL_DIR, "corpus")
+QUERIES_FILE = os.path.join(EVAL_DIR, "queries.json")
+CASSETTE_FILE = os.path.join(EVAL_DIR, "llm_cassette.jsonl.gz")
+K = 5
+
+
+def load_corpus(directory=CORPUS_DIR):
+    docs = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        with open(path) as f:
+            docs.append(Document(page_content=f.read(), metadata={"source": os.path.basename(path)}))
+    return docs
+
+
+def label_spans(docs, queries):
+    """Character span of every labelled passage in its source article."""
+    texts = {d.metadata["source"]: d.page_content for d in docs}
+    for test in queries:
+        for label in test["relevant"]:
+            start = texts[label["source"]].find(label["passage"])
+            if start < 0:
+                raise ValueError(f"Passage not found in {label['source']}: {label['passage'][:60]!r}")
+            label["span"] = (start, start + len(label["passage"]))
+    return queries
+
+
+def covers(chunk, label):
+    """A chunk covers a passage if it holds at least half of it."""
+    if chunk.metadata.get("source") != label["source"]:
+        return False
+    start = chunk.metadata.get("start_index", 0)
+    end = chunk.metadata.get("end_index", start + len(chunk.page_content))
+    overlap = min(end, label["span"][1]) - max(start, label["span"][0])
+    return overlap >= (label["span"][1] - label["span"][0]) / 2
+
+
+def grade(chunk, labels):
+    return max((l["grade"] for l in labels if covers(chunk, l)), default=0)
+
+
+def dcg(grades):
+    return sum((2 ** g - 1) / math.log2(rank + 2) for rank, g in enumerate(grades))
+
+
+def retrieval_metrics(retrieved, chunks, labels, k):
+    grades = [grade(c, labels) for c in retrieved[:k]]
+    ideal = dcg(sorted((grade(c, labels) for c in chunks), reverse=True)[:k])
+    found = [l for l in labels if any(covers(c, l) for c in retrieved[:k])]
+    first = next((rank for rank, g in enumerate(grades, 1) if g > 0), None)
+    return {
+        f"ndcg_at_{k}": dcg(grades) / ideal if ideal else 0.0,
+        f"recall_at_{k}": len(found) / len(labels),
+        "mrr": 1.0 / first if first else 0.0,
+    }
+
+
+def fact_recall(answer, facts):
+    return sum(f.lower() in answer.lower() for f in facts) / len(facts) if facts else 1.0
+
+
+def build_handle(embeddings, split_mode, retrieval="adaptive"):
+    from benchmark_performance import HashingEmbeddings, BACKEND_FOR
+    from src.rag import build_rag_handle
+    from src.utils import Knowledgebase
+
+    docs = load_corpus()
+    kb = Knowledgebase(
+        URL=[d.metadata["source"] for d in docs], split_mode=split_mode,
+        embedding_backend=BACKEND_FOR.get(embeddings, "torch"),
+    )
+    embd = HashingEmbeddings() if embeddings == "hashing" else kb.model()
+    vectorstore = kb.vectorstore(docs, embd)
+    handle = build_rag_handle(kb, embd, vectorstore, semantic_cache=False, retrieval=retrieval)
+    return handle, kb.split(docs)
+
+
+def ranked(handle, questions, k):
+    """Top-k documents per question from the app's retriever, batched. The
+    adaptive retriever may return fewer than k."""
+    from src.adaptive import AdaptiveRetriever
+    from src.bm25 import HybridRetriever
 
-# Simulated test dataset for RAG evaluation
-test_queries = [
-    {
-        "query": "What are the main findings from these articles?",
-        "type": "summary",
-        "expected_relevance": 0.92,
-        "category": "Factual Summary",
-    },
-    {
-        "query": "Compare perspectives on this topic across sources",
-        "type": "comparative",
-        "expected_relevance": 0.87,
-        "category": "Multi-source Comparison",
-    },
-    {
-        "query": "What was the stock market impact?",
-        "type": "factual",
-        "expected_relevance": 0.94,
-        "category": "Specific Fact",
-    },
-    {
-        "query": "List all companies mentioned",
-        "type": "extraction",
-        "expected_relevance": 0.96,
-        "category": "Entity Extraction",
-    },
-    {
-        "query": "How does this relate to previous events?",
-        "type": "contextual",
-        "expected_relevance": 0.81,
-        "category": "Contextual Analysis",
-    },
-    {
-        "query": "What are expert opinions on this?",
-        "type": "synthesis",
-        "expected_relevance": 0.85,
-        "category": "Opinion Synthesis",
-    },
-    {
-        "query": "Timeline of events",
-        "type": "timeline",
-        "expected_relevance": 0.88,
-        "category": "Temporal Ordering",
-    },
-    {
-        "query": "Key risks and opportunities",
-        "type": "analysis",
-        "expected_relevance": 0.84,
-        "category": "Strategic Analysis",
-    },
-    {
-        "query": "What did executive X say?",
-        "type": "quote",
-        "expected_relevance": 0.93,
-        "category": "Direct Quote",
-    },
-    {
-        "query": "Summarize in bullet points",
-        "type": "structured_summary",
-        "expected_relevance": 0.89,
-        "category": "Formatted Summary",
-    },
-]
-
-
-def evaluate_rag_pipeline():
+    if isinstance(handle.retriever, AdaptiveRetriever):
+        return handle.retriever.model_copy(update={"max_k": k}).batch_retrieve(questions)
+    if isinstance(handle.retriever, HybridRetriever):
+        return handle.retriever.model_copy(update={"k": k}).batch_retrieve(questions)
+    from src.bm25 import dense_search_batch, document_at
+    return [
+        [document_at(handle.vectorstore, p) for p, _ in hits]
+        for hits in dense_search_batch(handle.vectorstore, questions, k)
+    ]
+
+
+def evaluate_rag_pipeline(k=K, llm="auto", embeddings="hf", split_mode="recursive",
+                          retrieval="adaptive", latency=0.0):
     """Evaluate RAG pipeline performance"""
     print("=" * 70)
     print("News Research Chatbot - RAG Evaluation")
     print("=" * 70)
 
-    results = {
-        "timestamp": datetime.now().isoformat(),
-        "total_tests": len(test_queries),
-        "retrieval_metrics": {},
-        "answer_quality_metrics": {},
-        "test_details": [],
-    }
-
-    # Category performance expectations
-    category_performance = {
-        "Factual Summary": {"accuracy": 0.89, "retrieval": 0.87},
-        "Multi-source Comparison": {"accuracy": 0.87, "retrieval": 0.85},
-        "Specific Fact": {"accuracy": 0.92, "retrieval": 0.94},
-        "Entity Extraction": {"accuracy": 0.96, "retrieval": 0.98},
-        "Contextual Analysis": {"accuracy": 0.81, "retrieval": 0.79},
-        "Opinion Synthesis": {"accuracy": 0.85, "retrieval": 0.83},
-        "Temporal Ordering": {"accuracy": 0.88, "retrieval": 0.86},
-        "Strategic Analysis": {"accuracy": 0.84, "retrieval": 0.82},
-        "Direct Quote": {"accuracy": 0.93, "retrieval": 0.95},
-        "Formatted Summary": {"accuracy": 0.89, "retrieval": 0.87},
-    }
+    if llm == "auto" and not os.getenv("GEMINI_API_KEY"):
+        llm = "replay"
+    if llm in ("off", "replay"):
+        # The client insists on a key; replayed answers never reach the API.
+        os.environ.setdefault("GEMINI_API_KEY", "replay-only")
 
-    total_time = 0
-    total_accuracy = 0
-    total_retrieval = 0
+    with open(QUERIES_FILE) as f:
+        queries = json.load(f)
+    start = time.perf_counter()
+    handle, chunks = build_handle(embeddings, split_mode, retrieval)
+    build_s = time.perf_counter() - start
+    label_spans(load_corpus(), queries)
 
-    for i, test in enumerate(test_queries, 1):
-        category = test["category"]
-        perf = category_performance[category]
+    from src.context import approx_tokens
 
-        # Simulate retrieval and response time
-        retrieval_time = 0.4
-        generation_time = 1.7
-        total_query_time = retrieval_time + generation_time
-        total_time += total_query_time
+    questions = [t["query"] for t in queries]
+    start = time.perf_counter()
+    retrieved = ranked(handle, questions, k)
+    retrieval_s = time.perf_counter() - start
 
-        # Get expected metrics
-        accuracy = perf["accuracy"]
-        retrieval_ndcg = perf["retrieval"]
+    cache = None
+    if llm != "off":
+        cache = Cassette(CASSETTE_FILE, mode=llm, latency=latency)
+        set_cassette(cache)
 
-        total_accuracy += accuracy
-        total_retrieval += retrieval_ndcg
+    results = {
+        "timestamp": datetime.now().isoformat(),
+        "total_tests": len(queries),
+        "k": k,
+        "llm": llm,
+        "llm_latency": latency,
+        "embeddings": embeddings,
+        "retrieval": retrieval,
+        "chunks": len(chunks),
+        "retrieval_metrics": {},
+        "test_details": [],
+    }
 
-        print(f"\nTest {i}/{len(test_queries)}: {category}")
+    for i, (test, docs) in enumerate(zip(queries, retrieved), 1):
+        metrics = retrieval_metrics(docs, chunks, test["relevant"], k)
+        detail = {
+            "query": test["query"],
+            "category": test["category"],
+            "type": test["type"],
+            "retrieved": [d.metadata.get("source") for d in docs],
+            "retrieved_chunks": len(docs),
+            "retrieved_tokens": sum(approx_tokens(d.page_content) for d in docs),
+            **{name: round(value, 4) for name, value in metrics.items()},
+        }
+        print(f"\nTest {i}/{len(queries)}: {test['category']}")
         print(f"Query: {test['query']}")
-        print(f"✓ Type: {test['type']} | Time: {total_query_time:.2f}s")
         print(
-            f"✓ Retrieval NDCG@5: {retrieval_ndcg:.1%} | Answer Accuracy: {accuracy:.1%}"
+            f"✓ NDCG@{k}: {metrics[f'ndcg_at_{k}']:.1%} | Recall@{k}: {metrics[f'recall_at_{k}']:.1%}"
+            f" | MRR: {metrics['mrr']:.2f} | {len(docs)} chunks, {detail['retrieved_tokens']} tokens"
         )
 
-        # Initialize category if not exists
-        if category not in results["retrieval_metrics"]:
-            results["retrieval_metrics"][category] = {
-                "queries": 0,
-                "avg_ndcg": 0,
-                "avg_accuracy": 0,
-            }
-
-        results["retrieval_metrics"][category]["queries"] += 1
-        results["retrieval_metrics"][category]["avg_ndcg"] = retrieval_ndcg
-        results["retrieval_metrics"][category]["avg_accuracy"] = accuracy
-
-        results["test_details"].append(
-            {
-                "query": test["query"],
-                "category": category,
-                "type": test["type"],
-                "retrieval_time": retrieval_time,
-                "generation_time": generation_time,
-                "total_time": total_query_time,
-                "retrieval_ndcg": retrieval_ndcg,
-                "answer_accuracy": accuracy,
-            }
-        )
-
-    # Calculate summary metrics
-    avg_accuracy = total_accuracy / len(test_queries)
-    avg_retrieval = total_retrieval / len(test_queries)
-    avg_query_time = total_time / len(test_queries)
+        if cache is not None:
+            try:
+                answer = handle.invoke({"input": test["query"]})
+                timings = handle.timings.last()
+                detail["answer"] = answer
+                detail["fact_recall"] = fact_recall(answer, test.get("facts", []))
+                detail["generation_time"] = round(timings.get("generation", 0.0), 4)
+                answer_trace = exporter.last("rag_answer")
+                detail["input_tokens"] = answer_trace["input_tokens"]
+                detail["output_tokens"] = answer_trace["output_tokens"]
+                print(f"✓ Fact recall: {detail['fact_recall']:.1%} | Time: {timings['total']:.2f}s")
+            except CassetteMiss as e:
+                detail["answer_error"] = str(e)
+                print(f"✗ {e}")
 
-    # Simulated additional metrics
-    hallucination_rate = 0.018  # 1.8%
-    bert_score = 0.912
-    mrr = 0.86
-    precision_at_5 = 0.84
+        results["retrieval_metrics"].setdefault(test["category"], metrics)
+        results["test_details"].append(detail)
 
-    # Print summary
-    print("\n" + "=" * 70)
-    print("EVALUATION SUMMARY")
-    print("=" * 70)
-    print(f"Average Answer Accuracy: {avg_accuracy:.1%}")
-    print(f"Average Retrieval NDCG@5: {avg_retrieval:.1%}")
-    print(f"Average Query Time: {avg_query_time:.2f}s")
-    print(f"Hallucination Rate: {hallucination_rate:.1%}")
-
-    print(f"\nRetrieval Metrics:")
-    print(f"  - NDCG@5: {avg_retrieval:.1%}")
-    print(f"  - BERTScore (relevance): {bert_score:.1%}")
-    print(f"  - Mean Reciprocal Rank: {mrr:.3f}")
-    print(f"  - Precision@5: {precision_at_5:.1%}")
-
-    print(f"\nAnswer Quality:")
-    print(f"  - Factual Accuracy: {avg_accuracy:.1%}")
-    print(f"  - Hallucination Rate: <{hallucination_rate:.1%}")
-    print(f"  - Citation Coverage: 94%")
-
-    print(f"\nBy Category:")
-    for cat, metrics in results["retrieval_metrics"].items():
-        print(
-            f"  - {cat}: Accuracy={metrics['avg_accuracy']:.1%}, Retrieval={metrics['avg_ndcg']:.1%}"
-        )
+    if cache is not None:
+        if cache.recorded:
+            cache.compact()
+        set_cassette(None)
 
-    print(f"\nPerformance Benchmarks:")
-    print(f"  - Document Loading: 45 docs/sec")
-    print(f"  - Embedding Generation: ~150ms per document")
-    print(f"  - Retrieval Search: <100ms")
-    print(f"  - Max Concurrent Queries: 50+")
+    def mean(name):
+        values = [d[name] for d in results["test_details"] if name in d]
+        return sum(values) / len(values) if values else None
 
-    # Save results
     results["summary"] = {
-        "avg_accuracy": avg_accuracy,
-        "avg_retrieval_ndcg": avg_retrieval,
-        "avg_query_time": avg_query_time,
-        "hallucination_rate": hallucination_rate,
-        "bert_score": bert_score,
-        "mean_reciprocal_rank": mrr,
-        "precision_at_5": precision_at_5,
+        f"ndcg_at_{k}": mean(f"ndcg_at_{k}"),
+        f"recall_at_{k}": mean(f"recall_at_{k}"),
+        "mrr": mean("mrr"),
+        "retrieved_chunks": mean("retrieved_chunks"),
+        "retrieved_tokens": mean("retrieved_tokens"),
+        "fact_recall": mean("fact_recall"),
+        "answered": sum("answer" in d for d in results["test_details"]),
+        "index_build_s": round(build_s, 3),
+        "retrieval_ms_per_query": round(retrieval_s / len(queries) * 1000, 3),
+        "replayed": cache.hits if cache else 0,
+        "recorded": cache.recorded if cache else 0,
     }
 
-    with open("evaluation_results.json", "w") as f:
-        json.dump(results, f, indent=2)
+    summary = results["summary"]
+    print("\n" + "=" * 70)
+    print("EVALUATION SUMMARY")
+    print("=" * 70)
+    print(f"Retrieval NDCG@{k}: {summary[f'ndcg_at_{k}']:.1%}")
+    print(f"Retrieval Recall@{k}: {summary[f'recall_at_{k}']:.1%}")
+    print(f"Mean Reciprocal Rank: {summary['mrr']:.3f}")
+    print(f"Retrieval: {summary['retrieval_ms_per_query']:.2f}ms per query (batched), "
+          f"{summary['retrieved_chunks']:.1f} chunks / {summary['retrieved_tokens']:.0f} tokens on average")
+    if summary["fact_recall"] is not None:
+        print(f"Answer fact recall: {summary['fact_recall']:.1%} over {summary['answered']} answers")
+    if cache is not None:
+        print(f"LLM: {summary['replayed']} replayed, {summary['recorded']} recorded")
+    return results
 
-    print(f"\n✓ Results saved to evaluation_results.json")
 
-    return results
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)["summary"]
+    print(f"\nΔ vs {previous_path}")
+    for name, value in results["summary"].items():
+        old = previous.get(name)
+        if isinstance(value, float) and isinstance(old, float):
+            print(f"  {name:<24} {old:.4f} -> {value:.4f} ({value - old:+.4f})")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--k", type=int, default=K)
+    parser.add_argument("--llm", choices=["auto", "replay", "record", "off"], default="auto")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="replay with the recorded generation latency times this factor")
+    parser.add_argument("--embeddings", choices=["hf", "onnx", "onnx-int8", "hashing"], default="hf")
+    parser.add_argument("--split-mode", choices=["recursive", "parallel"], default="recursive")
+    parser.add_argument("--retrieval", choices=["adaptive", "fixed"], default="adaptive")
+    parser.add_argument("--output", default="evaluation_results.json")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
     try:
-        results = evaluate_rag_pipeline()
+        # Batch lane: the gateway serves interactive requests first
+        with lane(BATCH):
+            results = evaluate_rag_pipeline(
+                args.k, args.llm, args.embeddings, args.split_mode, args.retrieval, args.latency
+            )
+        results["gateway"] = get_gateway().metrics()
+        results["telemetry"] = exporter.summary()
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results saved to {args.output}")
+        if args.compare:
+            compare(results, args.compare)
         print("\n✓ Evaluation completed successfully!")
     except Exception as e:
         print(f"\n✗ Error during evaluation: {str(e)}")
@@ -0,0 +1,125 @@
+"""Adaptive retrieval depth for the News RAG chain.
+
+A fixed k gives broad questions ("Timeline of events", "Summarize in bullet
+points") too little context and pads simple factual ones. `AdaptiveRetriever`
+fetches `fetch_k` candidates once (dense, plus BM25 fused with RRF when a
+keyword index is given) and then decides how many to return:
+
+  1. relevance floor: a candidate is eligible if its dense similarity or
+     BM25 score is at least `min_relevance` times the best candidate's, so a
+     sharp score gap after the top hits ends the list early,
+  2. MMR: eligible candidates are taken in order of
+     `mmr_lambda * relevance - (1 - mmr_lambda) * redundancy`, redundancy
+     being the MinHash containment in an already chosen chunk; near
+     duplicates (which `ContextPacker` would drop anyway) are skipped,
+  3. token budget: chunks are added while they fit in `max_tokens`, between
+     `min_k` and `max_k` chunks.
+
+The decision (chunks, candidates, tokens, why it stopped) is reported per
+query as `query_stats` and ends up under `stats` in `RAGHandle.timings`.
+"""
+from typing import Any, Callable, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from src.bm25 import dense_search, dense_search_batch, document_at, reciprocal_rank_fusion
+from src.context import approx_tokens, containment, minhash
+from src.instrumentation import report_stage, report_stats
+import time
+
+
+class AdaptiveRetriever(BaseRetriever):
+    """Returns a per-query number of chunks chosen by relevance gap, MMR
+    diversity and a context token budget."""
+
+    vectorstore: Any
+    bm25: Any = None
+    fetch_k: int = 20
+    min_k: int = 1
+    max_k: int = 8
+    max_tokens: int = 1024
+    min_relevance: float = 0.5
+    mmr_lambda: float = 0.7
+    dedup_threshold: float = 0.7
+    rrf_k: int = 60
+    count_tokens: Callable = approx_tokens
+
+    def _candidates(self, query, dense, run_manager=None):
+        """(position, relevance) in fused rank order; relevance is the
+        better of the dense and BM25 scores, each relative to its best."""
+        score_fn = self.vectorstore._select_relevance_score_fn()
+        dense_rel = {p: max(score_fn(d), 0.0) for p, d in dense}
+        sparse_rel = {}
+        rankings = [[p for p, _ in dense]]
+        if self.bm25 is not None:
+            start = time.perf_counter()
+            sparse = self.bm25.search(query, self.fetch_k)
+            report_stage(run_manager, "bm25_search", time.perf_counter() - start)
+            sparse_rel = dict(sparse)
+            rankings.append([p for p, _ in sparse])
+        best_dense = max(dense_rel.values(), default=0.0) or 1.0
+        best_sparse = max(sparse_rel.values(), default=0.0) or 1.0
+        fused = reciprocal_rank_fusion(rankings, rrf_k=self.rrf_k) if len(rankings) > 1 else rankings[0]
+        return [
+            (p, max(dense_rel.get(p, 0.0) / best_dense, sparse_rel.get(p, 0.0) / best_sparse))
+            for p in fused
+        ]
+
+    def select(self, candidates):
+        """Returns (documents, decision) for fused (position, relevance) pairs."""
+        pool = []
+        for rank, (position, relevance) in enumerate(candidates):
+            if rank >= self.min_k and relevance < self.min_relevance:
+                continue
+            doc = document_at(self.vectorstore, position)
+            pool.append((rank, doc, relevance, minhash(doc.page_content), self.count_tokens(doc.page_content)))
+
+        chosen, signatures = [], []
+        used = 0
+        stop = "candidates" if len(pool) == len(candidates) else "relevance"
+        while pool:
+            if len(chosen) >= self.max_k:
+                stop = "max_k"
+                break
+            if len(chosen) < self.min_k:
+                best = 0  # the top fused hits are always kept
+            else:
+                best = max(
+                    range(len(pool)),
+                    key=lambda i: self.mmr_lambda * pool[i][2] - (1 - self.mmr_lambda) * max(
+                        (containment(pool[i][3], s) for s in signatures), default=0.0
+                    ),
+                )
+            rank, doc, _, signature, tokens = pool.pop(best)
+            if any(containment(signature, s) >= self.dedup_threshold for s in signatures):
+                continue
+            if len(chosen) >= self.min_k and used + tokens > self.max_tokens:
+                stop = "budget"
+                continue  # a shorter candidate may still fit
+            chosen.append((rank, doc))
+            signatures.append(signature)
+            used += tokens
+
+        decision = {
+            "chunks": len(chosen),
+            "candidates": len(candidates),
+            "retrieved_tokens": used,
+            "context_budget": self.max_tokens,
+            "depth_stop": stop,
+        }
+        # MMR decides which chunks; they are returned in fused rank order
+        return [doc for _, doc in sorted(chosen, key=lambda item: item[0])], decision
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Any]:
+        dense = dense_search(self.vectorstore, query, self.fetch_k, run_manager)
+        docs, decision = self.select(self._candidates(query, dense, run_manager))
+        report_stats(run_manager, **decision)
+        return docs
+
+    def batch_retrieve(self, queries):
+        """Adaptive retrieval for many queries with one batched dense search."""
+        return [
+            self.select(self._candidates(query, dense))[0]
+            for query, dense in zip(queries, dense_search_batch(self.vectorstore, queries, self.fetch_k))
+        ]
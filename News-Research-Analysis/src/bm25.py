@@ -0,0 +1,197 @@
+"""Keyword retrieval for the News RAG, fused with dense FAISS results.
+
+Dense retrieval with a small k misses exact-match questions (people,
+companies, tickers) whose wording is not semantically distinctive. A BM25
+inverted index built from the same chunks catches those, and reciprocal-rank
+fusion (RRF) merges both rankings without having to calibrate their scores
+against each other.
+
+BM25 document ids are FAISS positions: both indexes are filled with the same
+chunks in the same order, so a position identifies a chunk in either one.
+"""
+from array import array
+from collections import Counter
+from typing import Any, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+from src.instrumentation import report_stage
+from src.embeddings import embed_queries
+import json
+import math
+import os
+import re
+import time
+import numpy as np
+import faiss
+
+BM25_FILE = "bm25.npz"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring.
+
+    Postings are kept per term as two typed arrays (doc ids as uint32, term
+    frequencies as uint16), so memory is ~6 bytes per posting and new chunks
+    can be appended without rebuilding.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = {}
+        self.tfs = {}
+        self.doc_len = array("I")
+        self.total_len = 0
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, texts):
+        """Appends `texts`; they get ids len(self) .. len(self) + len(texts) - 1."""
+        for text in texts:
+            doc_id = len(self.doc_len)
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                if term not in self.doc_ids:
+                    self.doc_ids[term] = array("I")
+                    self.tfs[term] = array("H")
+                self.doc_ids[term].append(doc_id)
+                self.tfs[term].append(min(tf, 65535))
+            self.doc_len.append(len(tokens))
+            self.total_len += len(tokens)
+
+    def search(self, query, k):
+        """Returns up to `k` (doc_id, score) pairs, best first."""
+        n = len(self.doc_len)
+        terms = [t for t in set(tokenize(query)) if t in self.doc_ids]
+        if not n or not terms:
+            return []
+        doc_len = np.frombuffer(self.doc_len, dtype=np.uint32)
+        norm = self.k1 * (1 - self.b + self.b * doc_len / (self.total_len / n))
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            ids = np.frombuffer(self.doc_ids[term], dtype=np.uint32)
+            tf = np.frombuffer(self.tfs[term], dtype=np.uint16).astype(np.float32)
+            idf = math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += idf * tf * (self.k1 + 1) / (tf + norm[ids])
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def save(self, path):
+        terms = list(self.doc_ids)
+        offsets = np.cumsum([0] + [len(self.doc_ids[t]) for t in terms], dtype=np.int64)
+        tmp_path = os.path.join(path, BM25_FILE + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                terms=np.frombuffer(json.dumps(terms).encode(), dtype=np.uint8),
+                offsets=offsets,
+                doc_ids=np.concatenate([np.frombuffer(self.doc_ids[t], dtype=np.uint32) for t in terms])
+                if terms else np.zeros(0, dtype=np.uint32),
+                tfs=np.concatenate([np.frombuffer(self.tfs[t], dtype=np.uint16) for t in terms])
+                if terms else np.zeros(0, dtype=np.uint16),
+                doc_len=np.frombuffer(self.doc_len, dtype=np.uint32),
+                params=np.array([self.k1, self.b]),
+            )
+        os.replace(tmp_path, os.path.join(path, BM25_FILE))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(os.path.join(path, BM25_FILE), allow_pickle=False) as data:
+            k1, b = data["params"]
+            index = cls(k1=float(k1), b=float(b))
+            terms = json.loads(data["terms"].tobytes().decode())
+            offsets = data["offsets"]
+            doc_ids = data["doc_ids"]
+            tfs = data["tfs"]
+            for i, term in enumerate(terms):
+                start, end = offsets[i], offsets[i + 1]
+                index.doc_ids[term] = array("I", doc_ids[start:end].tobytes())
+                index.tfs[term] = array("H", tfs[start:end].tobytes())
+            index.doc_len = array("I", data["doc_len"].tobytes())
+        index.total_len = sum(index.doc_len)
+        return index
+
+
+def _search(vectorstore, embeddings, k):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(embeddings)
+    distances, positions = vectorstore.index.search(embeddings, k)
+    return [
+        [(int(p), float(d)) for p, d in zip(row_p, row_d) if p != -1]
+        for row_p, row_d in zip(positions, distances)
+    ]
+
+
+def dense_search(vectorstore, query, k, run_manager=None):
+    """Returns (faiss position, distance) pairs for the `k` nearest chunks."""
+    start = time.perf_counter()
+    embedding = [vectorstore.embedding_function.embed_query(query)]
+    embedded = time.perf_counter()
+    hits = _search(vectorstore, embedding, k)[0]
+    report_stage(run_manager, "query_embedding", embedded - start)
+    report_stage(run_manager, "vector_search", time.perf_counter() - embedded)
+    return hits
+
+
+def dense_search_batch(vectorstore, queries, k):
+    """`dense_search` for many queries: one embedding batch, one FAISS search."""
+    if not queries:
+        return []
+    return _search(vectorstore, embed_queries(vectorstore.embedding_function, queries), k)
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    """Fuses ranked id lists; returns ids ordered by sum of 1 / (rrf_k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def document_at(vectorstore, position):
+    return vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+
+
+class HybridRetriever(BaseRetriever):
+    """Retrieves `fetch_k` candidates from FAISS and from BM25 and returns the
+    top `k` after reciprocal-rank fusion."""
+
+    vectorstore: Any
+    bm25: Any
+    k: int = 2
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Any]:
+        dense = [p for p, _ in dense_search(self.vectorstore, query, self.fetch_k, run_manager)]
+        start = time.perf_counter()
+        sparse = [p for p, _ in self.bm25.search(query, self.fetch_k)]
+        report_stage(run_manager, "bm25_search", time.perf_counter() - start)
+        fused = reciprocal_rank_fusion([dense, sparse], rrf_k=self.rrf_k)[: self.k]
+        return [document_at(self.vectorstore, p) for p in fused]
+
+    def batch_retrieve(self, queries):
+        """Retrieves for many queries at once; returns one document list per
+        query. Dense candidates come from a single batched search."""
+        results = []
+        for query, dense in zip(queries, dense_search_batch(self.vectorstore, queries, self.fetch_k)):
+            sparse = [p for p, _ in self.bm25.search(query, self.fetch_k)]
+            fused = reciprocal_rank_fusion([[p for p, _ in dense], sparse], rrf_k=self.rrf_k)[: self.k]
+            results.append([document_at(self.vectorstore, p) for p in fused])
+        return results
@@ -0,0 +1,146 @@
+"""Semantic answer cache for the News RAG chain.
+
+Analysts ask the same questions, in slightly different words, against the
+same knowledge base. Every one of them pays for retrieval and a full Gemini
+generation. The cache stores answers keyed on the knowledge-base version
+and the question embedding; a later question whose embedding has cosine
+similarity >= `threshold` with a cached one, against the same knowledge-base
+version, is answered from the cache.
+"""
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import run_in_executor
+import threading
+import time
+import numpy as np
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+
+class SemanticCache:
+    """LRU + TTL cache of answers, looked up by question similarity."""
+
+    def __init__(self, embd, threshold=0.95, max_entries=256, ttl=3600):
+        self.embd = embd
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (version, normalized question) -> [unit vector, answer, created_at]
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _embed(self, question):
+        vector = np.asarray(self.embd.embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _expire(self, now):
+        expired = [k for k, (_, _, created) in self.entries.items() if now - created > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        self.evictions += len(expired)
+
+    def lookup(self, version, question):
+        """Returns (answer or None, question vector or None). The vector is
+        handed back so a miss can be stored without embedding twice."""
+        key = (version, _normalize(question))
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][1], None
+            candidates = [(k, e) for k, e in self.entries.items() if k[0] == version]
+
+        vector = self._embed(question)
+        if candidates:
+            matrix = np.stack([e[0] for _, e in candidates])
+            sims = matrix @ vector
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                with self.lock:
+                    best_key = candidates[best][0]
+                    if best_key in self.entries:
+                        self.entries.move_to_end(best_key)
+                        self.hits += 1
+                        return self.entries[best_key][1], vector
+        with self.lock:
+            self.misses += 1
+        return None, vector
+
+    def store(self, version, question, answer, vector=None):
+        if vector is None:
+            vector = self._embed(question)
+        with self.lock:
+            self.entries[(version, _normalize(question))] = [vector, answer, time.time()]
+            self.entries.move_to_end((version, _normalize(question)))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedRAGChain(Runnable):
+    """Wraps a RAG chain taking {"input": question}; answers near-duplicate
+    questions for the same knowledge-base version from `cache`.
+
+    When streaming, a hit is yielded as one chunk; a miss streams the inner
+    chain and caches the chunks' sum once the stream completes.
+    """
+
+    def __init__(self, chain, cache, version):
+        self.chain = chain
+        self.cache = cache
+        self.version = version
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        question = input["input"]
+        answer, vector = self.cache.lookup(self.version, question)
+        if answer is not None:
+            return answer
+        answer = self.chain.invoke(input, config, **kwargs)
+        self.cache.store(self.version, question, answer, vector)
+        return answer
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        question = input["input"]
+        answer, vector = self.cache.lookup(self.version, question)
+        if answer is not None:
+            yield answer
+            return
+        final = None
+        for chunk in self.chain.stream(input, config, **kwargs):
+            final = chunk if final is None else final + chunk
+            yield chunk
+        self.cache.store(self.version, question, final, vector)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        question = input["input"]
+        answer, vector = await run_in_executor(config, self.cache.lookup, self.version, question)
+        if answer is not None:
+            yield answer
+            return
+        final = None
+        async for chunk in self.chain.astream(input, config, **kwargs):
+            final = chunk if final is None else final + chunk
+            yield chunk
+        await run_in_executor(config, self.cache.store, self.version, question, final, vector)
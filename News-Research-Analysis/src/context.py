@@ -0,0 +1,142 @@
+"""Context assembly for the News RAG prompt.
+
+Retrieved chunks overlap: `Knowledgebase.split` uses a 200-character
+overlap, and syndicated stories appear verbatim on several sites. Pasting
+them into the prompt as-is pays for the same text more than once.
+`ContextPacker` turns the ranked chunks into a prompt context by
+
+  1. merging chunks that are adjacent or overlapping in the same document
+     (using the `start_index` the splitter records),
+  2. dropping near-duplicates: chunks whose word shingles are mostly
+     contained in an already kept chunk, estimated with MinHash,
+  3. keeping chunks in relevance order until the token budget is spent,
+
+and records the tokens saved for each query.
+"""
+from collections import deque
+from src.instrumentation import report_stats
+import threading
+import zlib
+import numpy as np
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+# Permutations h -> (a*h + b) mod (2^61 - 1). crc32 hashes and `a` are
+# below 2^32, so a*h fits in uint64 and is reduced before adding b: no step
+# wraps mod 2^64, which would break the hash family's independence.
+_MERSENNE = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def approx_tokens(text):
+    """~4 characters per token for English text; good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def minhash(text):
+    words = text.lower().split()
+    shingles = {
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(max(1, len(words) - SHINGLE_SIZE + 1))
+    }
+    hashes = np.array([zlib.crc32(s.encode()) for s in shingles], dtype=np.uint64)
+    permuted = ((hashes[:, None] * _PERM_A) % _MERSENNE + _PERM_B) % _MERSENNE
+    return permuted.min(axis=0), len(shingles)
+
+
+def containment(a, b):
+    """Estimated share of the smaller shingle set found in the larger one,
+    from MinHash signatures and set sizes: |A & B| = J * (|A| + |B|) / (1 + J)."""
+    (sig_a, n_a), (sig_b, n_b) = a, b
+    j = float(np.mean(sig_a == sig_b))
+    return j * (n_a + n_b) / (1 + j) / min(n_a, n_b)
+
+
+def merge_adjacent(docs):
+    """Merges chunks of the same source whose character spans touch or
+    overlap. Returns (text, metadata, best rank) triples in rank order."""
+    spans = {}
+    loose = []
+    for rank, doc in enumerate(docs):
+        start = doc.metadata.get("start_index")
+        if start is None or start < 0:
+            loose.append((doc.page_content, doc.metadata, rank))
+            continue
+        spans.setdefault(doc.metadata.get("source"), []).append((start, doc, rank))
+
+    merged = []
+    for items in spans.values():
+        items.sort(key=lambda item: item[0])
+        start, doc, rank = items[0]
+        text, end = doc.page_content, start + len(doc.page_content)
+        for next_start, next_doc, next_rank in items[1:]:
+            if next_start <= end:
+                text += next_doc.page_content[end - next_start:]
+                end = max(end, next_start + len(next_doc.page_content))
+                rank = min(rank, next_rank)
+            else:
+                merged.append((text, doc.metadata, rank))
+                start, doc, rank = next_start, next_doc, next_rank
+                text, end = doc.page_content, start + len(doc.page_content)
+        merged.append((text, doc.metadata, rank))
+
+    return sorted(merged + loose, key=lambda item: item[2])
+
+
+class ContextPacker:
+    """Builds the prompt context from ranked documents under `max_tokens`."""
+
+    def __init__(self, max_tokens=1024, dedup_threshold=0.7, count_tokens=approx_tokens,
+                 separator="\n\n", history_size=100):
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.count_tokens = count_tokens
+        self.separator = separator
+        self.history = deque(maxlen=history_size)
+        self.lock = threading.Lock()
+        self.total_saved = 0
+
+    def pack(self, docs):
+        """Returns (context string, stats dict)."""
+        raw_tokens = self.count_tokens(self.separator.join(d.page_content for d in docs))
+        candidates = merge_adjacent(docs)
+
+        kept, signatures = [], []
+        duplicates = over_budget = 0
+        used = 0
+        for text, _, _ in candidates:
+            signature = minhash(text)
+            if any(containment(signature, s) >= self.dedup_threshold for s in signatures):
+                duplicates += 1
+                continue
+            tokens = self.count_tokens(text)
+            if kept and used + tokens > self.max_tokens:
+                over_budget += 1
+                continue
+            kept.append(text)
+            signatures.append(signature)
+            used += tokens
+
+        context = self.separator.join(kept)
+        stats = {
+            "retrieved_chunks": len(docs),
+            "merged_chunks": len(docs) - len(candidates),
+            "duplicate_chunks": duplicates,
+            "over_budget_chunks": over_budget,
+            "raw_tokens": raw_tokens,
+            "context_tokens": self.count_tokens(context),
+        }
+        stats["tokens_saved"] = raw_tokens - stats["context_tokens"]
+        with self.lock:
+            self.history.append(stats)
+            self.total_saved += stats["tokens_saved"]
+        return context, stats
+
+    def __call__(self, docs, run_manager=None):
+        # RunnableLambda passes run_manager, so the tokens actually sent
+        # show up in the invocation's timing record.
+        context, stats = self.pack(docs)
+        report_stats(run_manager, context_tokens=stats["context_tokens"])
+        return context
@@ -0,0 +1,128 @@
+"""Embedding backends for `Knowledgebase.model()`.
+
+All backends run all-MiniLM-L6-v2 through sentence-transformers and return
+the same 384-d vectors, so an index built with one can be queried with
+another:
+
+  torch      - the default PyTorch model
+  onnx       - the ONNX export shipped in the model repo, run with ONNX Runtime
+  onnx-int8  - the dynamically int8-quantized ONNX export (AVX2 build by
+               default; set NEWS_RAG_ONNX_INT8_FILE for e.g. the AVX512-VNNI
+               or ARM64 file), ~2-3x faster on CPU
+
+The ONNX backends need `pip install "sentence-transformers[onnx]"`.
+
+`HuggingFaceEmbeddings.embed_documents` hands the whole list to
+`SentenceTransformer.encode`, which sorts texts by length before batching,
+so each batch is padded only to its own longest text; `batch_size` controls
+how many texts go through the model at once.
+
+`make_embeddings` wraps the model in `CachedQueryEmbeddings`, so a question
+is embedded once even though the semantic cache and the retriever both need
+its vector, and repeated questions skip the model entirely.
+"""
+from collections import OrderedDict
+from functools import lru_cache
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+import os
+import threading
+
+EMBEDDING_DIM = 384
+DEFAULT_BATCH_SIZE = 64
+QUERY_CACHE_SIZE = int(os.getenv("NEWS_RAG_QUERY_CACHE_SIZE", "1024"))
+ONNX_INT8_FILE = os.getenv("NEWS_RAG_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+BACKENDS = {
+    "torch": {},
+    "onnx": {"backend": "onnx"},
+    "onnx-int8": {"backend": "onnx", "model_kwargs": {"file_name": ONNX_INT8_FILE}},
+}
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps an Embeddings object with an LRU cache of query vectors.
+    `embed_queries` embeds a list of questions, sending only the uncached
+    ones through the model, in one batch. all-MiniLM-L6-v2 is symmetric
+    (no query prompt), so that batch goes through `embed_documents`."""
+
+    def __init__(self, embd, maxsize=QUERY_CACHE_SIZE):
+        self.embd = embd
+        self.maxsize = maxsize
+        self.vectors = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        return self.embd.embed_documents(texts)
+
+    def _get(self, text):
+        with self.lock:
+            vector = self.vectors.get(text)
+            if vector is not None:
+                self.vectors.move_to_end(text)
+                self.hits += 1
+            return vector
+
+    def _put(self, text, vector):
+        with self.lock:
+            self.misses += 1
+            self.vectors[text] = tuple(vector)
+            self.vectors.move_to_end(text)
+            while len(self.vectors) > self.maxsize:
+                self.vectors.popitem(last=False)
+
+    def embed_query(self, text):
+        vector = self._get(text)
+        if vector is None:
+            vector = self.embd.embed_query(text)
+            self._put(text, vector)
+        return list(vector)
+
+    def embed_queries(self, texts):
+        found = {text: self._get(text) for text in dict.fromkeys(texts)}
+        missing = [text for text, vector in found.items() if vector is None]
+        if missing:
+            for text, vector in zip(missing, self.embd.embed_documents(missing)):
+                self._put(text, vector)
+                found[text] = vector
+        return [list(found[text]) for text in texts]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.vectors),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def embed_queries(embd, texts):
+    """Embeds several questions in one batch, through the query cache when
+    `embd` has one."""
+    if hasattr(embd, "embed_queries"):
+        return embd.embed_queries(texts)
+    return embd.embed_documents(texts)
+
+
+@lru_cache(maxsize=None)
+def make_embeddings(model_name, backend="torch", batch_size=DEFAULT_BATCH_SIZE, device="cpu"):
+    """Returns a LangChain Embeddings object for `backend`, checked to
+    produce EMBEDDING_DIM-dimensional vectors. Memoized, so every knowledge
+    base in the process shares one copy of the model and of the query
+    embedding cache."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {list(BACKENDS)}.")
+    embd = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={"device": device, **BACKENDS[backend]},
+        encode_kwargs={"batch_size": batch_size},
+    )
+    dim = len(embd.embed_query("dimension check"))
+    if dim != EMBEDDING_DIM:
+        raise ValueError(
+            f"Embedding backend {backend!r} produced {dim}-d vectors; the index expects {EMBEDDING_DIM}."
+        )
+    return CachedQueryEmbeddings(embd)
@@ -0,0 +1,98 @@
+"""FAISS index construction for the News RAG vectorstore.
+
+`Knowledgebase` used to rely on `FAISS.from_documents`, which always builds
+an exact `IndexFlatL2`. That is fine for a handful of pages but search cost
+grows linearly with the corpus. This module builds approximate indexes
+through the FAISS index factory:
+
+  flat  - exact search (default for small corpora)
+  ivf   - inverted lists; `nlist` coarse clusters, `nprobe` searched
+  hnsw  - graph index; `M` links per node, `efSearch` candidates per query
+
+and each can store vectors as float32, float16 (`SQfp16`) or product
+quantized codes (`PQ`). Run `benchmark_ann.py` to see recall vs latency
+for these options.
+"""
+import math
+import numpy as np
+import faiss
+
+INDEX_TYPES = ("auto", "flat", "ivf", "hnsw")
+STORAGE_TYPES = ("float32", "float16", "pq")
+
+# Below this many vectors exact search costs a few milliseconds and IVF can
+# not be trained well, so "auto" stays flat. Above it "auto" picks IVF, which
+# had the best recall/latency trade-off in benchmark_ann.py (see README).
+AUTO_FLAT_LIMIT = 20_000
+# FAISS wants ~39 training points per IVF centroid (and 256 per PQ centroid).
+MIN_POINTS_PER_CENTROID = 39
+
+DEFAULT_SEARCH_PARAMS = {"nprobe": 16, "efSearch": 64}
+
+
+def default_nlist(n):
+    """Number of IVF clusters for `n` vectors (~4 * sqrt(n), power of two)."""
+    nlist = 2 ** round(math.log2(max(4 * math.sqrt(n), 1)))
+    return max(1, min(nlist, n // MIN_POINTS_PER_CENTROID))
+
+
+def default_pq_m(dim):
+    """Largest PQ sub-quantizer count <= dim / 8 that divides `dim`."""
+    m = max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def factory_string(index_type, n, dim, storage="float32", nlist=None, hnsw_m=32, pq_m=None):
+    """Returns the faiss.index_factory description for the requested index."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index_type {index_type!r}; expected one of {INDEX_TYPES}.")
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage {storage!r}; expected one of {STORAGE_TYPES}.")
+
+    if index_type == "auto":
+        index_type = "flat" if n < AUTO_FLAT_LIMIT else "ivf"
+    if index_type == "ivf" and n < MIN_POINTS_PER_CENTROID * 2:
+        # Too few vectors to train a coarse quantizer; exact search is cheaper anyway.
+        index_type = "flat"
+    if storage == "pq" and n < 256:
+        storage = "float16"
+
+    codec = {
+        "float32": "Flat",
+        "float16": "SQfp16",
+        "pq": f"PQ{pq_m or default_pq_m(dim)}",
+    }[storage]
+
+    if index_type == "flat":
+        return codec
+    if index_type == "ivf":
+        return f"IVF{nlist or default_nlist(n)},{codec}"
+    if storage == "float32":
+        return f"HNSW{hnsw_m}"
+    return f"HNSW{hnsw_m}_{codec}"
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """Applies query-time knobs; parameters the index does not have are ignored."""
+    params = faiss.ParameterSpace()
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    if ef_search is not None and hasattr(faiss.downcast_index(index), "hnsw"):
+        params.set_index_parameter(index, "efSearch", ef_search)
+    return index
+
+
+def build_index(vectors, description, train_size=100_000, seed=0):
+    """Creates, trains (on a random sample of at most `train_size` vectors)
+    and returns an empty index. Vectors are added by the caller."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = faiss.index_factory(vectors.shape[1], description)
+    if not index.is_trained:
+        sample = vectors
+        if len(vectors) > train_size:
+            rng = np.random.default_rng(seed)
+            sample = vectors[rng.choice(len(vectors), train_size, replace=False)]
+        index.train(sample)
+    return index
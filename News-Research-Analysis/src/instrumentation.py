@@ -0,0 +1,137 @@
+"""Per-invocation stage timings for the News RAG chain.
+
+`StageTimingHandler` is a LangChain callback handler; pass one in the
+`callbacks` config of a chain invocation and it records how long each stage
+took. Standard callbacks cover retrieval, prompt build and generation (plus
+time-to-first-token when the model streams). The finer-grained retriever
+stages (query embedding, vector search, BM25 search) are reported by
+`HybridRetriever` as custom events named `stage_timing`, and per-query
+values that are not timings (chunks chosen by the adaptive retriever,
+context tokens) as `query_stats` events, which are kept apart from the
+timings, under the record's `stats` key.
+"""
+from collections import deque
+from langchain_core.callbacks import BaseCallbackHandler
+import threading
+import time
+
+STAGE_EVENT = "stage_timing"
+STATS_EVENT = "query_stats"
+
+# run_name given to the LCEL steps we want timed as chain runs
+PROMPT_BUILD = "prompt_build"
+CONTEXT_PACK = "context_pack"
+
+
+def report_stage(run_manager, stage, seconds):
+    """Emits a stage timing from inside a runnable that has a run_manager."""
+    if run_manager is not None:
+        run_manager.get_child().on_custom_event(
+            STAGE_EVENT, {"stage": stage, "seconds": seconds}, run_id=run_manager.run_id
+        )
+
+
+def report_stats(run_manager, **stats):
+    """Emits per-query values (counts, tokens, decisions) for the record."""
+    if run_manager is not None:
+        run_manager.get_child().on_custom_event(STATS_EVENT, stats, run_id=run_manager.run_id)
+
+
+class StageTimingHandler(BaseCallbackHandler):
+    """Collects stage durations (seconds) for one chain invocation in `timings`."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings = {}
+        self.stats = {}
+        self._started = {}
+        self._first_token = None
+        self._generation_start = None
+        self._lock = threading.Lock()
+
+    def _begin(self, run_id, stage):
+        self._started[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id):
+        stage, started = self._started.pop(run_id, (None, None))
+        if stage is not None:
+            self._add(stage, time.perf_counter() - started)
+
+    def _add(self, stage, seconds):
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._begin(run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        if kwargs.get("name") in (PROMPT_BUILD, CONTEXT_PACK):
+            self._begin(run_id, kwargs["name"])
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._begin(run_id, "generation")
+        self._generation_start = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, **kwargs)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if self._first_token is None:
+            self._first_token = time.perf_counter()
+            self._add("ttft", self._first_token - self._generation_start)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        if name == STAGE_EVENT:
+            self._add(data["stage"], data["seconds"])
+        elif name == STATS_EVENT:
+            with self._lock:
+                self.stats.update(data)
+
+    def finish(self, **extra):
+        """Closes the record with the total wall time and returns it: stage
+        seconds at the top level, per-query values under `stats`."""
+        record = {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
+        record["total"] = round(time.perf_counter() - self.start, 4)
+        record.update(extra)
+        with self._lock:
+            record["stats"] = dict(self.stats)
+        return record
+
+
+class TimingLog:
+    """Bounded history of per-invocation timing records."""
+
+    def __init__(self, maxlen=200):
+        self.records = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+
+    def append(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def last(self):
+        return self.records[-1] if self.records else None
+
+    def summary(self):
+        """Mean seconds per stage over the recorded invocations."""
+        with self.lock:
+            records = list(self.records)
+        totals, counts = {}, {}
+        for record in records:
+            for stage, value in record.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[stage] = totals.get(stage, 0.0) + value
+                    counts[stage] = counts.get(stage, 0) + 1
+        return {stage: round(totals[stage] / counts[stage], 4) for stage in totals}
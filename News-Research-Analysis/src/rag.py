@@ -1,30 +1,162 @@
 from src.utils import Knowledgebase
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.store import index_path, store_exists
+from src.bm25 import HybridRetriever, dense_search_batch, document_at
+from src.adaptive import AdaptiveRetriever
+from src.cache import SemanticCache, CachedRAGChain
+from src.context import ContextPacker
+from src.instrumentation import StageTimingHandler, TimingLog, PROMPT_BUILD, CONTEXT_PACK
+from llm_gateway import observe, routed_chat, trace
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from src.prompt import system_prompt
 from dotenv import load_dotenv
+import copy
 import os
 from operator import itemgetter
 
 load_dotenv()
 
+GATEWAY_STAGES = ("generation", "ttft")
 
-def load_rag_chain(urls: str):
+
+class RAGHandle:
+    """What `load_rag_chain` returns: the chain plus the pieces it is built
+    from, so callers (the app, benchmarks, evaluation) can reach the
+    retriever and vectorstore directly.
+
+    `invoke` returns the answer string; `stream`/`astream` yield the chain's
+    dict chunks: {"docs": [...]} once retrieval is done, then {"answer": ...}
+    token chunks. All three run the chain with a `StageTimingHandler`
+    attached and append the per-stage timings to `timings`; `timings.last()`
+    is the most recent record and `timings.summary()` the mean per stage.
+    Each answer is also a `rag_answer` trace in the shared telemetry (see
+    llm_gateway.telemetry), which gets the same stages as spans.
+    """
+
+    def __init__(self, chain, retriever, vectorstore, knowledgebase, packer, cache=None):
+        self.chain = chain
+        self.retriever = retriever
+        self.vectorstore = vectorstore
+        self.knowledgebase = knowledgebase
+        self.packer = packer
+        self.cache = cache
+        self.timings = TimingLog()
+
+    def _timed(self, config):
+        handler = StageTimingHandler()
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [handler]
+        return handler, config
+
+    def _record(self, handler):
+        cache_hit = "generation" not in handler.timings and self.cache is not None
+        self.timings.append(handler.finish(cache_hit=cache_hit))
+        for stage, seconds in handler.timings.items():
+            # the gateway reports generation itself, as llm_call and ttft
+            if stage not in GATEWAY_STAGES:
+                observe(stage, seconds)
+
+    def invoke(self, input, config=None, **kwargs):
+        handler, config = self._timed(config)
+        with trace("rag_answer"):
+            result = self.chain.invoke(input, config, **kwargs)
+            self._record(handler)
+        return result["answer"]
+
+    def stream(self, input, config=None, **kwargs):
+        handler, config = self._timed(config)
+        with trace("rag_answer"):
+            yield from self.chain.stream(input, config, **kwargs)
+            self._record(handler)
+
+    async def astream(self, input, config=None, **kwargs):
+        handler, config = self._timed(config)
+        with trace("rag_answer"):
+            async for chunk in self.chain.astream(input, config, **kwargs):
+                yield chunk
+            self._record(handler)
+
+    def batch_retrieve(self, questions):
+        """Retrieves context for many questions with one embedding batch and
+        one FAISS search; returns one document list per question."""
+        if isinstance(self.retriever, (HybridRetriever, AdaptiveRetriever)):
+            return self.retriever.batch_retrieve(questions)
+        k = self.retriever.search_kwargs.get("k", 4)
+        return [
+            [document_at(self.vectorstore, p) for p, _ in hits]
+            for hits in dense_search_batch(self.vectorstore, questions, k)
+        ]
+
+
+RETRIEVAL_MODES = ("adaptive", "fixed")
+
+
+def load_rag_chain(urls: str, session_id: str = None, rebuild: bool = False,
+                   semantic_cache: bool = True, context_packer: ContextPacker = None,
+                   retrieval: str = "adaptive", max_age: float = None):
+    """Builds the knowledge base for `urls`, or reopens its saved store.
+    `rebuild=True` re-fetches and re-embeds every article. With `max_age`
+    (seconds), a reopened store whose sources were last fetched longer ago
+    is first brought up to date with `Knowledgebase.refresh`."""
     url_list = [u.strip() for u in urls.split(",") if u.strip()]
     if not url_list:
         raise ValueError("No URLs provided.")
-    kb = Knowledgebase(URL=url_list)
-    docs = kb.load()
-    if not docs:
-        raise ValueError("No documents loaded from the provided URLs.")
+    kb = Knowledgebase(URL=url_list, index_dir=index_path(url_list, session_id))
+    embd = kb.model()
+    if store_exists(kb.index_dir) and not rebuild:
+        vectorstore = kb.restore(embd)
+        if max_age is not None and kb.sources_age() > max_age:
+            vectorstore = kb.refresh(embd) or vectorstore
+    else:
+        docs = kb.load()
+        if not docs:
+            raise ValueError("No documents loaded from the provided URLs.")
+        vectorstore = kb.vectorstore(docs, embd)
+    return build_rag_handle(kb, embd, vectorstore, semantic_cache, context_packer, retrieval)
+
+
+def refresh_rag_chain(handle):
+    """Refreshes the handle's knowledge base from its source URLs (see
+    `Knowledgebase.refresh`). Returns a new handle over the updated store,
+    or None if no article changed. `handle` itself is left untouched, so
+    queries running on it finish against the old index."""
+    kb = copy.copy(handle.knowledgebase)
     embd = kb.model()
-    vectorstore = kb.vectorstore(docs, embd)
-    retriever = vectorstore.as_retriever(
-        search_type="similarity", search_kwargs={"k": 2}
+    vectorstore = kb.refresh(embd)
+    handle.knowledgebase.last_refresh = kb.last_refresh
+    if vectorstore is None:
+        return None
+    retrieval = "adaptive" if isinstance(handle.retriever, AdaptiveRetriever) else "fixed"
+    return build_rag_handle(
+        kb, embd, vectorstore, handle.cache is not None, handle.packer, retrieval
     )
 
+
+def build_rag_handle(kb, embd, vectorstore, semantic_cache=True, context_packer=None,
+                     retrieval="adaptive"):
+    if retrieval not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {retrieval!r}; expected one of {RETRIEVAL_MODES}.")
+    # Merges overlapping chunks, drops near-duplicates and enforces the
+    # context token budget; per-query savings are kept in packer.history.
+    packer = context_packer or ContextPacker()
+
+    if retrieval == "adaptive":
+        # Chunk count picked per query by relevance gap and MMR diversity
+        # within the packer's token budget (see src/adaptive.py).
+        retriever = AdaptiveRetriever(
+            vectorstore=vectorstore, bm25=kb.bm25, max_tokens=packer.max_tokens,
+            count_tokens=packer.count_tokens,
+        )
+    elif kb.bm25 is not None:
+        # Dense + BM25 candidates fused with RRF, so exact names and tickers
+        # are found without raising k and inflating the prompt.
+        retriever = HybridRetriever(vectorstore=vectorstore, bm25=kb.bm25, k=2)
+    else:
+        retriever = vectorstore.as_retriever(
+            search_type="similarity", search_kwargs={"k": 2}
+        )
+
     prompt = ChatPromptTemplate.from_messages(
         [
             ("system", system_prompt),
@@ -33,26 +165,35 @@ def load_rag_chain(urls: str):
     )
 
     gemini_api = os.getenv("GEMINI_API_KEY")
-    gemini = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
+    # Model tier picked per answer from the prompt size, i.e. mostly the
+    # packed context (see llm_gateway.router)
+    gemini = routed_chat(
+        api_key=gemini_api,
         temperature=0.2,
         max_output_tokens=1024,
         top_p=0.95,
         top_k=40,
-        google_api_key=gemini_api,
     )
 
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
-
-    rag_chain = (
+    answer_chain = (
         {
-            "context": itemgetter("input") | retriever | format_docs,
+            "context": itemgetter("docs")
+            | RunnableLambda(packer).with_config(run_name=CONTEXT_PACK),
             "input": itemgetter("input"),
         }
-        | prompt
+        | prompt.with_config(run_name=PROMPT_BUILD)
         | gemini
         | StrOutputParser()
     )
-    
-    return rag_chain
+    # Output is {"input", "docs", "answer"}. When streamed, "docs" arrives as
+    # soon as retrieval finishes and "answer" follows token by token.
+    rag_chain = (
+        RunnablePassthrough.assign(docs=itemgetter("input") | retriever)
+        .assign(answer=answer_chain)
+    )
+
+    cache = None
+    if semantic_cache:
+        cache = SemanticCache(embd)
+        rag_chain = CachedRAGChain(rag_chain, cache, kb.version)
+    return RAGHandle(rag_chain, retriever, vectorstore, kb, packer, cache)
@@ -0,0 +1,187 @@
+"""Background refresh of a knowledge base's source articles.
+
+News pages change after they are loaded, and re-clicking "Load Knowledge
+Base" re-downloads and re-embeds every article in the request thread. The
+pieces here let `Knowledgebase.refresh` do the minimum instead:
+
+  - `SourceState` keeps, next to the store in sources.db, each article's
+    HTTP validators (ETag / Last-Modified), a hash of its extracted text and
+    its chunks with their embeddings,
+  - `fetch_article` makes a conditional GET, so an unchanged page costs a
+    304 and no parsing; a 200 whose extracted text hashes the same as before
+    is also treated as unchanged (ads, timestamps in markup),
+  - only changed articles are split and embedded; the index is rebuilt from
+    the stored vectors of the others,
+  - `SourceRefresher` runs the refresh on a daemon thread, so queries never
+    wait on ingestion. The rebuilt store is moved into place file by file
+    (see `save_vectorstore`) and the caller swaps in a new handle, while
+    in-flight queries finish on the old one.
+"""
+from langchain_core.documents import Document
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+import requests
+
+SOURCES_FILE = "sources.db"
+DEFAULT_REFRESH_INTERVAL = 900
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def fetch_article(url, etag=None, last_modified=None, timeout=30):
+    """Conditional GET of `url`. Returns None if the server answers 304 Not
+    Modified, else (text, etag, last_modified) with the text extracted the
+    way `UnstructuredURLLoader` extracts it."""
+    from unstructured.partition.auto import partition
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    elements = partition(
+        file=io.BytesIO(response.content),
+        content_type=response.headers.get("Content-Type", "text/html").split(";")[0],
+    )
+    text = "\n\n".join(str(el) for el in elements)
+    return text, response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+
+class SourceState:
+    """Per-article validators, content hash and embedded chunks. Changes are
+    only committed by `commit()`, so a refresh that fails half-way is
+    retried in full next time."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                checked_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                url TEXT,
+                seq INTEGER,
+                content TEXT,
+                metadata TEXT,
+                vector BLOB,
+                PRIMARY KEY (url, seq)
+            );
+            """
+        )
+
+    def article(self, url):
+        row = self.conn.execute(
+            "SELECT etag, last_modified, content_hash FROM articles WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return {}
+        return {"etag": row[0], "last_modified": row[1], "content_hash": row[2]}
+
+    def checked_at(self):
+        """When the least recently checked article was last checked (fetched,
+        or tried and failed), or None."""
+        return self.conn.execute("SELECT MIN(checked_at) FROM articles").fetchone()[0]
+
+    def mark_checked(self, url, etag=None, last_modified=None):
+        self.conn.execute(
+            "UPDATE articles SET etag = COALESCE(?, etag), "
+            "last_modified = COALESCE(?, last_modified), checked_at = ? WHERE url = ?",
+            (etag, last_modified, time.time(), url),
+        )
+
+    def replace_article(self, url, content_hash, chunks, vectors, etag=None, last_modified=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?)",
+            (url, etag, last_modified, content_hash, time.time()),
+        )
+        self.conn.execute("DELETE FROM chunks WHERE url = ?", (url,))
+        self.conn.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?, ?)",
+            [
+                (url, seq, chunk.page_content, json.dumps(chunk.metadata),
+                 np.asarray(vector, dtype=np.float32).tobytes())
+                for seq, (chunk, vector) in enumerate(zip(chunks, vectors))
+            ],
+        )
+
+    def corpus(self, urls):
+        """All stored chunks and vectors, in `urls` order."""
+        chunks, vectors = [], []
+        for i, url in enumerate(urls):
+            rows = self.conn.execute(
+                "SELECT content, metadata, vector FROM chunks WHERE url = ? ORDER BY seq", (url,)
+            )
+            for content, metadata, vector in rows:
+                metadata = json.loads(metadata)
+                if "doc" in metadata:
+                    metadata["doc"] = i
+                chunks.append(Document(page_content=content, metadata=metadata))
+                vectors.append(np.frombuffer(vector, dtype=np.float32).tolist())
+        return chunks, vectors
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+class SourceRefresher:
+    """Calls `refresh()` every `interval` seconds on a daemon thread. Errors
+    are kept in `last_error` rather than stopping the schedule."""
+
+    def __init__(self, refresh, interval=DEFAULT_REFRESH_INTERVAL):
+        self.refresh = refresh
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+        self.runs = 0
+        self.last_run = None
+        self.last_error = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self._run, name="kb-refresher", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            self.runs += 1
+            self.last_run = time.time()
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,208 @@
+"""Process-wide registry of loaded knowledge bases for the News app.
+
+Streamlit keeps `st.session_state` per browser session, so storing a RAG
+chain there builds one FAISS index per analyst even when they load the same
+URLs, and nothing is freed when they leave. The registry instead
+
+  - keys knowledge bases by the normalized URL set, so identical loads share
+    one read-only index (and concurrent identical loads build it once),
+  - counts which sessions reference each one (a session that has not been
+    seen for `session_ttl` seconds no longer counts, since Streamlit gives
+    no end-of-session hook),
+  - evicts least-recently-used entries when the estimated memory exceeds
+    the budget, unreferenced ones first. Evicted stores stay on disk, and
+    reopening one memory-maps its index (milliseconds for any index type,
+    see `store.read_flags`), so `get` on an evicted key is cheap.
+
+Sessions keep only the key and call `get(key, session_id)` per request.
+With a `refresher` (e.g. `refresh_rag_chain`), `start_refresh()` polls the
+loaded knowledge bases' sources in the background and swaps in the updated
+handle; a request that already holds the old handle finishes on it.
+"""
+from collections import OrderedDict
+from src.store import normalize_urls, INDEX_FILE
+from src.bm25 import BM25_FILE
+from src.refresh import SourceRefresher, DEFAULT_REFRESH_INTERVAL
+import os
+import threading
+import time
+
+DEFAULT_MEMORY_BUDGET_MB = int(os.getenv("NEWS_RAG_MEMORY_BUDGET_MB", "1024"))
+DEFAULT_SESSION_TTL = 3600
+
+
+def estimate_bytes(handle):
+    """Memory footprint of a loaded knowledge base, estimated from its store
+    files (index + BM25 postings); falls back to the raw vector size."""
+    index_dir = handle.knowledgebase.index_dir
+    if index_dir and os.path.exists(os.path.join(index_dir, INDEX_FILE)):
+        size = os.path.getsize(os.path.join(index_dir, INDEX_FILE))
+        bm25_path = os.path.join(index_dir, BM25_FILE)
+        if os.path.exists(bm25_path):
+            size += os.path.getsize(bm25_path)
+        return size
+    index = handle.vectorstore.index
+    return index.ntotal * index.d * 4
+
+
+class _Entry:
+    def __init__(self, urls):
+        self.urls = urls
+        self.handle = None
+        self.size = 0
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+
+
+class KnowledgebaseRegistry:
+    def __init__(self, loader, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                 session_ttl=DEFAULT_SESSION_TTL, refresher=None):
+        """`loader(urls_csv, rebuild=False)` builds or reopens a knowledge
+        base handle, e.g. `load_rag_chain`; `refresher(handle)` returns an updated handle
+        or None, e.g. `refresh_rag_chain`."""
+        self.loader = loader
+        self.refresher = refresher
+        self.background = None
+        self.refreshes = 0
+        self.budget = memory_budget_mb * 2**20
+        self.session_ttl = session_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(urls):
+        if isinstance(urls, str):
+            urls = urls.split(",")
+        return tuple(normalize_urls(urls))
+
+    def acquire(self, urls, session_id, rebuild=False):
+        """Registers `session_id` as a user of the knowledge base for `urls`,
+        loading it if needed, and returns its key. `rebuild=True` re-fetches
+        the articles and swaps the new handle in for every session."""
+        key = self.key(urls)
+        if not key:
+            raise ValueError("No URLs provided.")
+        with self.lock:
+            entry = self.entries.setdefault(key, _Entry(key))
+            entry.sessions[session_id] = time.time()
+        if rebuild:
+            self._rebuild(key, entry)
+        else:
+            self._load(key, entry)
+        return key
+
+    def get(self, key, session_id=None):
+        """Returns the handle for `key`, reopening it if it was evicted."""
+        with self.lock:
+            entry = self.entries.setdefault(key, _Entry(key))
+            if session_id is not None:
+                entry.sessions[session_id] = time.time()
+        return self._load(key, entry)
+
+    def release(self, key, session_id):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry.sessions.pop(session_id, None)
+
+    def _load(self, key, entry):
+        # Per-entry lock: concurrent loads of the same URL set wait for one build.
+        with entry.lock:
+            handle = entry.handle
+            if handle is None:
+                handle = self.loader(",".join(entry.urls))
+                entry.handle = handle
+                entry.size = estimate_bytes(handle)
+                self.loads += 1
+        self._touch(key)
+        return handle
+
+    def _touch(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            self._evict(keep=key)
+
+    def _rebuild(self, key, entry):
+        # Like refresh(): other sessions keep querying the old handle while
+        # the articles are re-fetched, and a background refresh of the same
+        # store waits (or finishes first).
+        with entry.refresh_lock:
+            handle = self.loader(",".join(entry.urls), rebuild=True)
+            with entry.lock:
+                entry.handle = handle
+                entry.size = estimate_bytes(handle)
+                self.loads += 1
+        self._touch(key)
+        return handle
+
+    def refresh(self, key):
+        """Refreshes one loaded knowledge base; returns True if it changed.
+        The rebuild runs without holding any lock `get` waits on."""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or entry.handle is None or self.refresher is None:
+            return False
+        if not entry.refresh_lock.acquire(blocking=False):
+            return False  # already being refreshed
+        try:
+            old = entry.handle
+            new = self.refresher(old) if old is not None else None
+            if new is None:
+                return False
+            with self.lock:
+                if entry.handle is not old:
+                    return False  # evicted meanwhile
+                entry.handle = new
+                entry.size = estimate_bytes(new)
+                self.refreshes += 1
+            return True
+        finally:
+            entry.refresh_lock.release()
+
+    def refresh_all(self):
+        with self.lock:
+            keys = [k for k, e in self.entries.items() if e.handle is not None]
+        return sum(self.refresh(key) for key in keys)
+
+    def start_refresh(self, interval=DEFAULT_REFRESH_INTERVAL):
+        """Starts (once) a daemon thread calling `refresh_all` every
+        `interval` seconds."""
+        if self.background is None:
+            self.background = SourceRefresher(self.refresh_all, interval)
+        return self.background.start()
+
+    def _refcount(self, entry, now):
+        return sum(1 for seen in entry.sessions.values() if now - seen <= self.session_ttl)
+
+    def _evict(self, keep):
+        now = time.time()
+        loaded = [(k, e) for k, e in self.entries.items() if e.handle is not None and k != keep]
+        used = sum(e.size for e in self.entries.values() if e.handle is not None)
+        # LRU order, entries without live sessions first
+        for key, entry in sorted(loaded, key=lambda item: self._refcount(item[1], now) > 0):
+            if used <= self.budget:
+                break
+            used -= entry.size
+            entry.handle = None
+            self.evictions += 1
+            if not self._refcount(entry, now):
+                del self.entries[key]
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            loaded = [e for e in self.entries.values() if e.handle is not None]
+            return {
+                "knowledge_bases": len(self.entries),
+                "loaded": len(loaded),
+                "memory_mb": round(sum(e.size for e in loaded) / 2**20, 1),
+                "budget_mb": round(self.budget / 2**20, 1),
+                "active_sessions": sum(self._refcount(e, now) for e in self.entries.values()),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+            }
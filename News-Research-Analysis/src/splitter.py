@@ -0,0 +1,142 @@
+"""Sentence-aware, multi-process text splitting for large news corpora.
+
+`RecursiveCharacterTextSplitter` runs in one process and copies each source
+document's metadata dict into every chunk. For multi-MB article dumps that
+makes splitting a noticeable share of ingestion. `split_documents` here
+
+  - packs whole sentences (never crossing a paragraph break unless a
+    paragraph is larger than a chunk) up to `chunk_size`, carrying trailing
+    sentences up to `chunk_overlap` into the next chunk,
+  - measures size in characters or, with `unit="tokens"`, in tokens of the
+    embedding model's tokenizer,
+  - runs over documents in a process pool; workers return only
+    (start, end) character offsets, and chunks carry `source`, `doc`,
+    `start_index` and `end_index` instead of a copy of the document metadata.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from langchain_core.documents import Document
+import os
+import re
+
+# Below this many characters the pool start-up costs more than it saves.
+PARALLEL_MIN_CHARS = 2_000_000
+
+_SENTENCE_RE = re.compile(r"[^.!?\n]*(?:[.!?]+[\"')\]]*|\n+|$)\s*")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+
+_tokenizer = None
+_tokenizer_name = None
+
+
+def _init_tokenizer(model_name):
+    global _tokenizer, _tokenizer_name
+    if model_name != _tokenizer_name:
+        _tokenizer = None
+        if model_name:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(model_name)
+        _tokenizer_name = model_name
+
+
+def _length(text):
+    if _tokenizer is None:
+        return len(text)
+    return len(_tokenizer.encode(text, add_special_tokens=False))
+
+
+def sentence_spans(text):
+    """(start, end, paragraph number) for each sentence of `text`."""
+    spans = []
+    paragraph = 0
+    para_breaks = [m.end() for m in _PARAGRAPH_RE.finditer(text)]
+    next_break = 0
+    for match in _SENTENCE_RE.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        while next_break < len(para_breaks) and para_breaks[next_break] <= start:
+            paragraph += 1
+            next_break += 1
+        spans.append((start, end, paragraph))
+    return spans
+
+
+def _hard_split(start, end, size):
+    return [(s, min(s + size, end)) for s in range(start, end, size)]
+
+
+def split_spans(text, chunk_size=1000, chunk_overlap=200):
+    """Returns (start, end) offsets of chunks of `text`."""
+    sentences = []
+    for start, end, paragraph in sentence_spans(text):
+        length = end - start if _tokenizer is None else _length(text[start:end])
+        if length > chunk_size:
+            # a single run-on "sentence" larger than a chunk: cut it by characters
+            chars = max(1, chunk_size * (end - start) // length)
+            sentences += [(s, e, paragraph, _length(text[s:e])) for s, e in _hard_split(start, end, chars)]
+        else:
+            sentences.append((start, end, paragraph, length))
+
+    chunks = []
+    current = []
+    size = 0
+    for sentence in sentences:
+        _, _, paragraph, length = sentence
+        starts_paragraph = current and paragraph != current[-1][2]
+        if current and (size + length > chunk_size or (starts_paragraph and size >= chunk_size * 3 // 4)):
+            chunks.append((current[0][0], current[-1][1]))
+            # carry the tail of the chunk over as overlap
+            carried, carried_size = [], 0
+            for prev in reversed(current):
+                if carried_size + prev[3] > chunk_overlap:
+                    break
+                carried.insert(0, prev)
+                carried_size += prev[3]
+            while carried and carried_size + length > chunk_size:
+                carried_size -= carried.pop(0)[3]
+            current, size = carried, carried_size
+        current.append(sentence)
+        size += length
+    if current:
+        chunks.append((current[0][0], current[-1][1]))
+    return [(s, e) for s, e in chunks if text[s:e].strip()]
+
+
+def _split_worker(args):
+    text, chunk_size, chunk_overlap = args
+    return split_spans(text, chunk_size, chunk_overlap)
+
+
+def split_documents(documents, chunk_size=1000, chunk_overlap=200, unit="chars",
+                    tokenizer_model=None, workers=None):
+    """Splits `documents` into chunk Documents, in parallel for large inputs."""
+    if unit not in ("chars", "tokens"):
+        raise ValueError(f"Unknown chunk unit {unit!r}; expected 'chars' or 'tokens'.")
+    if unit == "tokens" and not tokenizer_model:
+        raise ValueError("unit='tokens' needs tokenizer_model.")
+    model_name = tokenizer_model if unit == "tokens" else None
+    jobs = [(doc.page_content, chunk_size, chunk_overlap) for doc in documents]
+
+    total_chars = sum(len(doc.page_content) for doc in documents)
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(documents) > 1 and total_chars >= PARALLEL_MIN_CHARS:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_tokenizer, initargs=(model_name,)
+        ) as pool:
+            all_spans = list(pool.map(_split_worker, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        _init_tokenizer(model_name)
+        all_spans = [_split_worker(job) for job in jobs]
+
+    chunks = []
+    for i, (doc, spans) in enumerate(zip(documents, all_spans)):
+        source = doc.metadata.get("source")
+        text = doc.page_content
+        for start, end in spans:
+            chunks.append(
+                Document(
+                    page_content=text[start:end],
+                    metadata={"source": source, "doc": i, "start_index": start, "end_index": end},
+                )
+            )
+    return chunks
@@ -1,36 +1,214 @@
 from langchain_community.document_loaders import UnstructuredURLLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS    
-from langchain_huggingface import HuggingFaceEmbeddings
-import pickle
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from src.store import save_vectorstore, load_vectorstore, read_meta
+from src.bm25 import BM25Index, BM25_FILE
+from src.splitter import split_documents
+from src.embeddings import make_embeddings, DEFAULT_BATCH_SIZE
+from src.index import factory_string, build_index, set_search_params, DEFAULT_SEARCH_PARAMS
+from src.refresh import SourceState, SOURCES_FILE, fetch_article, text_hash
+from langchain_core.documents import Document
+import hashlib
 import os
+import time
 
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
-class Knowledgebase(): 
-    def __init__(self, URL):
+
+def content_version(contents):
+    digest = hashlib.sha256()
+    for text in contents:
+        digest.update(hashlib.sha256(text.encode()).digest())
+    return digest.hexdigest()[:16]
+
+
+class Knowledgebase():
+    def __init__(self, URL, index_dir=None, index_type="auto", storage="float32",
+                 nprobe=None, ef_search=None, split_mode="recursive", chunk_unit="chars",
+                 split_workers=None, embedding_backend="torch",
+                 embedding_batch_size=DEFAULT_BATCH_SIZE):
         self.URL = URL if isinstance(URL, list) else [URL]
+        self.index_dir = index_dir
+        # See src/index.py and benchmark_ann.py for the index options.
+        self.index_type = index_type
+        self.storage = storage
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # "parallel" uses the sentence-aware process-pool splitter in src/splitter.py
+        self.split_mode = split_mode
+        self.chunk_unit = chunk_unit
+        self.split_workers = split_workers
+        # "torch", "onnx" or "onnx-int8"; see src/embeddings.py
+        self.embedding_backend = embedding_backend
+        self.embedding_batch_size = embedding_batch_size
+        # Keyword index over the same chunks, filled by vectorstore()/restore()
+        self.bm25 = None
+        # Content hash of the indexed chunks; changes whenever the KB does
+        self.version = None
+        # Per-URL outcome of the last refresh(): "not_modified", "unchanged",
+        # "changed" or the error message
+        self.last_refresh = {}
 
-    def load(self): 
+    def load(self):
         loaders = UnstructuredURLLoader(urls=self.URL)
-        documents = loaders.load() 
+        documents = loaders.load()
         return documents
-    
+
     def split(self, documents):
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        if self.split_mode == "parallel":
+            # 256 tokens is all-MiniLM-L6-v2's max sequence length
+            return split_documents(
+                documents,
+                chunk_size=1000 if self.chunk_unit == "chars" else 256,
+                chunk_overlap=200 if self.chunk_unit == "chars" else 48,
+                unit=self.chunk_unit,
+                tokenizer_model=EMBEDDING_MODEL,
+                workers=self.split_workers,
+            )
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000, chunk_overlap=200, add_start_index=True
+        )
         texts = text_splitter.split_documents(documents)
         return texts
-    
-    def model(self): 
-        embd  = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+    def model(self):
+        embd = make_embeddings(
+            EMBEDDING_MODEL, self.embedding_backend, self.embedding_batch_size
+        )
         return embd
-    
+
     def vectorstore(self, texts, embd):
+        documents = texts
         texts = self.split(texts)
         if not texts:
             raise ValueError("No text chunks to index. Please check your URLs or document loader.")
-        embd = self.model()
-        vectorstore = FAISS.from_documents(texts, embd)
-        with open("vectorstore.pkl", "wb") as f:
-            pickle.dump(vectorstore, f)
+        vectors = embd.embed_documents([t.page_content for t in texts])
+        if self.index_dir:
+            # Remember what each article looked like, for refresh()
+            os.makedirs(self.index_dir, exist_ok=True)
+            state = SourceState(os.path.join(self.index_dir, SOURCES_FILE))
+            try:
+                for doc in documents:
+                    url = doc.metadata.get("source")
+                    idx = [i for i, t in enumerate(texts) if t.metadata.get("source") == url]
+                    state.replace_article(
+                        url, text_hash(doc.page_content),
+                        [texts[i] for i in idx], [vectors[i] for i in idx],
+                    )
+                state.commit()
+            finally:
+                state.close()
+        return self._build(texts, vectors, embd)
+
+    def _build(self, texts, vectors, embd):
+        contents = [t.page_content for t in texts]
+        self.version = content_version(contents)
+
+        description = factory_string(self.index_type, len(vectors), len(vectors[0]), self.storage)
+        index = build_index(vectors, description)
+        search_params = {
+            "nprobe": self.nprobe or DEFAULT_SEARCH_PARAMS["nprobe"],
+            "efSearch": self.ef_search or DEFAULT_SEARCH_PARAMS["efSearch"],
+        }
+        set_search_params(index, search_params["nprobe"], search_params["efSearch"])
+
+        vectorstore = FAISS(embd, index, InMemoryDocstore(), {})
+        vectorstore.add_embeddings(
+            zip(contents, vectors), metadatas=[t.metadata for t in texts]
+        )
+        self.bm25 = BM25Index()
+        self.bm25.add(contents)
+        if self.index_dir:
+            save_vectorstore(
+                vectorstore,
+                self.index_dir,
+                EMBEDDING_MODEL,
+                index_factory=description,
+                search_params=search_params,
+                keyword_index=self.bm25,
+                version=self.version,
+            )
+        return vectorstore
+
+    def refresh(self, embd, fetch=fetch_article):
+        """Re-fetches the source URLs with conditional requests and, if any
+        article's text changed, rebuilds the store re-embedding only those
+        articles. Returns the new vectorstore, or None if nothing changed.
+        A URL that fails to fetch keeps its previous content."""
+        if not self.index_dir:
+            raise ValueError("Knowledgebase has no index_dir to refresh.")
+        state = SourceState(os.path.join(self.index_dir, SOURCES_FILE))
+        try:
+            self.last_refresh = {}
+            changed = []
+            for url in self.URL:
+                known = state.article(url)
+                try:
+                    fetched = fetch(url, known.get("etag"), known.get("last_modified"))
+                except Exception as e:
+                    self.last_refresh[url] = f"{type(e).__name__}: {e}"
+                    # Counts as checked: a dead URL must not make the store
+                    # look stale forever (see sources_age)
+                    state.mark_checked(url)
+                    continue
+                if fetched is None:
+                    self.last_refresh[url] = "not_modified"
+                    state.mark_checked(url)
+                    continue
+                text, etag, last_modified = fetched
+                if text_hash(text) == known.get("content_hash"):
+                    self.last_refresh[url] = "unchanged"
+                    state.mark_checked(url, etag, last_modified)
+                    continue
+                self.last_refresh[url] = "changed"
+                changed.append((Document(page_content=text, metadata={"source": url}), etag, last_modified))
+            if not changed:
+                state.commit()
+                return None
+
+            texts = self.split([doc for doc, _, _ in changed])
+            vectors = embd.embed_documents([t.page_content for t in texts]) if texts else []
+            for doc, etag, last_modified in changed:
+                url = doc.metadata["source"]
+                idx = [i for i, t in enumerate(texts) if t.metadata.get("source") == url]
+                state.replace_article(
+                    url, text_hash(doc.page_content),
+                    [texts[i] for i in idx], [vectors[i] for i in idx], etag, last_modified,
+                )
+            texts, vectors = state.corpus(self.URL)
+            if not texts:
+                raise ValueError("No text chunks to index after refresh.")
+            vectorstore = self._build(texts, vectors, embd)
+            state.commit()
+            return vectorstore
+        except Exception:
+            state.rollback()
+            raise
+        finally:
+            state.close()
+
+    def sources_age(self):
+        """Seconds since the source URLs were last checked (inf if unknown).
+        A fetch that failed counts as a check; the article keeps its content."""
+        path = os.path.join(self.index_dir, SOURCES_FILE) if self.index_dir else None
+        if not path or not os.path.exists(path):
+            return float("inf")
+        state = SourceState(path)
+        try:
+            checked = state.checked_at()
+        finally:
+            state.close()
+        return time.time() - checked if checked else float("inf")
+
+    def restore(self, embd):
+        """Opens the vectorstore previously saved to `index_dir`."""
+        if not self.index_dir:
+            raise ValueError("Knowledgebase has no index_dir to restore from.")
+        vectorstore = load_vectorstore(
+            self.index_dir, embd, EMBEDDING_MODEL, nprobe=self.nprobe, ef_search=self.ef_search
+        )
+        self.version = read_meta(self.index_dir).get("kb_version") or self.index_dir
+        if os.path.exists(os.path.join(self.index_dir, BM25_FILE)):
+            self.bm25 = BM25Index.load(self.index_dir)
         return vectorstore
-        
\ No newline at end of file
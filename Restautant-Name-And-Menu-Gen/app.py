@@ -1,7 +1,12 @@
 # app.py
+import asyncio
 import streamlit as st
 from dotenv import load_dotenv
-from src.chains import get_restaurant_name_chain, get_menu_idea_chain
+from llm_gateway import trace
+from llm_gateway.telemetry import exporter, telemetry
+from src.menu_stream import stream_menu, format_menu_item, MENU_ITEMS
+from src.pipeline import generate_candidates, generate_names_and_menus, NUM_CANDIDATES, MENUS_FOR
+from src.pool import SuggestionPool, PoolRefiller
 from src.utils import load_cuisines, load_styles
 
 # Load environment variables
@@ -19,11 +24,22 @@ if not cuisines or not styles:
     st.error("Error loading cuisines or styles data. Please check 'data/' directory.")
     st.stop()
 
+# --- Pre-generated name pool, shared across sessions and kept full in the background ---
+@st.cache_resource
+def get_pool():
+    pool = SuggestionPool()
+    refiller = PoolRefiller(pool, [(c, s) for c in cuisines for s in styles], generate_candidates)
+    return pool, refiller.start()
+
+pool, refiller = get_pool()
+
 # --- Input Form ---
 with st.form("generator_form"):
     st.header("Generate a Restaurant Name")
     selected_cuisine = st.selectbox("Select Cuisine:", options=[""] + cuisines, index=0)
     selected_style = st.selectbox("Select Style:", options=[""] + styles, index=0)
+    num_candidates = st.slider("Name candidates:", min_value=1, max_value=10, value=NUM_CANDIDATES)
+    menus_for = st.slider("Menus for the top candidates:", min_value=0, max_value=10, value=MENUS_FOR)
 
     name_submit_button = st.form_submit_button("Generate Name")
 
@@ -33,21 +49,64 @@ if name_submit_button:
     if not selected_cuisine or not selected_style:
         st.warning("Please select both a cuisine and a style to generate a name.")
     else:
-        with st.spinner("Generating restaurant name..."):
-            name_chain = get_restaurant_name_chain()
-            try:
-                response = name_chain.invoke({"cuisine": selected_cuisine, "style": selected_style})
-                restaurant_name = response.strip() # Corrected: response is a string
+        # Names stream in from one call; menus for the first candidates are
+        # generated concurrently and rendered as soon as each one finishes.
+        slots = {}
+        menu_lines = {}
+
+        def slot(rank):
+            if rank not in slots:
+                slots[rank] = (st.empty(), st.empty())
+            return slots[rank]
+
+        # Served from the pool when it has suggestions for this pair, live otherwise
+        pooled = pool.take(selected_cuisine, selected_style, num_candidates)
+        refiller.wake(selected_cuisine, selected_style)
+
+        async def render():
+            async for event in generate_names_and_menus(
+                selected_cuisine, selected_style, n=num_candidates, menus_for=menus_for,
+                candidates=pooled or None,
+            ):
+                if event["type"] == "name":
+                    name_slot, menu_slot = slot(event["rank"])
+                    name_slot.markdown(f"**{event['rank'] + 1}. {event['name']}** ({event['score']:g}/10) — {event['reason']}")
+                    if event["rank"] < menus_for:
+                        menu_slot.caption("Generating menu ideas...")
+                elif event["type"] == "menu_item":
+                    lines = menu_lines.setdefault(event["rank"], [])
+                    lines.append(format_menu_item(event["item"]))
+                    slot(event["rank"])[1].markdown("\n".join(lines))
+                elif event["type"] == "menu":
+                    stats = event["stats"]
+                    lines = menu_lines.get(event["rank"], [])
+                    slot(event["rank"])[1].markdown("\n".join(lines) + (
+                        f"\n\n_{stats['items']} items · first token after {stats['ttft_s']}s · "
+                        f"{stats['items_per_sec']} items/s_"
+                    ))
+                elif event["type"] == "error":
+                    slot(event["rank"])[1].warning(f"Menu generation failed: {event['error']}")
+                elif event["type"] == "done" and event["candidates"]:
+                    return event["candidates"][0]["name"]
+
+        st.subheader("Suggested Restaurant Names:")
+        st.caption("From the pre-generated pool" if pooled else "Generated live")
+        try:
+            with trace("restaurant_names"):
+                restaurant_name = asyncio.run(render())
+            if restaurant_name:
                 st.success(f"**Suggested Restaurant Name:** {restaurant_name}")
                 st.session_state["generated_name"] = restaurant_name
-            except Exception as e:
-                st.error(f"Error generating name. See details below and console output.")
-                import traceback
-                tb_str = traceback.format_exc()
-                st.text_area("Detailed Error Information (Name Generation):", f"{type(e).__name__}: {str(e)}\n\n{tb_str}", height=300)
-                print("--- Full Traceback for Name Generation Error ---")
-                traceback.print_exc()
-                print("--- End of Traceback ---")
+            else:
+                st.warning("No restaurant names were generated. Please try again.")
+        except Exception as e:
+            st.error(f"Error generating name. See details below and console output.")
+            import traceback
+            tb_str = traceback.format_exc()
+            st.text_area("Detailed Error Information (Name Generation):", f"{type(e).__name__}: {str(e)}\n\n{tb_str}", height=300)
+            print("--- Full Traceback for Name Generation Error ---")
+            traceback.print_exc()
+            print("--- End of Traceback ---")
 
 # --- Menu Idea Generation (only if a name was generated) ---
 if "generated_name" in st.session_state and st.session_state["generated_name"]:
@@ -65,29 +124,55 @@ if "generated_name" in st.session_state and st.session_state["generated_name"]:
 
     menu_cuisine = st.selectbox("Select Cuisine for Menu (can be different):", options=[""] + cuisines, index=cuisines.index(selected_cuisine) if selected_cuisine in cuisines else 0)
 
+    menu_size = st.slider("Menu items:", min_value=3, max_value=20, value=MENU_ITEMS)
+
     menu_submit_button = st.button("Generate Menu Ideas")
 
     if menu_submit_button:
         if not restaurant_name_for_menu or not menu_cuisine:
             st.warning("Please provide a restaurant name and select a cuisine for menu generation.")
         else:
-            with st.spinner("Generating menu ideas..."):
-                menu_chain = get_menu_idea_chain()
-                try:
-                    response = menu_chain.invoke({"restaurant_name": restaurant_name_for_menu, "cuisine": menu_cuisine})
-                    menu_ideas = response.strip() # Corrected: response is a string
-                    st.subheader("Suggested Menu Items:")
-                    st.markdown(menu_ideas)
-                except Exception as e:
-                    st.error(f"Error generating menu ideas. See details below and console output.")
-                    import traceback
-                    tb_str = traceback.format_exc()
-                    st.text_area("Detailed Error Information (Menu Generation):", f"{type(e).__name__}: {str(e)}\n\n{tb_str}", height=300)
-                    print("--- Full Traceback for Menu Idea Generation Error ---")
-                    traceback.print_exc()
-                    print("--- End of Traceback ---")
+            st.subheader("Suggested Menu Items:")
+            menu_slot = st.empty()
+            stats_slot = st.empty()
+            lines = []
+            try:
+                # Each item is rendered as soon as its line has been generated
+                with trace("restaurant_menu"):
+                    for event in stream_menu(restaurant_name_for_menu, menu_cuisine, n=menu_size):
+                        if event["type"] == "item":
+                            lines.append(format_menu_item(event["item"]))
+                            menu_slot.markdown("\n".join(lines))
+                        else:
+                            stats = event["stats"]
+                            if not stats["items"]:
+                                st.warning("No menu items were generated. Please try again.")
+                            stats_slot.caption(
+                                f"{stats['items']} items in {stats['total_s']}s · first token after {stats['ttft_s']}s · "
+                                f"first item after {stats['first_item_s']}s · {stats['items_per_sec']} items/s"
+                            )
+            except Exception as e:
+                st.error(f"Error generating menu ideas. See details below and console output.")
+                import traceback
+                tb_str = traceback.format_exc()
+                st.text_area("Detailed Error Information (Menu Generation):", f"{type(e).__name__}: {str(e)}\n\n{tb_str}", height=300)
+                print("--- Full Traceback for Menu Idea Generation Error ---")
+                traceback.print_exc()
+                print("--- End of Traceback ---")
 else:
     st.info("Generate a restaurant name first to get menu ideas!")
 
+with st.expander("Suggestion pool"):
+    st.json(refiller.stats())
+
+with st.expander("Telemetry"):
+    totals = telemetry.totals()
+    st.caption(
+        f"{totals['llm_calls']} model calls · {totals['input_tokens']} input / "
+        f"{totals['output_tokens']} output tokens · ~${totals['cost_usd']:.4f}"
+    )
+    # per request type: mean seconds per stage (llm_call, ttft), tokens and cost
+    st.json(exporter.summary())
+
 st.markdown("---")
 st.markdown("Developed with ❤️ using Streamlit, Langchain, and Gemini API.")
\ No newline at end of file
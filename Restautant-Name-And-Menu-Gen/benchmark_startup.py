@@ -0,0 +1,104 @@
+"""
+Startup benchmark for the Restaurant Name & Menu Generator.
+
+Every Streamlit rerun imports the app's modules, so their import time is
+paid before anything is generated. This runs `python -X importtime` in a
+fresh interpreter and reports:
+
+  - the cumulative import time of the app modules (src.chains, src.pipeline,
+    src.pool, src.utils, src.llm_model), checked against --budget-ms (exit status 1 when over),
+  - the slowest individual imports, to see what to defer next,
+  - the one-off cost of building the shared Gemini client and all chains
+    on first use (with a placeholder key if none is set; nothing is sent).
+
+    python benchmark_startup.py
+    python benchmark_startup.py --budget-ms 300 --runs 5 --top 15
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+APP_MODULES = ["src.chains", "src.pipeline", "src.pool", "src.utils", "src.llm_model"]
+DEFAULT_BUDGET_MS = 200
+
+FIRST_USE = """
+import time
+start = time.perf_counter()
+from src.chains import get_restaurant_name_chain, get_menu_idea_chain
+from src.pipeline import get_name_candidates_chain
+from src.menu_stream import get_menu_stream_chain
+get_restaurant_name_chain()
+get_menu_idea_chain()
+get_name_candidates_chain()
+get_menu_stream_chain()
+print(round((time.perf_counter() - start) * 1000, 1))
+"""
+
+
+def importtime(modules):
+    """Returns (total ms, [(cumulative ms, module)]) for one cold import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    entries = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative) / 1000, name.strip()))
+        if not name[1:].startswith(" "):  # top-level import
+            total_us += int(cumulative)
+    return total_us / 1000, sorted(entries, reverse=True)
+
+
+def first_use_ms():
+    env = dict(os.environ)
+    env.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_USE], capture_output=True, text=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def run_benchmark(runs, top, budget_ms):
+    print("=" * 70)
+    print("🚀 Restaurant Generator Startup Benchmark")
+    print("=" * 70)
+    totals = []
+    for _ in range(runs):
+        total, entries = importtime(APP_MODULES)
+        totals.append(total)
+    median = statistics.median(totals)
+
+    print(f"\nImport of {', '.join(APP_MODULES)}")
+    print(f"   median {median:.1f}ms over {runs} runs (min {min(totals):.1f}ms, budget {budget_ms}ms)")
+    print(f"\nSlowest imports (cumulative, last run):")
+    for ms, name in entries[:top]:
+        print(f"   {ms:>9.1f}ms  {name}")
+
+    first_use = first_use_ms()
+    if first_use is not None:
+        print(f"\nFirst use (shared client + all chains): {first_use:.1f}ms")
+
+    within = median <= budget_ms
+    print(f"\n{'✓' if within else '✗'} Import time {'within' if within else 'over'} budget")
+    return within
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.runs, args.top, args.budget_ms) else 1)
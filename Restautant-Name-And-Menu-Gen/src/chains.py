@@ -1,9 +1,14 @@
-from src.prompt_template import restaurant_name_chain, menu_items_chain
+from functools import lru_cache
+from src.prompt_template import get_llm, get_prompt
 
+@lru_cache(maxsize=None)
 def get_restaurant_name_chain():
-    """Returns the chain for generating restaurant names."""
-    return restaurant_name_chain
+    """Returns the chain for generating restaurant names, built on first call."""
+    from langchain_core.output_parsers import StrOutputParser
+    return get_prompt("prompt_template_name") | get_llm() | StrOutputParser()
 
+@lru_cache(maxsize=None)
 def get_menu_idea_chain():
-    """Returns the chain for generating menu ideas."""
-    return menu_items_chain
\ No newline at end of file
+    """Returns the chain for generating menu ideas, built on first call."""
+    from langchain_core.output_parsers import StrOutputParser
+    return get_prompt("prompt_template_item") | get_llm() | StrOutputParser()
@@ -1,18 +1,7 @@
-import os
-import google.generativeai as genai
-from dotenv import load_dotenv
+from src.prompt_template import get_llm
 
-load_dotenv() # Load your API keys from .env
-
-# Get your Gemini API key
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env. Please set it.")
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-# Initialize the Gemini Pro model
-model = genai.GenerativeModel('gemini-1.5-flash')
+# Uses the same lazily built Gemini client as the LangChain chains, so the
+# direct path neither configures a second SDK client nor raises at import.
 
 def generate_restaurant_name_api(cuisine: str, style: str) -> str:
     """Generates a restaurant name using the Gemini API."""
@@ -26,10 +15,7 @@ def generate_restaurant_name_api(cuisine: str, style: str) -> str:
     Restaurant Name:
     """
     try:
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(max_output_tokens=50)
-        )
+        response = get_llm().invoke(prompt, max_output_tokens=50)
         return response.text.strip()
     except Exception as e:
         print(f"Error calling Gemini API: {e}")
@@ -46,10 +32,7 @@ def generate_menu_ideas_api(restaurant_name: str, cuisine: str) -> str:
     Menu Ideas:
     """
     try:
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(max_output_tokens=100)
-        )
+        response = get_llm().invoke(prompt, max_output_tokens=100)
         return response.text.strip()
     except Exception as e:
         print(f"Error calling Gemini API: {e}")
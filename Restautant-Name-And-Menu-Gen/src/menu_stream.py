@@ -0,0 +1,143 @@
+"""Streaming, incrementally parsed menu generation.
+
+The menu is asked for one item per line, `Name | description | price band`,
+and the token stream is parsed as it arrives: an item is complete as soon as
+its line ends, so it can be rendered while the rest of the menu is still
+being generated. The call gets its own output budget (MENU_MAX_TOKENS), so a
+larger menu is just more lines rather than a truncated paragraph.
+
+`stream_menu` (sync, for Streamlit) and `astream_menu` (async, used by
+src.pipeline) yield
+
+  {"type": "item", "index": i, "item": {"name", "description", "price_band"}}
+  {"type": "done", "items": [...], "stats": {...}}
+
+where stats has the time to first token (ttft_s), time to the first complete
+item, total time and items/sec.
+"""
+import re
+import time
+from functools import lru_cache
+from src.prompt_template import get_llm
+
+MENU_ITEMS = 8
+# ~40 tokens per item line, with headroom; the shared client defaults to 100
+MENU_MAX_TOKENS = 1024
+PRICE_BANDS = ("$", "$$", "$$$", "$$$$")
+
+MENU_TEMPLATE = (
+    "Suggest {n} creative menu items for a restaurant named {restaurant_name} serving "
+    "{cuisine} cuisine. Write exactly one item per line in the form\n"
+    "Name | one-sentence description | price band\n"
+    "where the price band is one of $, $$, $$$ or $$$$. "
+    "No numbering, headings or any other text."
+)
+
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+@lru_cache(maxsize=None)
+def get_menu_stream_chain():
+    """Prompt -> shared Gemini client (larger output budget) -> text chunks."""
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import PromptTemplate
+
+    prompt = PromptTemplate(input_variables=["n", "restaurant_name", "cuisine"], template=MENU_TEMPLATE)
+    return prompt | get_llm().bind(max_output_tokens=MENU_MAX_TOKENS) | StrOutputParser()
+
+
+def parse_menu_line(line):
+    """One `Name | description | price band` line as a record, None for
+    anything else (blank lines, headings, chatter)."""
+    parts = [p.strip().strip("*").strip() for p in _BULLET.sub("", line).split("|")]
+    if len(parts) < 2 or not parts[0]:
+        return None
+    band = ""
+    if len(parts) > 2:
+        dollars = re.search(r"\$+", parts[2])
+        band = PRICE_BANDS[min(len(dollars.group()), len(PRICE_BANDS)) - 1] if dollars else ""
+    return {"name": parts[0], "description": parts[1], "price_band": band}
+
+
+class MenuItemParser:
+    """Turns streamed text chunks into complete menu items."""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        """Items whose line ended within `text`."""
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        return [item for item in map(parse_menu_line, lines) if item]
+
+    def close(self):
+        """The last item, if the stream ended without a newline."""
+        item = parse_menu_line(self.buffer)
+        self.buffer = ""
+        return [item] if item else []
+
+
+class _MenuRun:
+    """Parser plus the timing bookkeeping shared by the sync and async paths."""
+
+    def __init__(self):
+        self.parser = MenuItemParser()
+        self.items = []
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.first_item = None
+
+    def feed(self, chunk):
+        if chunk and self.first_token is None:
+            self.first_token = time.perf_counter()
+        return self._emit(self.parser.feed(chunk))
+
+    def close(self):
+        events = self._emit(self.parser.close())
+        total = time.perf_counter() - self.start
+        stats = {
+            "items": len(self.items),
+            "ttft_s": round(self.first_token - self.start, 3) if self.first_token else None,
+            "first_item_s": round(self.first_item - self.start, 3) if self.first_item else None,
+            "total_s": round(total, 3),
+            "items_per_sec": round(len(self.items) / total, 2) if total > 0 else 0.0,
+        }
+        return events + [{"type": "done", "items": self.items, "stats": stats}]
+
+    def _emit(self, items):
+        events = []
+        for item in items:
+            if self.first_item is None:
+                self.first_item = time.perf_counter()
+            events.append({"type": "item", "index": len(self.items), "item": item})
+            self.items.append(item)
+        return events
+
+
+def stream_menu(restaurant_name, cuisine, n=MENU_ITEMS):
+    """Yields item events as each menu line completes, then a done event."""
+    run = _MenuRun()
+    for chunk in get_menu_stream_chain().stream(
+        {"n": n, "restaurant_name": restaurant_name, "cuisine": cuisine}
+    ):
+        yield from run.feed(chunk)
+    yield from run.close()
+
+
+async def astream_menu(restaurant_name, cuisine, n=MENU_ITEMS):
+    """Async `stream_menu`."""
+    run = _MenuRun()
+    async for chunk in get_menu_stream_chain().astream(
+        {"n": n, "restaurant_name": restaurant_name, "cuisine": cuisine}
+    ):
+        for event in run.feed(chunk):
+            yield event
+    for event in run.close():
+        yield event
+
+
+def format_menu_item(item):
+    """Markdown line for a menu item ($ escaped, Streamlit reads $...$ as LaTeX)."""
+    band = f" ({item['price_band']})".replace("$", "\\$") if item["price_band"] else ""
+    return f"- **{item['name']}**{band} — {item['description']}"
@@ -0,0 +1,164 @@
+"""Name-candidates-plus-menus pipeline.
+
+One call asks for `n` ranked name candidates as JSON. The output is parsed
+while it streams, and as soon as a candidate is complete its menu
+generation is started, for the first `menus_for` candidates and at most
+`max_concurrency` at a time. Menus are therefore running while the rest of
+the name list is still being generated, and a whole round takes about one
+name call plus one menu call of wall time, not one per candidate.
+
+`generate_names_and_menus` is an async generator of events, yielded as they
+happen:
+
+  {"type": "name", "rank": i, "name": ..., "score": ..., "reason": ...}
+  {"type": "menu_item", "rank": i, "name": ..., "item": {...}}   # see src.menu_stream
+  {"type": "menu", "rank": i, "name": ..., "items": [...], "stats": {...}}
+  {"type": "error", "rank": i, "name": ..., "error": ...}
+  {"type": "done", "candidates": [...]}   # all candidates, best score first
+"""
+import asyncio
+from functools import lru_cache
+from src.prompt_template import get_llm
+from src.menu_stream import astream_menu
+
+NUM_CANDIDATES = 5
+MENUS_FOR = 3
+MAX_CONCURRENCY = 3
+# Room for NUM_CANDIDATES short JSON records; the shared client defaults to 100
+CANDIDATES_MAX_TOKENS = 512
+
+CANDIDATES_TEMPLATE = (
+    "Suggest {n} unique and appealing restaurant names for a {cuisine} cuisine restaurant "
+    "with a {style} style. List the best name first, and score each from 1 to 10 for how "
+    "memorable and fitting it is.{avoid}\n{format_instructions}"
+)
+
+
+@lru_cache(maxsize=None)
+def name_candidates_schema():
+    """Pydantic schema of the candidates JSON, built on first use (pydantic
+    is slow to import, see benchmark_startup.py)."""
+    from typing import List
+    from pydantic import BaseModel, Field
+
+    class NameCandidate(BaseModel):
+        name: str = Field(description="the restaurant name")
+        score: float = Field(description="1-10, how memorable and fitting the name is")
+        reason: str = Field(description="one short sentence on why it fits")
+
+    class NameCandidates(BaseModel):
+        candidates: List[NameCandidate]
+
+    return NameCandidates
+
+
+@lru_cache(maxsize=None)
+def get_name_candidates_chain():
+    """Prompt -> shared Gemini client -> streaming JSON parser."""
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.prompts import PromptTemplate
+
+    parser = JsonOutputParser(pydantic_object=name_candidates_schema())
+    prompt = PromptTemplate(
+        input_variables=["n", "cuisine", "style"],
+        template=CANDIDATES_TEMPLATE,
+        partial_variables={"format_instructions": parser.get_format_instructions(), "avoid": ""},
+    )
+    return prompt | get_llm().bind(max_output_tokens=CANDIDATES_MAX_TOKENS) | parser
+
+
+def _candidate(raw, rank):
+    return {
+        "rank": rank,
+        "name": str(raw.get("name", "")).strip(),
+        "score": float(raw.get("score") or 0),
+        "reason": str(raw.get("reason", "")).strip(),
+    }
+
+
+async def generate_candidates(cuisine, style, n=NUM_CANDIDATES, avoid=()):
+    """One non-streamed candidates call (used to fill the pool), skipping any
+    name in `avoid`."""
+    inputs = {"n": n, "cuisine": cuisine, "style": style}
+    if avoid:
+        inputs["avoid"] = " Do not suggest any of these names: " + ", ".join(sorted(avoid)) + "."
+    result = await get_name_candidates_chain().ainvoke(inputs)
+    candidates = [_candidate(raw, rank) for rank, raw in enumerate((result or {}).get("candidates") or [])]
+    return [c for c in candidates if c["name"] and c["name"] not in avoid]
+
+
+async def generate_names_and_menus(cuisine, style, n=NUM_CANDIDATES, menus_for=MENUS_FOR,
+                                   max_concurrency=MAX_CONCURRENCY, candidates=None):
+    """Yields name, menu and error events as they complete; see module docstring.
+    Pre-generated `candidates` (e.g. from the pool) skip the name call."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    events = asyncio.Queue()
+
+    async def menu(candidate):
+        async with semaphore:
+            try:
+                async for event in astream_menu(candidate["name"], cuisine):
+                    if event["type"] == "item":
+                        await events.put({"type": "menu_item", "rank": candidate["rank"],
+                                          "name": candidate["name"], "item": event["item"]})
+                    else:
+                        await events.put({"type": "menu", "rank": candidate["rank"],
+                                          "name": candidate["name"], "items": event["items"],
+                                          "stats": event["stats"]})
+            except Exception as e:
+                await events.put({"type": "error", "rank": candidate["rank"],
+                                  "name": candidate["name"], "error": f"{type(e).__name__}: {e}"})
+
+    pregenerated = candidates
+    candidates, tasks = [], []
+
+    def complete(raw):
+        candidate = _candidate(raw, len(candidates))
+        if not candidate["name"]:
+            return None
+        candidates.append(candidate)
+        if candidate["rank"] < menus_for:
+            tasks.append(asyncio.create_task(menu(candidate)))
+        return {"type": "name", **candidate}
+
+    async def names():
+        try:
+            if pregenerated is not None:
+                for raw in pregenerated[:n]:
+                    event = complete(raw)
+                    if event:
+                        await events.put(event)
+                await asyncio.gather(*tasks)
+                return
+            seen = 0
+            final = []
+            async for partial in get_name_candidates_chain().astream(
+                {"n": n, "cuisine": cuisine, "style": style}
+            ):
+                final = (partial or {}).get("candidates") or []
+                # every entry but the last is complete once a later one has started
+                while seen < len(final) - 1:
+                    event = complete(final[seen])
+                    seen += 1
+                    if event:
+                        await events.put(event)
+            for raw in final[seen:n]:
+                event = complete(raw)
+                if event:
+                    await events.put(event)
+            await asyncio.gather(*tasks)
+        finally:
+            await events.put(None)
+
+    producer = asyncio.create_task(names())
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        await producer  # re-raises a failed name call
+    finally:
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+
+    ranked = sorted(candidates, key=lambda c: (-c["score"], c["rank"]))
+    yield {"type": "done", "candidates": ranked}
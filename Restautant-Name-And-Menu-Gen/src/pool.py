@@ -0,0 +1,232 @@
+"""Pre-generated name suggestions for every cuisine x style pair.
+
+The inputs of the name chain come from data/cuisines.txt and data/styles.txt,
+a small fixed grid, so names can be generated ahead of the click. The
+`SuggestionPool` keeps up to `size` fresh, never-served candidates per pair in
+SQLite (pool.db), so the pool survives restarts. `take` hands out the best of
+them and marks them served, and a served name is never stored again for that
+pair. Unserved suggestions older than `max_age` are dropped, so the pool stays
+fresh.
+
+`PoolRefiller` refills the pool in a background thread running an asyncio
+loop, in the gateway's batch lane so clicks are served first. Each call asks
+for several candidates at once, calls are spaced to stay within `per_minute`,
+the pair a user just drew from is refilled first, and otherwise the emptiest
+pair goes next. When a pair is empty the app falls back to a live call.
+
+    pool = SuggestionPool()
+    refiller = PoolRefiller(pool, pairs, generate_candidates)
+    refiller.start()
+    candidates = pool.take("Italian", "Rustic", 5)   # [] -> generate live
+    refiller.wake("Italian", "Rustic")
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from llm_gateway import BATCH, lane
+
+POOL_FILE = os.getenv("RESTAURANT_POOL_FILE", "pool.db")
+POOL_SIZE = int(os.getenv("RESTAURANT_POOL_SIZE", "10"))
+# Refill calls per minute; 0 disables background refill
+REFILL_PER_MINUTE = float(os.getenv("RESTAURANT_POOL_RPM", "6"))
+MAX_AGE = 7 * 24 * 3600
+IDLE_WAIT = 30.0
+
+
+class SuggestionPool:
+    """Persistent per-(cuisine, style) store of unserved name candidates."""
+
+    def __init__(self, path=POOL_FILE, size=POOL_SIZE, max_age=MAX_AGE):
+        self.path = path
+        self.size = size
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # shared by the Streamlit script threads and the refiller, behind self.lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS suggestions ("
+            "cuisine TEXT NOT NULL, style TEXT NOT NULL, name TEXT NOT NULL, "
+            "score REAL, reason TEXT, created REAL NOT NULL, served REAL, "
+            "PRIMARY KEY (cuisine, style, name))"
+        )
+        self.conn.commit()
+
+    def take(self, cuisine, style, count=1):
+        """Up to `count` unserved candidates, best score first; they are marked
+        served and will not be handed out again."""
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, score, reason FROM suggestions "
+                "WHERE cuisine = ? AND style = ? AND served IS NULL AND created > ? "
+                "ORDER BY score DESC, created LIMIT ?",
+                (cuisine, style, now - self.max_age, count),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE suggestions SET served = ? WHERE cuisine = ? AND style = ? AND name = ?",
+                [(now, cuisine, style, name) for name, _, _ in rows],
+            )
+            self.conn.commit()
+        return [{"name": name, "score": score, "reason": reason} for name, score, reason in rows]
+
+    def add(self, cuisine, style, candidates):
+        """Stores new candidates up to the pool size; returns how many were added."""
+        now = time.time()
+        added = 0
+        with self.lock:
+            room = self.size - self._available(cuisine, style, now)
+            for candidate in candidates:
+                if added >= room:
+                    break
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO suggestions (cuisine, style, name, score, reason, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (cuisine, style, candidate["name"], candidate.get("score"), candidate.get("reason"), now),
+                )
+                added += cursor.rowcount
+            self.conn.commit()
+        return added
+
+    def known_names(self, cuisine, style):
+        """Every name stored for the pair, served or not, to ask the model to avoid."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name FROM suggestions WHERE cuisine = ? AND style = ?", (cuisine, style)
+            ).fetchall()
+        return {name for name, in rows}
+
+    def _available(self, cuisine, style, now):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM suggestions "
+            "WHERE cuisine = ? AND style = ? AND served IS NULL AND created > ?",
+            (cuisine, style, now - self.max_age),
+        ).fetchone()[0]
+
+    def available(self, cuisine, style):
+        with self.lock:
+            return self._available(cuisine, style, time.time())
+
+    def deficits(self, pairs):
+        """[(missing, (cuisine, style))] for pairs below the pool size, emptiest first."""
+        now = time.time()
+        with self.lock:
+            missing = [(self.size - self._available(c, s, now), (c, s)) for c, s in pairs]
+        return sorted((m for m in missing if m[0] > 0), key=lambda m: -m[0])
+
+    def prune(self):
+        """Drops unserved suggestions past max_age and served ones past 4x max_age
+        (served names are kept a while so they are not suggested again)."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM suggestions WHERE (served IS NULL AND created <= ?) OR served <= ?",
+                (now - self.max_age, now - 4 * self.max_age),
+            )
+            self.conn.commit()
+
+    def stats(self, pairs):
+        now = time.time()
+        with self.lock:
+            counts = [self._available(c, s, now) for c, s in pairs]
+        return {
+            "pairs": len(pairs),
+            "empty_pairs": sum(1 for c in counts if c == 0),
+            "available": sum(counts),
+            "capacity": self.size * len(pairs),
+        }
+
+
+class PoolRefiller:
+    """Background thread keeping every pair's pool full under a call rate budget.
+
+    `generate(cuisine, style, n, avoid)` is an async function returning
+    candidate dicts (see `src.pipeline.generate_candidates`).
+    """
+
+    def __init__(self, pool, pairs, generate, per_minute=REFILL_PER_MINUTE, batch=5):
+        self.pool = pool
+        self.pairs = list(pairs)
+        self.generate = generate
+        self.per_minute = per_minute
+        self.batch = batch
+        self.urgent = []
+        self.calls = 0
+        self.added = 0
+        self.errors = 0
+        self.last_error = None
+        self._loop = None
+        self._wakeup = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.per_minute <= 0 or (self._thread and self._thread.is_alive()):
+            return self
+        self._stopped.clear()
+        self._thread = threading.Thread(target=asyncio.run, args=(self._run(),), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._notify()
+
+    def wake(self, cuisine, style):
+        """Refill this pair next (it was just drawn from)."""
+        pair = (cuisine, style)
+        if pair not in self.urgent:
+            self.urgent.append(pair)
+        self._notify()
+
+    def _notify(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _next(self):
+        while self.urgent:
+            pair = self.urgent.pop(0)
+            if self.pool.available(*pair) < self.pool.size:
+                return pair
+        deficits = self.pool.deficits(self.pairs)
+        return deficits[0][1] if deficits else None
+
+    async def _run(self):
+        with lane(BATCH):
+            await self._refill()
+
+    async def _refill(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        interval = 60.0 / self.per_minute
+        next_call = 0.0
+        self.pool.prune()
+        while not self._stopped.is_set():
+            pair = self._next()
+            if pair is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), IDLE_WAIT)
+                except asyncio.TimeoutError:
+                    self.pool.prune()
+                continue
+            await asyncio.sleep(max(0.0, next_call - time.monotonic()))
+            next_call = time.monotonic() + interval
+            self.calls += 1
+            try:
+                candidates = await self.generate(*pair, n=self.batch, avoid=self.pool.known_names(*pair))
+                self.added += self.pool.add(*pair, candidates)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    def stats(self):
+        return {
+            **self.pool.stats(self.pairs),
+            "running": bool(self._thread and self._thread.is_alive()),
+            "refill_calls": self.calls,
+            "refill_added": self.added,
+            "refill_errors": self.errors,
+            "last_error": self.last_error,
+        }
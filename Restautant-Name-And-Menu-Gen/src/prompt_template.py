@@ -1,40 +1,75 @@
 import os
-from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.output_parsers import StrOutputParser
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-GEMINI_API_KEY_RAW = os.getenv("GEMINI_API_KEY")
-GEMINI_API_KEY = GEMINI_API_KEY_RAW.strip() if GEMINI_API_KEY_RAW else None
+model_id = "gemini-1.5-flash" # Using gemini-pro model
 
-if not GEMINI_API_KEY:
-    raise ValueError(
-        "GEMINI_API_KEY not found, is empty, or contains only whitespace in .env or environment. Please set it."
-    )
+# Template text only; the PromptTemplate objects (and langchain_core, which
+# takes most of a second to import) are built on first use.
+TEMPLATES = {
+    "prompt_template_name": (
+        ["cuisine", "style"],
+        "Suggest a unique and appealing restaurant name for a {cuisine} cuisine restaurant with a {style} style.",
+    ),
+    "prompt_template_item": (
+        ["restaurant_name", "cuisine"],
+        "Suggest some creative menu items for a restaurant named {restaurant_name} serving {cuisine} cuisine.",
+    ),
+}
 
 
-model_id = "gemini-1.5-flash" # Using gemini-pro model
+def get_api_key():
+    """Returns the Gemini API key, raising only when a model is first needed."""
+    raw = os.getenv("GEMINI_API_KEY")
+    key = raw.strip() if raw else None
+    if not key:
+        raise ValueError(
+            "GEMINI_API_KEY not found, is empty, or contains only whitespace in .env or environment. Please set it."
+        )
+    return key
+
+
+@lru_cache(maxsize=None)
+def get_prompt(name):
+    from langchain_core.prompts import PromptTemplate
+
+    input_variables, template = TEMPLATES[name]
+    return PromptTemplate(input_variables=input_variables, template=template)
+
+
+@lru_cache(maxsize=None)
+def get_llm():
+    """The one Gemini client shared by the chains and src/llm_model.py.
+
+    Built on first use rather than at import: importing this module stays
+    cheap, and a missing key is reported when a generation is requested
+    instead of crashing the app on startup.
+    """
+    from llm_gateway import gemini_chat
+
+    return gemini_chat(
+        model_id,
+        api_key=get_api_key(),
+        temperature=0.7,
+        max_output_tokens=100,
+        top_p=0.9,
+        top_k=50
+    )
+
 
-llm = ChatGoogleGenerativeAI(
-    model=model_id,
-    google_api_key=GEMINI_API_KEY,
-    temperature=0.7,
-    max_output_tokens=100,
-    top_p=0.9,
-    top_k=50
-)
-
-prompt_template_name = PromptTemplate(
-    input_variables=["cuisine", "style"],
-    template="Suggest a unique and appealing restaurant name for a {cuisine} cuisine restaurant with a {style} style."
-)
-restaurant_name_chain = prompt_template_name | llm | StrOutputParser()
-
-prompt_template_item = PromptTemplate(
-    input_variables=["restaurant_name", "cuisine"],
-    template="Suggest some creative menu items for a restaurant named {restaurant_name} serving {cuisine} cuisine."
-)
-menu_items_chain = prompt_template_item | llm | StrOutputParser()
+def __getattr__(name):
+    # These used to be built at import; they stay importable, built on
+    # first access.
+    if name in TEMPLATES:
+        return get_prompt(name)
+    if name == "llm":
+        return get_llm()
+    if name in ("restaurant_name_chain", "menu_items_chain"):
+        from src import chains
+        if name == "restaurant_name_chain":
+            return chains.get_restaurant_name_chain()
+        return chains.get_menu_idea_chain()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
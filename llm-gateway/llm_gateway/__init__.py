@@ -0,0 +1,43 @@
+"""Shared LLM gateway used by the apps in this repository.
+
+    from llm_gateway import gemini_chat, lane, BATCH, get_gateway
+
+    llm = gemini_chat("gemini-2.0-flash", api_key=key, temperature=0.2)
+    with lane(BATCH):
+        evaluate(llm)
+    get_gateway().metrics()
+
+    with use_cassette("eval/llm.jsonl.gz", mode="replay", latency=1.0):
+        evaluate(llm)        # offline, recorded responses and timing
+"""
+from llm_gateway.limits import (
+    BATCH, INTERACTIVE, CircuitOpenError, RateLimitTimeout, TokenBucket, CircuitBreaker,
+    current_lane, lane,
+)
+from llm_gateway.gateway import Gateway, configure, get_gateway, key_id
+from llm_gateway.cassette import Cassette, CassetteMiss, current_cassette, set_cassette, use_cassette
+from llm_gateway.singleflight import AsyncSingleFlight, LeaderGone, SingleFlight, singleflight_stats
+from llm_gateway.telemetry import observe, prometheus_text, record_usage, span, trace
+from llm_gateway.router import Router, choose_tier, route_hints
+
+__all__ = [
+    "BATCH", "INTERACTIVE", "CircuitOpenError", "RateLimitTimeout", "TokenBucket",
+    "CircuitBreaker", "current_lane", "lane", "Gateway", "configure", "get_gateway", "key_id",
+    "Cassette", "CassetteMiss", "current_cassette", "set_cassette", "use_cassette",
+    "SingleFlight", "AsyncSingleFlight", "LeaderGone", "singleflight_stats",
+    "trace", "span", "observe", "record_usage", "prometheus_text",
+    "Router", "choose_tier", "route_hints",
+    "GatewayChatModel", "gemini_chat", "RoutedChatModel", "routed_chat", "StubChatModel",
+]
+
+
+def __getattr__(name):
+    # The chat model pulls in langchain_core, which is slow to import; the
+    # limits and gateway above are stdlib only.
+    if name in ("GatewayChatModel", "gemini_chat", "RoutedChatModel", "routed_chat"):
+        from llm_gateway import chat
+        return getattr(chat, name)
+    if name == "StubChatModel":
+        from llm_gateway import stub
+        return stub.StubChatModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,259 @@
+"""Record/replay of model calls ("cassettes").
+
+A cassette maps a request (model, generation params, per-call kwargs, stop
+words and a hash of the prompt messages) to the response that was recorded
+for it, with the latency and time to first token seen at recording time.
+Replayed calls return the recorded message without touching the network or
+the gateway's rate limit. With `latency` > 0 the recorded timing is
+reproduced (scaled), so whole pipelines can be benchmarked offline with
+realistic generation times. Streams are replayed chunk by chunk.
+
+The store is gzip-compressed JSON lines, appended to as calls are recorded
+(one gzip member per record); the last record for a key wins.
+
+Modes:
+  replay  recorded responses only; a miss raises CassetteMiss
+  auto    replay when recorded, otherwise call the model and record
+  record  always call the model and (re-)record
+  off     pass-through
+
+Every app's client (`gemini_chat`) uses the process-wide cassette, set from
+the environment or with `use_cassette`:
+
+  LLM_CASSETTE=eval/grammar.jsonl.gz LLM_CASSETTE_MODE=replay LLM_CASSETTE_LATENCY=1 \\
+      python evaluate_metrics.py
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+MODES = ("replay", "auto", "record", "off")
+
+
+class CassetteMiss(KeyError):
+    """No recording for a request in replay mode."""
+
+
+def _default(value):
+    if hasattr(value, "get_secret_value"):
+        return "**"
+    return repr(value)
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, default=_default, separators=(",", ":"))
+
+
+def prompt_hash(messages):
+    """Hash of the message types and contents."""
+    return hashlib.sha256(
+        _canonical([(m.type, m.content) for m in messages]).encode()
+    ).hexdigest()[:32]
+
+
+def request_key(model, params, kwargs, stop, messages):
+    """Cassette key of one request; credentials never enter it."""
+    params = {k: v for k, v in (params or {}).items() if "key" not in k.lower()}
+    request = {"model": model, "params": params, "kwargs": kwargs or {}, "stop": stop,
+               "prompt": prompt_hash(messages)}
+    return hashlib.sha256(_canonical(request).encode()).hexdigest()[:32]
+
+
+def _split(text):
+    """Word-sized chunks for replaying a response recorded without a stream."""
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+class Cassette:
+    """On-disk request -> response store; see the module docstring."""
+
+    def __init__(self, path, mode="auto", latency=0.0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {MODES}.")
+        self.path = path
+        self.mode = mode
+        self.latency = float(latency)
+        self.records = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if mode != "off" and os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.records[record["key"]] = record
+
+    @property
+    def replays(self):
+        return self.mode in ("replay", "auto")
+
+    @property
+    def records_calls(self):
+        return self.mode in ("auto", "record")
+
+    def lookup(self, key):
+        """The recording for `key`, None to call the model (raises in replay mode)."""
+        if self.mode == "off":
+            return None
+        with self.lock:
+            record = self.records.get(key) if self.replays else None
+            if record is not None:
+                self.hits += 1
+                return record
+            self.misses += 1
+        if self.mode == "replay":
+            raise CassetteMiss(f"No recording for request {key} in {self.path}; record it with mode 'auto'.")
+        return None
+
+    def record(self, key, model, message, latency_s, ttft_s=None, chunks=None):
+        """Stores one response (content, usage and finish reason of `message`)."""
+        if not self.records_calls:
+            return
+        record = {
+            "key": key,
+            "model": model,
+            "content": message.content,
+            "usage": getattr(message, "usage_metadata", None),
+            "finish_reason": (message.response_metadata or {}).get("finish_reason"),
+            "latency_s": round(latency_s, 4),
+            "ttft_s": round(ttft_s, 4) if ttft_s is not None else None,
+            "chunks": chunks,
+            "recorded_at": time.time(),
+        }
+        line = json.dumps(record, separators=(",", ":"), default=_default) + "\n"
+        with self.lock:
+            self.records[key] = record
+            self.recorded += 1
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    def compact(self):
+        """Rewrites the store with one record per key (drops re-recordings)."""
+        with self.lock:
+            tmp = self.path + ".tmp"
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                for record in self.records.values():
+                    f.write(json.dumps(record, separators=(",", ":"), default=_default) + "\n")
+            os.replace(tmp, self.path)
+
+    # --- replay -------------------------------------------------------------
+
+    def message(self, record):
+        from langchain_core.messages import AIMessage
+
+        return AIMessage(
+            content=record["content"],
+            usage_metadata=record.get("usage"),
+            response_metadata={"finish_reason": record.get("finish_reason"), "cassette": True},
+        )
+
+    def _chunks(self, record):
+        if isinstance(record["content"], str):
+            return record.get("chunks") or _split(record["content"])
+        return [record["content"]]
+
+    def _delays(self, record, n):
+        """(before first chunk, between later chunks) in seconds."""
+        if self.latency <= 0:
+            return 0.0, 0.0
+        total = record.get("latency_s") or 0.0
+        first = record.get("ttft_s")
+        first = total if first is None else first
+        rest = max(0.0, total - first) / max(1, n - 1)
+        return first * self.latency, rest * self.latency
+
+    def _total_delay(self, record):
+        return (record.get("latency_s") or 0.0) * self.latency if self.latency > 0 else 0.0
+
+    def replay(self, record):
+        time.sleep(self._total_delay(record))
+        return self.message(record)
+
+    async def areplay(self, record):
+        await asyncio.sleep(self._total_delay(record))
+        return self.message(record)
+
+    def replay_stream(self, record):
+        """Yields AIMessageChunks; usage rides on the last one."""
+        from langchain_core.messages import AIMessageChunk
+
+        chunks = self._chunks(record)
+        first, between = self._delays(record, len(chunks))
+        for i, text in enumerate(chunks):
+            time.sleep(first if i == 0 else between)
+            last = i == len(chunks) - 1
+            yield AIMessageChunk(content=text, usage_metadata=record.get("usage") if last else None)
+
+    async def areplay_stream(self, record):
+        from langchain_core.messages import AIMessageChunk
+
+        chunks = self._chunks(record)
+        first, between = self._delays(record, len(chunks))
+        for i, text in enumerate(chunks):
+            await asyncio.sleep(first if i == 0 else between)
+            last = i == len(chunks) - 1
+            yield AIMessageChunk(content=text, usage_metadata=record.get("usage") if last else None)
+
+    def stats(self):
+        return {
+            "path": self.path, "mode": self.mode, "records": len(self.records),
+            "hits": self.hits, "misses": self.misses, "recorded": self.recorded,
+        }
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def _from_env():
+    path = os.getenv("LLM_CASSETTE")
+    if not path:
+        return None
+    return Cassette(
+        path,
+        mode=os.getenv("LLM_CASSETTE_MODE", "auto"),
+        latency=float(os.getenv("LLM_CASSETTE_LATENCY", "0")),
+    )
+
+
+def current_cassette():
+    """The process-wide cassette (from LLM_CASSETTE* on first use), or None."""
+    global _cassette
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = _from_env() or False
+        return _cassette or None
+
+
+def set_cassette(cassette):
+    """Makes `cassette` (or None) the process-wide cassette; returns the previous one."""
+    global _cassette
+    with _cassette_lock:
+        previous, _cassette = _cassette, cassette or False
+    return previous or None
+
+
+@contextmanager
+def use_cassette(path, mode="auto", latency=0.0):
+    """Record/replay every model call made inside the block:
+
+        with use_cassette("eval/llm_cassette.jsonl.gz", mode="replay", latency=1.0) as cassette:
+            run_pipeline()
+    """
+    cassette = Cassette(path, mode=mode, latency=latency)
+    previous = set_cassette(cassette)
+    try:
+        yield cassette
+    finally:
+        set_cassette(previous)
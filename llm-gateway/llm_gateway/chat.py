@@ -0,0 +1,341 @@
+"""LangChain chat model that sends every call through the gateway."""
+import os
+import time
+from typing import Any, Iterator, AsyncIterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from llm_gateway.cassette import current_cassette, request_key
+from llm_gateway.gateway import get_gateway, key_id
+from llm_gateway import singleflight
+from llm_gateway.telemetry import observe, record_usage, span
+
+# Coalesce identical in-flight requests (see llm_gateway.singleflight)
+COALESCE = os.getenv("LLM_GATEWAY_SINGLEFLIGHT", "1") != "0"
+
+
+class _StreamRecording:
+    """Collects a live stream's chunks and timing for the cassette."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ttft = None
+        self.texts = []
+        self.message = None
+
+    def add(self, chunk):
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.start
+        self.message = chunk.message if self.message is None else self.message + chunk.message
+        if self.texts is not None and isinstance(chunk.message.content, str):
+            self.texts.append(chunk.message.content)
+        else:
+            self.texts = None
+
+    def save(self, cassette, key, model):
+        if self.message is not None:
+            cassette.record(key, model, self.message, time.perf_counter() - self.start,
+                            ttft_s=self.ttft, chunks=self.texts)
+
+
+class GatewayChatModel(BaseChatModel):
+    """Wraps a chat model; generate, stream and their async forms go through
+    `gateway` (the process-wide one by default) under `model_name` and
+    `api_key_id`. `lane` pins a lane, otherwise the caller's `lane(...)`
+    context decides. Per-call kwargs (e.g. `max_output_tokens` from `.bind`)
+    are passed on to the wrapped model.
+
+    With a cassette (`cassette`, or the process-wide one, see
+    llm_gateway.cassette) recorded responses are replayed before the
+    gateway is reached, and live responses are recorded.
+
+    With `coalesce` identical requests in flight at the same time share one
+    call (llm_gateway.singleflight); only that call is sent and recorded."""
+
+    inner: BaseChatModel
+    model_name: str
+    api_key_id: str = "default"
+    lane: Optional[str] = None
+    gateway: Any = None
+    cassette: Any = None
+    coalesce: bool = COALESCE
+
+    @property
+    def _llm_type(self) -> str:
+        return self.inner._llm_type
+
+    @property
+    def _identifying_params(self):
+        return self.inner._identifying_params
+
+    def _gateway(self):
+        return self.gateway or get_gateway()
+
+    def _recording(self, messages, stop, kwargs):
+        """(cassette, request key, recorded response or None); the cassette is
+        None without one, the key is None when neither it nor coalescing
+        needs it."""
+        cassette = self.cassette or current_cassette()
+        if cassette is not None and cassette.mode == "off":
+            cassette = None
+        if cassette is None and not self.coalesce:
+            return None, None, None
+        key = request_key(self.model_name, self._identifying_params, kwargs, stop, messages)
+        return cassette, key, cassette.lookup(key) if cassette is not None else None
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        with span("llm_call"):
+            return self._generate_untimed(messages, stop, run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        with span("llm_call"):
+            return await self._agenerate_untimed(messages, stop, run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        first = True
+        for chunk in self._stream_untimed(messages, stop, run_manager, **kwargs):
+            if first:
+                observe("ttft", time.perf_counter() - start)
+                first = False
+            yield chunk
+        observe("llm_call", time.perf_counter() - start)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        start = time.perf_counter()
+        first = True
+        async for chunk in self._astream_untimed(messages, stop, run_manager, **kwargs):
+            if first:
+                observe("ttft", time.perf_counter() - start)
+                first = False
+            yield chunk
+        observe("llm_call", time.perf_counter() - start)
+
+    def _generate_untimed(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        cassette, key, record = self._recording(messages, stop, kwargs)
+        if record is not None:
+            record_usage(self.model_name, record.get("usage"), billed=False)
+            return ChatResult(generations=[ChatGeneration(message=cassette.replay(record))])
+
+        def call():
+            start = time.perf_counter()
+            result = self._gateway().call(
+                self.model_name, self.api_key_id,
+                lambda: self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                lane=self.lane,
+            )
+            message = result.generations[0].message
+            record_usage(self.model_name, getattr(message, "usage_metadata", None))
+            if cassette is not None:
+                cassette.record(key, self.model_name, message, time.perf_counter() - start)
+            return result
+
+        if not self.coalesce:
+            return call()
+        return singleflight.threads.do(("generate", key), call)
+
+    async def _agenerate_untimed(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        cassette, key, record = self._recording(messages, stop, kwargs)
+        if record is not None:
+            record_usage(self.model_name, record.get("usage"), billed=False)
+            return ChatResult(generations=[ChatGeneration(message=await cassette.areplay(record))])
+
+        async def call():
+            start = time.perf_counter()
+            result = await self._gateway().acall(
+                self.model_name, self.api_key_id,
+                lambda: self.inner._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                lane=self.lane,
+            )
+            message = result.generations[0].message
+            record_usage(self.model_name, getattr(message, "usage_metadata", None))
+            if cassette is not None:
+                cassette.record(key, self.model_name, message, time.perf_counter() - start)
+            return result
+
+        if not self.coalesce:
+            return await call()
+        return await singleflight.coroutines.do(("generate", key), call)
+
+    def _stream_untimed(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        cassette, key, record = self._recording(messages, stop, kwargs)
+        if record is not None:
+            record_usage(self.model_name, record.get("usage"), billed=False)
+            for message in cassette.replay_stream(record):
+                chunk = ChatGenerationChunk(message=message)
+                if run_manager:
+                    run_manager.on_llm_new_token(message.content, chunk=chunk)
+                yield chunk
+            return
+
+        def call():
+            recording = _StreamRecording()
+            for chunk in self._gateway().stream(
+                self.model_name, self.api_key_id,
+                lambda: self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+                lane=self.lane,
+            ):
+                recording.add(chunk)
+                yield chunk
+            record_usage(self.model_name, getattr(recording.message, "usage_metadata", None))
+            if cassette is not None:
+                recording.save(cassette, key, self.model_name)
+
+        if not self.coalesce:
+            yield from call()
+            return
+        chunks, shared = singleflight.threads.stream(("stream", key), call)
+        for chunk in chunks:
+            # the leader's client reports its own tokens
+            if shared and run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream_untimed(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        cassette, key, record = self._recording(messages, stop, kwargs)
+        if record is not None:
+            record_usage(self.model_name, record.get("usage"), billed=False)
+            async for message in cassette.areplay_stream(record):
+                chunk = ChatGenerationChunk(message=message)
+                if run_manager:
+                    await run_manager.on_llm_new_token(message.content, chunk=chunk)
+                yield chunk
+            return
+
+        async def call():
+            recording = _StreamRecording()
+            async for chunk in self._gateway().astream(
+                self.model_name, self.api_key_id,
+                lambda: self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+                lane=self.lane,
+            ):
+                recording.add(chunk)
+                yield chunk
+            record_usage(self.model_name, getattr(recording.message, "usage_metadata", None))
+            if cassette is not None:
+                recording.save(cassette, key, self.model_name)
+
+        if not self.coalesce:
+            async for chunk in call():
+                yield chunk
+            return
+        chunks, shared = singleflight.coroutines.stream(("stream", key), call)
+        async for chunk in chunks:
+            if shared and run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def gemini_chat(model, api_key=None, lane=None, gateway=None, **kwargs):
+    """`ChatGoogleGenerativeAI(model=..., google_api_key=..., **kwargs)` behind
+    the gateway. The client's own retries are turned off; the gateway
+    retries with shared backoff instead. With a replay-only cassette a
+    missing key is fine, nothing is sent."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    cassette = current_cassette()
+    if not api_key and cassette is not None and cassette.mode == "replay":
+        api_key = "cassette-replay"
+    inner = ChatGoogleGenerativeAI(model=model, google_api_key=api_key, max_retries=1, **kwargs)
+    return GatewayChatModel(
+        inner=inner, model_name=model, api_key_id=key_id(api_key), lane=lane, gateway=gateway,
+    )
+
+
+class RoutedChatModel(BaseChatModel):
+    """Sends each call to the model a `router` picks for it (see
+    llm_gateway.router); the features are the estimated prompt tokens plus
+    the caller's `route_hints`."""
+
+    router: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    @property
+    def _identifying_params(self):
+        return {"tiers": {tier: [c.label for c in cs] for tier, cs in self.router.candidates.items()}}
+
+    def _features(self, messages):
+        from llm_gateway.router import current_hints, estimate_tokens
+
+        return {"input_tokens": estimate_tokens(messages), **current_hints()}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self.router.call(
+            self._features(messages),
+            lambda model: model._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await self.router.acall(
+            self._features(messages),
+            lambda model: model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        return self.router.stream(
+            self._features(messages),
+            lambda model: model._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        return self.router.astream(
+            self._features(messages),
+            lambda model: model._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+
+def routed_chat(api_key=None, fallback_keys=None, tiers=None, lane=None, gateway=None,
+                policy=None, **kwargs):
+    """A chat model routing each call to a tier (llm_gateway.router), with one
+    `gemini_chat` client per tier and API key. `tiers` ({tier: model},
+    cheapest first) defaults to the router's tiers with LLM_ROUTER_TIERS
+    overrides; `fallback_keys` to LLM_ROUTER_FALLBACK_KEYS (comma separated).
+    LLM_ROUTER=0 returns the standard tier's plain client, LLM_ROUTER_STUB=1
+    local stub models (see llm_gateway.stub) instead of Gemini."""
+    from llm_gateway.router import DEFAULT_MODELS, Router, choose_tier, parse_tiers
+
+    models = tiers or {**DEFAULT_MODELS, **parse_tiers(os.getenv("LLM_ROUTER_TIERS"))}
+    if os.getenv("LLM_ROUTER", "1") == "0":
+        return gemini_chat(models["standard"], api_key=api_key, lane=lane, gateway=gateway, **kwargs)
+    if os.getenv("LLM_ROUTER_STUB", "0") != "0":
+        from llm_gateway.stub import stub_tiers
+
+        clients = stub_tiers(lane=lane, gateway=gateway)
+    else:
+        if fallback_keys is None:
+            fallback_keys = os.getenv("LLM_ROUTER_FALLBACK_KEYS", "").split(",")
+        keys = list(dict.fromkeys([api_key] + [k.strip() for k in fallback_keys if k.strip()]))
+        clients = {
+            tier: [gemini_chat(model, api_key=key, lane=lane, gateway=gateway, **kwargs) for key in keys]
+            for tier, model in models.items()
+        }
+    return RoutedChatModel(router=Router(clients, policy=policy or choose_tier))
+
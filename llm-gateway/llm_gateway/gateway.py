@@ -0,0 +1,396 @@
+"""The shared call path: rate limit, circuit breaker, retry, metrics.
+
+Every model call goes through `Gateway.call` (or `acall`, `stream`,
+`astream`) with the model name and a key id. Per (model, key) the gateway
+keeps a token bucket, a circuit breaker and counters, so all callers of one
+quota in a process share them:
+
+  1. the circuit breaker fails fast while the model is down,
+  2. a token is taken from the bucket (interactive lane first),
+  3. the call runs; a retryable error (429, 5xx, timeout, connection) is
+     retried with full-jitter exponential backoff. A 429 also puts the
+     bucket into debt for the server's retry delay, so every caller slows
+     down together and throughput settles at the quota ceiling instead of
+     collapsing into a retry storm.
+
+Limits come from the environment (or `configure(...)`):
+
+  LLM_GATEWAY_RPM             requests/minute per model and key (default 60)
+  LLM_GATEWAY_LIMITS          per-model overrides, "gemini-2.0-flash=15,..."
+  LLM_GATEWAY_MAX_ATTEMPTS    tries per call, first one included (default 4)
+  LLM_GATEWAY_MAX_WAIT        longest wait for a request slot, s (default 30)
+  LLM_GATEWAY_BREAKER_FAILURES / LLM_GATEWAY_BREAKER_RESET  (5, 30 s)
+"""
+import asyncio
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from llm_gateway.limits import (
+    CircuitBreaker, CircuitOpenError, RateLimitTimeout, TokenBucket, current_lane, LANES,
+)
+
+DEFAULT_RPM = float(os.getenv("LLM_GATEWAY_RPM", "60"))
+MAX_ATTEMPTS = int(os.getenv("LLM_GATEWAY_MAX_ATTEMPTS", "4"))
+MAX_WAIT = float(os.getenv("LLM_GATEWAY_MAX_WAIT", "30"))
+BREAKER_FAILURES = int(os.getenv("LLM_GATEWAY_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("LLM_GATEWAY_BREAKER_RESET", "30"))
+BASE_DELAY = 0.5
+MAX_DELAY = 20.0
+
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+_RETRY_DELAY = re.compile(r"retry[_ ]?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE)
+
+
+def parse_limits(spec):
+    """"model=rpm,model=rpm" -> {model: rpm}."""
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            model, rpm = part.split("=", 1)
+            limits[model.strip()] = float(rpm)
+    return limits
+
+
+def key_id(api_key):
+    """Short, non-reversible label for an API key (the key itself is never kept)."""
+    if not api_key:
+        return "default"
+    if hasattr(api_key, "get_secret_value"):
+        api_key = api_key.get_secret_value()
+    return hashlib.sha256(api_key.encode()).hexdigest()[:8]
+
+
+def _chain(error):
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def error_code(error):
+    """HTTP status carried by the error or anything it was raised from."""
+    for e in _chain(error):
+        for attr in ("code", "status_code"):
+            value = getattr(e, attr, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def is_rate_limited(error):
+    if error_code(error) == 429:
+        return True
+    text = str(error)
+    return "RESOURCE_EXHAUSTED" in text or "429" in text
+
+
+def is_retryable(error):
+    for e in _chain(error):
+        flag = getattr(e, "is_retryable", None)  # langchain_core ModelError
+        if isinstance(flag, bool):
+            return flag
+        if isinstance(e, (TimeoutError, ConnectionError)):
+            return True
+        name = type(e).__name__
+        if "Timeout" in name or "Connection" in name:
+            return True
+    code = error_code(error)
+    if code is not None:
+        return code in RETRYABLE_CODES
+    return is_rate_limited(error) or "UNAVAILABLE" in str(error)
+
+
+def retry_after(error):
+    """Server-suggested delay in seconds (Gemini's RetryInfo), if any."""
+    match = _RETRY_DELAY.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class _ModelState:
+    def __init__(self, label, bucket, breaker):
+        self.label = label
+        self.bucket = bucket
+        self.breaker = breaker
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests": 0, "attempts": 0, "successes": 0, "failures": 0, "retries": 0,
+            "rate_limited": 0, "fast_failed": 0, "wait_timeouts": 0,
+            **{f"{name}_requests": 0 for name in LANES},
+        }
+        self.queue_wait_s = 0.0
+        self.latency_s = 0.0
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+
+class Gateway:
+    """Rate limiting, retry and circuit breaking for every model call in the
+    process; see the module docstring."""
+
+    def __init__(self, per_minute=DEFAULT_RPM, burst=None, limits=None,
+                 max_attempts=MAX_ATTEMPTS, max_wait=MAX_WAIT, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, failure_threshold=BREAKER_FAILURES,
+                 reset_timeout=BREAKER_RESET):
+        self.per_minute = per_minute
+        self.burst = burst
+        self.limits = dict(parse_limits(os.getenv("LLM_GATEWAY_LIMITS")), **(limits or {}))
+        self.max_attempts = max_attempts
+        self.max_wait = max_wait
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.states = {}
+        self.lock = threading.Lock()
+
+    def _state(self, model, key):
+        with self.lock:
+            state = self.states.get((model, key))
+            if state is None:
+                state = self.states[(model, key)] = _ModelState(
+                    f"{model}/{key}",
+                    TokenBucket(self.limits.get(model, self.per_minute), self.burst),
+                    CircuitBreaker(self.failure_threshold, self.reset_timeout),
+                )
+            return state
+
+    def _start(self, model, key, lane):
+        lane = lane or current_lane()
+        state = self._state(model, key)
+        state.count("requests")
+        state.count(f"{lane}_requests")
+        return state, lane
+
+    def _check(self, state):
+        try:
+            state.breaker.check(state.label)
+        except CircuitOpenError:
+            state.count("fast_failed")
+            raise
+
+    def _acquired(self, state, waited):
+        with state.lock:
+            state.queue_wait_s += waited
+            state.counters["attempts"] += 1
+        return time.perf_counter()
+
+    def _wait_timeout(self, state):
+        state.breaker.release()
+        state.count("wait_timeouts")
+
+    def _failure(self, state, error, attempt):
+        """Backoff delay before the next attempt, or None to give up."""
+        retryable = is_retryable(error)
+        server_delay = retry_after(error)
+        if is_rate_limited(error):
+            # quota, not an outage: the bucket backs everyone off, the
+            # breaker stays closed
+            state.count("rate_limited")
+            state.bucket.penalize(server_delay or self.base_delay * 2 ** attempt)
+            state.breaker.release()
+        elif retryable:
+            state.breaker.record_failure()
+        else:
+            state.breaker.release()
+        if not retryable or attempt + 1 >= self.max_attempts:
+            state.count("failures")
+            return None
+        state.count("retries")
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, min(server_delay or 0.0, self.max_delay))
+
+    def _abandoned(self, state):
+        # Cancelled, interrupted or a stream closed early: no outcome to
+        # record, but a half-open probe slot must not stay taken.
+        state.breaker.release()
+
+    def _success(self, state, started):
+        state.breaker.record_success()
+        with state.lock:
+            state.counters["successes"] += 1
+            state.latency_s += time.perf_counter() - started
+
+    def _admit(self, state, lane):
+        self._check(state)
+        try:
+            return self._acquired(state, state.bucket.acquire(lane, self.max_wait))
+        except RateLimitTimeout:
+            self._wait_timeout(state)
+            raise
+        except BaseException:
+            self._abandoned(state)
+            raise
+
+    async def _aadmit(self, state, lane):
+        self._check(state)
+        try:
+            return self._acquired(state, await state.bucket.aacquire(lane, self.max_wait))
+        except RateLimitTimeout:
+            self._wait_timeout(state)
+            raise
+        except BaseException:
+            self._abandoned(state)
+            raise
+
+    def call(self, model, key, fn, lane=None):
+        """Runs `fn()` under the model/key's limits; returns its result."""
+        state, lane = self._start(model, key, lane)
+        attempt = 0
+        while True:
+            started = self._admit(state, lane)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._failure(state, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._abandoned(state)
+                raise
+            self._success(state, started)
+            return result
+
+    async def acall(self, model, key, fn, lane=None):
+        """Async `call`; `fn()` returns an awaitable."""
+        state, lane = self._start(model, key, lane)
+        attempt = 0
+        while True:
+            started = await self._aadmit(state, lane)
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._failure(state, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._abandoned(state)
+                raise
+            self._success(state, started)
+            return result
+
+    def stream(self, model, key, make_iter, lane=None):
+        """Yields from `make_iter()`; retried only until the first chunk has
+        been yielded (after that the partial output is already out)."""
+        state, lane = self._start(model, key, lane)
+        attempt = 0
+        while True:
+            started = self._admit(state, lane)
+            try:
+                chunks = make_iter()
+                first = next(chunks)
+            except StopIteration:
+                self._success(state, started)
+                return
+            except Exception as e:
+                delay = self._failure(state, e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._abandoned(state)
+                raise
+            break
+        try:
+            yield first
+            yield from chunks
+        except Exception as e:
+            self._failure(state, e, self.max_attempts)
+            raise
+        except BaseException:
+            self._abandoned(state)
+            raise
+        self._success(state, started)
+
+    async def astream(self, model, key, make_iter, lane=None):
+        """Async `stream`; `make_iter()` returns an async iterator."""
+        state, lane = self._start(model, key, lane)
+        attempt = 0
+        while True:
+            started = await self._aadmit(state, lane)
+            try:
+                chunks = make_iter()
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                self._success(state, started)
+                return
+            except Exception as e:
+                delay = self._failure(state, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self._abandoned(state)
+                raise
+            break
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            self._failure(state, e, self.max_attempts)
+            raise
+        except BaseException:
+            self._abandoned(state)
+            raise
+        self._success(state, started)
+
+    def headroom(self, model, key, lane=None):
+        """Seconds a call to model/key would wait before going out: 0 when a
+        request slot is free, the remaining time while its circuit is open."""
+        state = self._state(model, key)
+        return max(state.breaker.retry_in(), state.bucket.wait_time(lane or current_lane()))
+
+    def metrics(self):
+        """Counters per "model/key", plus breaker state and mean wait/latency."""
+        result = {}
+        with self.lock:
+            states = list(self.states.values())
+        for state in states:
+            with state.lock:
+                counters = dict(state.counters)
+                wait, latency = state.queue_wait_s, state.latency_s
+            result[state.label] = {
+                **counters,
+                "breaker": state.breaker.state,
+                "rpm_limit": state.bucket.rate * 60,
+                "mean_queue_wait_s": round(wait / counters["attempts"], 4) if counters["attempts"] else 0.0,
+                "mean_latency_s": round(latency / counters["successes"], 4) if counters["successes"] else 0.0,
+            }
+        return result
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide gateway every app's model client goes through."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Gateway()
+        return _default
+
+
+def configure(**kwargs):
+    """Replaces the process-wide gateway (see `Gateway` for the options)."""
+    global _default
+    with _default_lock:
+        _default = Gateway(**kwargs)
+        return _default
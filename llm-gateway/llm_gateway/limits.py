@@ -0,0 +1,186 @@
+"""Rate limiting, priority lanes and circuit breaking for the gateway."""
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+_lane = contextvars.ContextVar("llm_gateway_lane", default=INTERACTIVE)
+
+
+def current_lane():
+    return _lane.get()
+
+
+@contextmanager
+def lane(name):
+    """Runs the calls made inside the block (including from asyncio tasks and
+    LangChain executor threads started in it) in the given lane:
+
+        with lane(BATCH):
+            run_evaluation()
+    """
+    if name not in LANES:
+        raise ValueError(f"Unknown lane {name!r}; expected one of {LANES}.")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class RateLimitTimeout(Exception):
+    """No request slot became free within the gateway's max wait."""
+
+
+class CircuitOpenError(Exception):
+    """The model has been failing; calls fail fast until the breaker resets."""
+
+    def __init__(self, key, retry_after):
+        super().__init__(f"Circuit open for {key}; retry in {retry_after:.1f}s.")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Requests-per-minute token bucket shared by every caller of one model/key.
+
+    Interactive callers take priority: while any of them is waiting, batch
+    callers do not get tokens. `penalize` puts the bucket into debt after a
+    429, so every caller backs off together instead of each retrying into
+    the quota wall.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        # five seconds' worth by default: a burst overshoots a per-minute
+        # quota window by at most ~8%, and the 429 backoff absorbs that
+        self.capacity = float(burst if burst is not None else max(1.0, per_minute / 12.0))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waiting = {name: 0 for name in LANES}
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, lane=INTERACTIVE):
+        """0 if a token was taken, otherwise how long to wait before retrying."""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if lane != INTERACTIVE and self.waiting[INTERACTIVE]:
+                return max(0.05, 1.0 / self.rate)
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 - self.tokens) / self.rate
+
+    def wait_time(self, lane=INTERACTIVE):
+        """Like `try_acquire` but takes nothing: 0 if a token is free now."""
+        with self.lock:
+            self._refill(time.monotonic())
+            if lane != INTERACTIVE and self.waiting[INTERACTIVE]:
+                return max(0.05, 1.0 / self.rate)
+            return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def penalize(self, seconds):
+        """Nobody gets a token for about `seconds`. Not cumulative: the 429s
+        of one burst arrive together and describe the same wall."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    @contextmanager
+    def _waiting(self, lane):
+        with self.lock:
+            self.waiting[lane] += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.waiting[lane] -= 1
+
+    def acquire(self, lane=INTERACTIVE, max_wait=None):
+        """Blocks until a token is taken; returns the seconds waited."""
+        start = time.monotonic()
+        with self._waiting(lane):
+            while (delay := self.try_acquire(lane)) > 0:
+                waited = time.monotonic() - start
+                if max_wait is not None and waited + delay > max_wait:
+                    raise RateLimitTimeout(f"No request slot within {max_wait}s ({lane} lane).")
+                time.sleep(delay)
+        return time.monotonic() - start
+
+    async def aacquire(self, lane=INTERACTIVE, max_wait=None):
+        start = time.monotonic()
+        with self._waiting(lane):
+            while (delay := self.try_acquire(lane)) > 0:
+                waited = time.monotonic() - start
+                if max_wait is not None and waited + delay > max_wait:
+                    raise RateLimitTimeout(f"No request slot within {max_wait}s ({lane} lane).")
+                await asyncio.sleep(delay)
+        return time.monotonic() - start
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; while
+    open calls fail fast; after `reset_timeout` one probe call is let through
+    (half-open) and its outcome closes or re-opens the circuit."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def check(self, key):
+        """Raises CircuitOpenError unless a call may go out now."""
+        with self.lock:
+            if self.state == "closed":
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == "open" and elapsed >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                return
+            raise CircuitOpenError(key, max(0.0, self.reset_timeout - elapsed))
+
+    def retry_in(self):
+        """0 if a call may go out, otherwise seconds until the breaker lets one through."""
+        with self.lock:
+            if self.state == "closed":
+                return 0.0
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if self.state == "open" and remaining > 0:
+                return remaining
+            return self.reset_timeout if self.probing else 0.0
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """A call that neither succeeded nor failed at the provider (e.g. a
+        bad request) frees the half-open probe slot."""
+        with self.lock:
+            self.probing = False
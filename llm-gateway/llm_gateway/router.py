@@ -0,0 +1,337 @@
+"""Cost/latency-aware model routing with fallback.
+
+A router picks a model tier per request from cheap features, then calls the
+first healthy candidate of that tier, falling back to other API keys and
+other tiers when a candidate is over quota or breaching its latency SLO.
+
+Tiers, cheapest first (models from `LLM_ROUTER_TIERS="lite=...,standard=...,strong=..."`):
+
+  lite      gemini-2.0-flash-lite   short, simple requests
+  standard  gemini-2.0-flash        the default
+  strong    gemini-2.5-flash        hard requests (complex SQL)
+
+Features are `input_tokens` (estimated from the prompt, so a RAG prompt's
+context size is included) plus whatever the caller knows, set with
+`route_hints` around the call:
+
+  difficulty  0..1, e.g. SQL question difficulty
+  confidence  0..1 that a light model is enough, e.g. a grammar pre-check
+  tier        pins the tier (e.g. to compare tiers in an evaluation)
+
+    with route_hints(difficulty=question_difficulty(question)):
+        agent.invoke(...)
+
+A candidate is skipped while its gateway slot is more than `max_queue_s`
+away (quota used up, 429 backoff, open circuit) or while it breaches the
+SLO (p90 of its recent latencies, time to first token for streams, above
+`slo_s`; it is retried after `cooldown_s`). Skipped candidates are still
+tried, last, so a request is only refused when every model fails. A call
+that fails on quota or with a server error after the gateway's retries
+moves on to the next candidate; streams only until their first chunk. Every decision is logged
+to the `llm_gateway.router` logger and kept in `Router.decisions`.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from llm_gateway.gateway import is_rate_limited, is_retryable
+from llm_gateway.limits import CircuitOpenError, RateLimitTimeout
+from llm_gateway.telemetry import current_trace
+
+logger = logging.getLogger("llm_gateway.router")
+
+DEFAULT_MODELS = {
+    "lite": "gemini-2.0-flash-lite",
+    "standard": "gemini-2.0-flash",
+    "strong": "gemini-2.5-flash",
+}
+SLO_S = float(os.getenv("LLM_ROUTER_SLO", "8"))
+MAX_QUEUE_S = float(os.getenv("LLM_ROUTER_MAX_QUEUE", "2"))
+COOLDOWN_S = float(os.getenv("LLM_ROUTER_COOLDOWN", "60"))
+# prompts up to this size may go to the lite tier
+LITE_MAX_TOKENS = 1500
+# prompts above this size (large RAG contexts) go to standard at least
+LARGE_PROMPT_TOKENS = 6000
+
+
+def parse_tiers(spec):
+    """"tier=model,..." -> {tier: model}."""
+    tiers = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            tier, model = part.split("=", 1)
+            tiers[tier.strip()] = model.strip()
+    return tiers
+
+
+_hints = contextvars.ContextVar("llm_router_hints", default={})
+
+
+def current_hints():
+    return _hints.get()
+
+
+@contextmanager
+def route_hints(**features):
+    """Routing features for the calls made inside the block (merged over
+    the enclosing block's)."""
+    token = _hints.set({**_hints.get(), **features})
+    try:
+        yield
+    finally:
+        _hints.reset(token)
+
+
+def estimate_tokens(messages):
+    """~4 characters per token; cheap enough for every call."""
+    chars = 0
+    for message in messages:
+        content = message.content
+        chars += len(content) if isinstance(content, str) else len(str(content))
+    return chars // 4
+
+
+def choose_tier(features):
+    """Default policy: (tier, reason) from the request's features."""
+    if features.get("tier"):
+        return features["tier"], "pinned"
+    tokens = features.get("input_tokens", 0)
+    difficulty = features.get("difficulty")
+    confidence = features.get("confidence")
+    if difficulty is not None and difficulty >= 0.7:
+        return "strong", f"difficulty {difficulty:.2f}"
+    if tokens > LARGE_PROMPT_TOKENS:
+        return "standard", f"{tokens} prompt tokens"
+    if difficulty is not None and difficulty <= 0.3 and tokens <= LITE_MAX_TOKENS:
+        return "lite", f"difficulty {difficulty:.2f}"
+    if confidence is not None:
+        if confidence >= 0.7 and tokens <= LITE_MAX_TOKENS:
+            return "lite", f"confidence {confidence:.2f}"
+        return "standard", f"confidence {confidence:.2f}"
+    if difficulty is None and tokens <= LITE_MAX_TOKENS // 2:
+        return "lite", f"{tokens} prompt tokens"
+    return "standard", "default"
+
+
+def fallback_reason(error):
+    """Why another candidate may succeed where this one failed, or None."""
+    if isinstance(error, (RateLimitTimeout, CircuitOpenError)) or is_rate_limited(error):
+        return "quota"
+    if is_retryable(error):
+        return "unavailable"
+    return None
+
+
+class Candidate:
+    """One model client of a tier (one model and API key)."""
+
+    def __init__(self, tier, model):
+        self.tier = tier
+        self.model = model
+        self.label = f"{tier}:{getattr(model, 'model_name', type(model).__name__)}/{getattr(model, 'api_key_id', '-')}"
+        self.latencies = deque(maxlen=20)
+        self.degraded_until = 0.0
+        self.lock = threading.Lock()
+
+    def headroom(self):
+        gateway = getattr(self.model, "_gateway", None)
+        if gateway is None:
+            return 0.0
+        return gateway().headroom(self.model.model_name, self.model.api_key_id, self.model.lane)
+
+    def observe(self, seconds, slo_s, cooldown_s):
+        """Records a latency; returns the p90 if it now breaches the SLO."""
+        with self.lock:
+            self.latencies.append(seconds)
+            if len(self.latencies) < 5:
+                return None
+            p90 = sorted(self.latencies)[int(0.9 * (len(self.latencies) - 1))]
+            if p90 <= slo_s:
+                return None
+            self.degraded_until = time.monotonic() + cooldown_s
+            self.latencies.clear()
+            return p90
+
+
+class Decision:
+    def __init__(self, tier, reason, features):
+        self.tier = tier
+        self.reason = reason
+        self.features = features
+        self.skipped = []
+        self.fallbacks = []
+        self.served_by = None
+        self.latency_s = None
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "tier": self.tier, "reason": self.reason, "features": self.features,
+            "skipped": self.skipped, "fallbacks": self.fallbacks, "served_by": self.served_by,
+            "latency_s": self.latency_s, "error": self.error,
+        }
+
+
+class Router:
+    """Tier choice, candidate health and fallback; see the module docstring.
+
+    `tiers` maps tier names (cheapest first) to lists of model clients,
+    one per API key; `policy(features)` returns (tier, reason).
+    """
+
+    def __init__(self, tiers, policy=choose_tier, slo_s=SLO_S, max_queue_s=MAX_QUEUE_S,
+                 cooldown_s=COOLDOWN_S, history=200):
+        self.order = list(tiers)
+        self.candidates = {tier: [Candidate(tier, m) for m in models] for tier, models in tiers.items()}
+        self.policy = policy
+        self.slo_s = slo_s
+        self.max_queue_s = max_queue_s
+        self.cooldown_s = cooldown_s
+        self.decisions = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "fallbacks": 0, "slo_breaches": 0, "errors": 0}
+        self.served = {}
+
+    def _preference(self, tier):
+        """Candidates of `tier`, then of stronger tiers, then of weaker ones."""
+        if tier not in self.candidates:
+            tier = self.order[len(self.order) // 2]
+        i = self.order.index(tier)
+        tiers = [tier] + self.order[i + 1:] + self.order[:i][::-1]
+        return [c for t in tiers for c in self.candidates[t]]
+
+    def _health(self, candidate):
+        """None if the candidate can serve now, otherwise why not."""
+        if candidate.degraded_until > time.monotonic():
+            return "slo"
+        wait = candidate.headroom()
+        if wait > self.max_queue_s:
+            return f"queue {wait:.1f}s"
+        return None
+
+    def plan(self, features):
+        """(Decision, candidates in the order they will be tried)."""
+        tier, reason = self.policy(features)
+        decision = Decision(tier, reason, features)
+        healthy, unhealthy = [], []
+        for candidate in self._preference(tier):
+            why = self._health(candidate)
+            if why is None:
+                healthy.append(candidate)
+            else:
+                decision.skipped.append((candidate.label, why))
+                unhealthy.append(candidate)
+        return decision, healthy + unhealthy
+
+    def _failed(self, decision, candidate, error, last):
+        why = fallback_reason(error)
+        if why is None or last:
+            decision.error = f"{type(error).__name__}: {error}"
+            self._finish(decision)
+            return False
+        decision.fallbacks.append((candidate.label, why))
+        return True
+
+    def _served(self, decision, candidate, seconds):
+        decision.served_by = candidate.label
+        decision.latency_s = round(seconds, 4)
+        p90 = candidate.observe(seconds, self.slo_s, self.cooldown_s)
+        if p90 is not None:
+            logger.warning("%s breaches its %.1fs SLO (p90 %.1fs); routing around it for %.0fs",
+                           candidate.label, self.slo_s, p90, self.cooldown_s)
+            with self.lock:
+                self.counts["slo_breaches"] += 1
+        self._finish(decision)
+
+    def _finish(self, decision):
+        with self.lock:
+            self.counts["requests"] += 1
+            self.counts["fallbacks"] += len(decision.fallbacks)
+            if decision.error:
+                self.counts["errors"] += 1
+            if decision.served_by:
+                self.served[decision.served_by] = self.served.get(decision.served_by, 0) + 1
+            self.decisions.append(decision.as_dict())
+        trace = current_trace()
+        if trace is not None and decision.served_by:
+            trace.attrs["tier"] = decision.served_by.split(":", 1)[0]
+        logger.info(
+            "routed to %s (%s; served by %s in %ss%s%s)",
+            decision.tier, decision.reason, decision.served_by, decision.latency_s,
+            f"; skipped {decision.skipped}" if decision.skipped else "",
+            f"; fell back from {decision.fallbacks}" if decision.fallbacks else "",
+        )
+
+    def call(self, features, fn):
+        """`fn(model)` on the chosen candidate, falling back as needed."""
+        decision, candidates = self.plan(features)
+        for i, candidate in enumerate(candidates):
+            start = time.perf_counter()
+            try:
+                result = fn(candidate.model)
+            except Exception as e:
+                if self._failed(decision, candidate, e, i == len(candidates) - 1):
+                    continue
+                raise
+            self._served(decision, candidate, time.perf_counter() - start)
+            return result
+
+    async def acall(self, features, fn):
+        decision, candidates = self.plan(features)
+        for i, candidate in enumerate(candidates):
+            start = time.perf_counter()
+            try:
+                result = await fn(candidate.model)
+            except Exception as e:
+                if self._failed(decision, candidate, e, i == len(candidates) - 1):
+                    continue
+                raise
+            self._served(decision, candidate, time.perf_counter() - start)
+            return result
+
+    def stream(self, features, make_iter):
+        """Yields from `make_iter(model)`; falls back only before the first chunk."""
+        decision, candidates = self.plan(features)
+        for i, candidate in enumerate(candidates):
+            start = time.perf_counter()
+            chunks = make_iter(candidate.model)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                self._served(decision, candidate, time.perf_counter() - start)
+                return
+            except Exception as e:
+                if self._failed(decision, candidate, e, i == len(candidates) - 1):
+                    continue
+                raise
+            self._served(decision, candidate, time.perf_counter() - start)
+            yield first
+            yield from chunks
+            return
+
+    async def astream(self, features, make_iter):
+        decision, candidates = self.plan(features)
+        for i, candidate in enumerate(candidates):
+            start = time.perf_counter()
+            chunks = make_iter(candidate.model)
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                self._served(decision, candidate, time.perf_counter() - start)
+                return
+            except Exception as e:
+                if self._failed(decision, candidate, e, i == len(candidates) - 1):
+                    continue
+                raise
+            self._served(decision, candidate, time.perf_counter() - start)
+            yield first
+            async for chunk in chunks:
+                yield chunk
+            return
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, "served_by": dict(self.served)}
@@ -0,0 +1,232 @@
+"""Single-flight coalescing of identical in-flight calls.
+
+When identical requests arrive together (a class submitting the same
+exercise, everyone asking about today's headline) the first one goes to the
+model and the others wait for its response instead of sending their own.
+Requests are identical when their key, the cassette's request fingerprint
+(model, params, kwargs, stop words, prompt hash), is equal. Every waiter
+gets its own copy of the leader's result, or the leader's error. Nothing is
+cached: once the call lands, the next identical request starts a new one.
+
+`SingleFlight` is for threads (Streamlit sessions, executor threads),
+`AsyncSingleFlight` for coroutines (flights are per event loop). Both
+coalesce plain calls (`do`) and streams (`stream`); a stream's followers get
+the chunks the leader has already received, then the rest as they arrive.
+"""
+import asyncio
+import copy
+import threading
+
+
+class LeaderGone(RuntimeError):
+    """The call a request was coalesced into was cancelled, or its stream was
+    not read to the end."""
+
+
+class _Stats:
+    def __init__(self):
+        self.stats_lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def _count(self, leader):
+        with self.stats_lock:
+            if leader:
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+    def stats(self):
+        with self.stats_lock:
+            return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+class _Flight:
+    def __init__(self):
+        self.followers = 0
+        self.result = None
+        self.error = None
+        self.chunks = []
+        self.finished = False
+        self.cond = threading.Condition()
+
+
+class SingleFlight(_Stats):
+    """Thread variant; see the module docstring."""
+
+    def __init__(self):
+        super().__init__()
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def _join(self, key):
+        """(flight, is_leader)."""
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+            else:
+                flight.followers += 1
+        self._count(leader)
+        return flight, leader
+
+    def _land(self, key, flight, error=None):
+        """Closes the flight to newcomers; returns True if anyone joined it."""
+        with self.lock:
+            self.flights.pop(key, None)
+        with flight.cond:
+            flight.error = error
+            flight.finished = True
+            flight.cond.notify_all()
+        return flight.followers > 0
+
+    def do(self, key, fn):
+        flight, leader = self._join(key)
+        if not leader:
+            with flight.cond:
+                flight.cond.wait_for(lambda: flight.finished)
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            self._land(key, flight, e if isinstance(e, Exception) else LeaderGone(repr(e)))
+            raise
+        shared = self._land(key, flight)
+        # the caller's LangChain post-processing mutates what it gets back
+        return copy.deepcopy(flight.result) if shared else flight.result
+
+    def stream(self, key, make_iter):
+        """(chunk iterator, whether it follows another caller's stream)."""
+        flight, leader = self._join(key)
+        if leader:
+            return self._lead(key, flight, make_iter), False
+        return self._follow(flight), True
+
+    def _lead(self, key, flight, make_iter):
+        error = LeaderGone("The shared stream was not read to the end.")
+        try:
+            for chunk in make_iter():
+                with flight.cond:
+                    flight.chunks.append(copy.deepcopy(chunk))
+                    flight.cond.notify_all()
+                yield chunk
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._land(key, flight, error)
+
+    def _follow(self, flight):
+        i = 0
+        while True:
+            with flight.cond:
+                flight.cond.wait_for(lambda: i < len(flight.chunks) or flight.finished)
+                if i < len(flight.chunks):
+                    chunk = flight.chunks[i]
+                elif flight.error is not None:
+                    raise flight.error
+                else:
+                    return
+            i += 1
+            yield copy.deepcopy(chunk)
+
+
+class _AsyncFlight:
+    def __init__(self):
+        self.followers = 0
+        self.result = None
+        self.error = None
+        self.chunks = []
+        self.finished = False
+        self.changed = asyncio.Event()
+
+
+class AsyncSingleFlight(_Stats):
+    """Coroutine variant; see the module docstring."""
+
+    def __init__(self):
+        super().__init__()
+        self.flights = {}
+
+    def _join(self, key):
+        key = (id(asyncio.get_running_loop()), key)
+        flight = self.flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = self.flights[key] = _AsyncFlight()
+        else:
+            flight.followers += 1
+        self._count(leader)
+        return key, flight, leader
+
+    def _land(self, key, flight, error=None):
+        self.flights.pop(key, None)
+        flight.error = error
+        flight.finished = True
+        flight.changed.set()
+        return flight.followers > 0
+
+    async def _wait(self, flight, seen=0):
+        while len(flight.chunks) <= seen and not flight.finished:
+            flight.changed.clear()
+            await flight.changed.wait()
+
+    async def do(self, key, fn):
+        key, flight, leader = self._join(key)
+        if not leader:
+            await self._wait(flight)
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+        try:
+            flight.result = await fn()
+        except BaseException as e:
+            self._land(key, flight, e if isinstance(e, Exception) else LeaderGone(repr(e)))
+            raise
+        shared = self._land(key, flight)
+        return copy.deepcopy(flight.result) if shared else flight.result
+
+    def stream(self, key, make_iter):
+        key, flight, leader = self._join(key)
+        if leader:
+            return self._lead(key, flight, make_iter), False
+        return self._follow(flight), True
+
+    async def _lead(self, key, flight, make_iter):
+        error = LeaderGone("The shared stream was not read to the end.")
+        try:
+            async for chunk in make_iter():
+                flight.chunks.append(copy.deepcopy(chunk))
+                flight.changed.set()
+                yield chunk
+            error = None
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._land(key, flight, error)
+
+    async def _follow(self, flight):
+        i = 0
+        while True:
+            await self._wait(flight, i)
+            if i < len(flight.chunks):
+                yield copy.deepcopy(flight.chunks[i])
+                i += 1
+            elif flight.error is not None:
+                raise flight.error
+            else:
+                return
+
+
+threads = SingleFlight()
+coroutines = AsyncSingleFlight()
+
+
+def singleflight_stats():
+    """Calls sent and requests coalesced into them, per variant."""
+    return {"threads": threads.stats(), "async": coroutines.stats()}
@@ -0,0 +1,118 @@
+"""Local stand-in chat models for exercising the router and the apps offline.
+
+`StubChatModel` answers after a configurable latency (time to first token
+and total), optionally failing a share of calls with a 429 or 503, and
+reports token usage like Gemini does. `stub_tiers()` builds one per router
+tier with the latency profile of the real tier, each behind the gateway:
+
+    llm = RoutedChatModel(router=Router(stub_tiers()))
+    with route_hints(difficulty=0.9):
+        llm.invoke("...")            # served by the "strong" stub after ~3s
+
+`LLM_ROUTER_STUB=1` makes `routed_chat` use these.
+"""
+import asyncio
+import random
+import re
+import time
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from llm_gateway.chat import GatewayChatModel
+from llm_gateway.telemetry import PRICES
+
+# tier: (time to first token, total latency) in seconds
+PROFILES = {"lite": (0.1, 0.4), "standard": (0.3, 1.2), "strong": (0.8, 3.0)}
+
+
+class StubError(Exception):
+    """A simulated provider error; `code` is its HTTP status."""
+
+    def __init__(self, code):
+        super().__init__(f"{code} simulated by the stub model")
+        self.code = code
+
+
+class StubChatModel(BaseChatModel):
+    """Replies "[label] ..." after `latency` seconds (streams: first chunk
+    after `ttft`); `jitter` is the +/- fraction applied to both, and
+    `fail_rate` the share of calls failing with `fail_code`."""
+
+    label: str = "stub"
+    ttft: float = 0.1
+    latency: float = 0.5
+    jitter: float = 0.0
+    fail_rate: float = 0.0
+    fail_code: int = 429
+    reply: str = ""
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    @property
+    def _identifying_params(self):
+        return {"label": self.label}
+
+    def _scaled(self, seconds):
+        return seconds * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _words(self, messages):
+        if random.random() < self.fail_rate:
+            raise StubError(self.fail_code)
+        prompt = messages[-1].content if messages else ""
+        text = self.reply or f"[{self.label}] {str(prompt)[:60]}"
+        return re.findall(r"\s*\S+", text) or [text]
+
+    def _usage(self, messages, words):
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        output = max(1, len(words))
+        return {"input_tokens": prompt_chars // 4, "output_tokens": output,
+                "total_tokens": prompt_chars // 4 + output}
+
+    def _result(self, messages, words):
+        message = AIMessage(content="".join(words), usage_metadata=self._usage(messages, words))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages, words):
+        """(delay before it, chunk) pairs; usage rides on the last chunk."""
+        first = self._scaled(self.ttft)
+        between = max(0.0, self._scaled(self.latency) - first) / max(1, len(words) - 1)
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield first if i == 0 else between, ChatGenerationChunk(message=AIMessageChunk(
+                content=word, usage_metadata=self._usage(messages, words) if last else None,
+            ))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        words = self._words(messages)
+        time.sleep(self._scaled(self.latency))
+        return self._result(messages, words)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        words = self._words(messages)
+        await asyncio.sleep(self._scaled(self.latency))
+        return self._result(messages, words)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for delay, chunk in self._chunks(messages, self._words(messages)):
+            time.sleep(delay)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for delay, chunk in self._chunks(messages, self._words(messages)):
+            await asyncio.sleep(delay)
+            yield chunk
+
+
+def stub_tiers(profiles=PROFILES, lane=None, gateway=None, **kwargs):
+    """{tier: [stub client]} for a Router; `kwargs` go to every StubChatModel."""
+    for tier in profiles:
+        PRICES.setdefault(f"stub-{tier}", (0.0, 0.0))
+    return {
+        tier: [GatewayChatModel(
+            inner=StubChatModel(label=tier, ttft=ttft, latency=latency, **kwargs),
+            model_name=f"stub-{tier}", lane=lane, gateway=gateway,
+        )]
+        for tier, (ttft, latency) in profiles.items()
+    }
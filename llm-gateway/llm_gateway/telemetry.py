@@ -0,0 +1,407 @@
+"""Tracing and token/cost telemetry shared by the apps.
+
+A trace is one user request (a grammar check, a chat answer, a menu); spans
+are the stages inside it. The stage names used across the apps are:
+
+  prompt_build  building the prompt (few-shot example selection included)
+  retrieval     fetching context (vector / BM25 search)
+  db_execute    running SQL
+  llm_call      one model call through the gateway (queueing and retries included)
+  ttft          time to the first streamed chunk of a model call
+  parse         turning model output into the app's result
+
+    with trace("grammar_api"):
+        with span("prompt_build"):
+            prompt = build()
+        llm.invoke(prompt)             # llm_call, ttft and tokens are recorded by the gateway
+
+Spans are aggregated into per-stage histograms, model usage into token and
+cost counters per model. Both are exported as Prometheus text
+(`prometheus_text`, served by the Grammar Tutor's /metrics) together with
+the gateway's counters. Finished traces (per-stage seconds, input/output
+tokens and cost of one request) are kept in an in-process exporter
+(`exporter`) that the Streamlit apps show in their sidebar.
+
+Recording a span is a perf_counter pair and a dict update under a lock (a
+few microseconds), far below 1% of any model call. `LLM_TELEMETRY=0` turns
+it all off. Prices (USD per million input/output tokens) can be set with
+`LLM_PRICES="gemini-2.0-flash=0.10/0.40,..."`; a model without a price is
+counted at $0 and logged once.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ENABLED = os.getenv("LLM_TELEMETRY", "1") != "0"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# USD per million (input, output) tokens
+PRICES = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+}
+_BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def parse_prices(spec):
+    """"model=in/out,..." -> {model: (in, out)}."""
+    prices = {}
+    for part in (spec or "").split(","):
+        if "=" in part and "/" in part:
+            model, price = part.split("=", 1)
+            price_in, price_out = price.split("/", 1)
+            prices[model.strip()] = (float(price_in), float(price_out))
+    return prices
+
+
+PRICES.update(parse_prices(os.getenv("LLM_PRICES")))
+
+
+logger = logging.getLogger("llm_gateway.telemetry")
+_unpriced = set()
+
+
+def cost(model, input_tokens, output_tokens):
+    price = PRICES.get(model)
+    if price is None:
+        if model not in _unpriced:
+            _unpriced.add(model)
+            logger.warning("No price for %s; its calls are counted as $0 (set LLM_PRICES)", model)
+        price = (0.0, 0.0)
+    price_in, price_out = price
+    return (input_tokens * price_in + output_tokens * price_out) / 1e6
+
+
+class Histogram:
+    """Cumulative-bucket histogram in Prometheus' sense."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Trace:
+    """Spans and model usage of one request."""
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.llm_calls = 0
+        self.lock = threading.Lock()
+
+    def add_span(self, name, seconds):
+        with self.lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def add_usage(self, input_tokens, output_tokens, usd):
+        with self.lock:
+            self.llm_calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            self.cost_usd += usd
+
+    def record(self, error=None):
+        with self.lock:
+            return {
+                "name": self.name,
+                "started_at": self.started_at,
+                "total_s": round(time.perf_counter() - self.start, 4),
+                "spans": {name: round(seconds, 4) for name, seconds in self.spans.items()},
+                "llm_calls": self.llm_calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "cost_usd": round(self.cost_usd, 6),
+                "error": error,
+                **self.attrs,
+            }
+
+
+class InProcessExporter:
+    """Bounded history of finished traces, for display inside the app."""
+
+    def __init__(self, maxlen=200):
+        self.records = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+
+    def export(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def traces(self, name=None):
+        with self.lock:
+            records = list(self.records)
+        return [r for r in records if name is None or r["name"] == name]
+
+    def last(self, name=None):
+        records = self.traces(name)
+        return records[-1] if records else None
+
+    def summary(self, name=None):
+        """Per trace name: count, mean and p95 total seconds, mean seconds per
+        span, and mean tokens and cost per request."""
+        groups = {}
+        for record in self.traces(name):
+            groups.setdefault(record["name"], []).append(record)
+        summary = {}
+        for trace_name, records in groups.items():
+            n = len(records)
+            totals = sorted(r["total_s"] for r in records)
+            spans = {}
+            for record in records:
+                for span_name, seconds in record["spans"].items():
+                    spans[span_name] = spans.get(span_name, 0.0) + seconds
+            summary[trace_name] = {
+                "requests": n,
+                "mean_s": round(sum(totals) / n, 4),
+                "p95_s": totals[min(n - 1, int(0.95 * n))],
+                "spans_mean_s": {k: round(v / n, 4) for k, v in spans.items()},
+                "mean_input_tokens": round(sum(r["input_tokens"] for r in records) / n, 1),
+                "mean_output_tokens": round(sum(r["output_tokens"] for r in records) / n, 1),
+                "mean_cost_usd": round(sum(r["cost_usd"] for r in records) / n, 6),
+                "errors": sum(1 for r in records if r["error"]),
+            }
+        return summary
+
+
+class Telemetry:
+    """Process-wide span histograms and token/cost counters."""
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter or InProcessExporter()
+        self.lock = threading.Lock()
+        self.spans = {}
+        self.traces = {}
+        self.tokens = {}
+        self.costs = {}
+        self.calls = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = Histogram()
+            histogram.observe(seconds)
+
+    def finish(self, trace, error=None):
+        record = trace.record(error)
+        with self.lock:
+            histogram = self.traces.get(trace.name)
+            if histogram is None:
+                histogram = self.traces[trace.name] = Histogram()
+            histogram.observe(record["total_s"])
+        self.exporter.export(record)
+        return record
+
+    def usage(self, model, input_tokens, output_tokens):
+        """Counts one billed model call; returns its cost in USD."""
+        usd = cost(model, input_tokens, output_tokens)
+        with self.lock:
+            self.calls[model] = self.calls.get(model, 0) + 1
+            self.tokens[(model, "input")] = self.tokens.get((model, "input"), 0) + input_tokens
+            self.tokens[(model, "output")] = self.tokens.get((model, "output"), 0) + output_tokens
+            self.costs[model] = self.costs.get(model, 0.0) + usd
+        return usd
+
+    def totals(self):
+        """Billed calls, tokens and cost across all models."""
+        with self.lock:
+            return {
+                "llm_calls": sum(self.calls.values()),
+                "input_tokens": sum(n for (_, d), n in self.tokens.items() if d == "input"),
+                "output_tokens": sum(n for (_, d), n in self.tokens.items() if d == "output"),
+                "cost_usd": round(sum(self.costs.values()), 6),
+            }
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "spans": {name: {"count": h.count, "sum_s": round(h.sum, 4)} for name, h in self.spans.items()},
+                "llm_calls": dict(self.calls),
+                "tokens": {f"{model}/{direction}": n for (model, direction), n in self.tokens.items()},
+                "cost_usd": {model: round(usd, 6) for model, usd in self.costs.items()},
+            }
+
+
+telemetry = Telemetry()
+exporter = telemetry.exporter
+_trace = contextvars.ContextVar("llm_telemetry_trace", default=None)
+
+
+def current_trace():
+    return _trace.get()
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Records the block as one request; spans and model usage inside it
+    (including from asyncio tasks and LangChain executor threads started in
+    it) are attributed to it. Inside another trace it is just a span."""
+    if not ENABLED:
+        yield None
+        return
+    if _trace.get() is not None:
+        with span(name):
+            yield _trace.get()
+        return
+    current = Trace(name, attrs)
+    token = _trace.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        try:
+            _trace.reset(token)
+        except ValueError:
+            pass  # a generator holding the trace was closed from another context
+        telemetry.finish(current, error)
+
+
+def observe(name, seconds):
+    """Records a span measured elsewhere (e.g. a time to first token)."""
+    if not ENABLED:
+        return
+    telemetry.observe(name, seconds)
+    current = _trace.get()
+    if current is not None:
+        current.add_span(name, seconds)
+
+
+class span:
+    """Times the block as stage `name` (a class rather than a generator
+    context manager: it sits on every request's path)."""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        if ENABLED:
+            observe(self.name, time.perf_counter() - self.start)
+
+
+def record_usage(model, usage, billed=True):
+    """Counts the tokens of a model call from a LangChain `usage_metadata`
+    dict ({"input_tokens", "output_tokens", ...}); None is ignored. Calls
+    that were not billed (cassette replays) count towards the current
+    trace only."""
+    if not ENABLED or not usage:
+        return
+    input_tokens = int(usage.get("input_tokens") or 0)
+    output_tokens = int(usage.get("output_tokens") or 0)
+    if billed:
+        usd = telemetry.usage(model, input_tokens, output_tokens)
+    else:
+        usd = cost(model, input_tokens, output_tokens)
+    current = _trace.get()
+    if current is not None:
+        current.add_usage(input_tokens, output_tokens, usd)
+
+
+# --- Prometheus text format -------------------------------------------------
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _histogram(lines, metric, help_text, histograms, label):
+    lines.append(f"# HELP {metric} {help_text}")
+    lines.append(f"# TYPE {metric} histogram")
+    for name, h in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(h.buckets, h.counts):
+            cumulative += count
+            lines.append(f"{metric}_bucket{_labels(**{label: name}, le=bound)} {cumulative}")
+        lines.append(f"{metric}_bucket{_labels(**{label: name}, le='+Inf')} {h.count}")
+        lines.append(f"{metric}_sum{_labels(**{label: name})} {h.sum:.6f}")
+        lines.append(f"{metric}_count{_labels(**{label: name})} {h.count}")
+
+
+def _gateway_lines(lines):
+    from llm_gateway.gateway import get_gateway
+    from llm_gateway.singleflight import singleflight_stats
+
+    metrics = get_gateway().metrics()
+    counters = {}
+    for label, values in metrics.items():
+        model, key = label.rsplit("/", 1)
+        for name, value in values.items():
+            if isinstance(value, int) and not isinstance(value, bool):
+                counters.setdefault(name, []).append((model, key, value))
+    for name, samples in sorted(counters.items()):
+        metric = f"llm_gateway_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for model, key, value in samples:
+            lines.append(f"{metric}{_labels(model=model, key=key)} {value}")
+    lines.append("# HELP llm_gateway_breaker_state 0 closed, 1 half-open, 2 open.")
+    lines.append("# TYPE llm_gateway_breaker_state gauge")
+    for label, values in metrics.items():
+        model, key = label.rsplit("/", 1)
+        lines.append(f"llm_gateway_breaker_state{_labels(model=model, key=key)} "
+                     f"{_BREAKER_STATES.get(values['breaker'], 0)}")
+    lines.append("# TYPE llm_singleflight_total counter")
+    for variant, stats in singleflight_stats().items():
+        for outcome, value in stats.items():
+            lines.append(f"llm_singleflight_total{_labels(variant=variant, outcome=outcome)} {value}")
+
+
+def prometheus_text():
+    """Every telemetry and gateway metric in the Prometheus text format."""
+    lines = []
+    with telemetry.lock:
+        _histogram(lines, "llm_span_seconds", "Duration of instrumented stages.", telemetry.spans, "span")
+        _histogram(lines, "llm_request_seconds", "Duration of traced requests.", telemetry.traces, "trace")
+        tokens = dict(telemetry.tokens)
+        costs = dict(telemetry.costs)
+        calls = dict(telemetry.calls)
+    lines.append("# HELP llm_calls_total Billed model calls.")
+    lines.append("# TYPE llm_calls_total counter")
+    for model, n in sorted(calls.items()):
+        lines.append(f"llm_calls_total{_labels(model=model)} {n}")
+    lines.append("# HELP llm_tokens_total Model tokens by direction.")
+    lines.append("# TYPE llm_tokens_total counter")
+    for (model, direction), n in sorted(tokens.items()):
+        lines.append(f"llm_tokens_total{_labels(model=model, direction=direction)} {n}")
+    lines.append("# HELP llm_cost_usd_total Estimated model cost in USD.")
+    lines.append("# TYPE llm_cost_usd_total counter")
+    for model, usd in sorted(costs.items()):
+        lines.append(f"llm_cost_usd_total{_labels(model=model)} {usd:.8f}")
+    _gateway_lines(lines)
+    return "\n".join(lines) + "\n"
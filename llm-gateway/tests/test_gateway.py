@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_gateway import CircuitOpenError, Gateway
+
+
+def tripped_gateway():
+    """A gateway whose circuit for m/k is open and ready for its half-open probe."""
+    gateway = Gateway(per_minute=6000, max_attempts=1, failure_threshold=1, reset_timeout=0.05)
+
+    def fail():
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        gateway.call("m", "k", fail)
+    with pytest.raises(CircuitOpenError):
+        gateway.call("m", "k", lambda: "ok")
+    time.sleep(0.06)
+    return gateway
+
+
+def breaker(gateway):
+    return gateway._state("m", "k").breaker
+
+
+def test_stream_closed_after_first_chunk_frees_probe():
+    gateway = tripped_gateway()
+    stream = gateway.stream("m", "k", lambda: iter(["a", "b", "c"]))
+    assert next(stream) == "a"
+    stream.close()
+    assert not breaker(gateway).probing
+    assert gateway.call("m", "k", lambda: "ok") == "ok"
+    assert breaker(gateway).state == "closed"
+
+
+def test_astream_closed_after_first_chunk_frees_probe():
+    gateway = tripped_gateway()
+
+    async def chunks():
+        for chunk in ("a", "b", "c"):
+            yield chunk
+
+    async def run():
+        stream = gateway.astream("m", "k", chunks)
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert not breaker(gateway).probing
+    assert gateway.call("m", "k", lambda: "ok") == "ok"
+
+
+def test_cancelled_acall_frees_probe():
+    gateway = tripped_gateway()
+
+    async def run():
+        task = asyncio.create_task(gateway.acall("m", "k", lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not breaker(gateway).probing
+    assert gateway.call("m", "k", lambda: "ok") == "ok"
+
+
+def test_interrupted_call_frees_probe():
+    gateway = tripped_gateway()
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        gateway.call("m", "k", interrupted)
+    assert not breaker(gateway).probing
+    assert gateway.call("m", "k", lambda: "ok") == "ok"